@@ -0,0 +1,91 @@
+"""
+JWT authentication with cached user lookups
+
+JWTAuthentication loads the token's user from the database on every request.
+CachedJWTAuthentication keeps the user row in JWT_USER_CACHE, the cache shared
+by all workers, for JWT_USER_CACHE_TTL seconds instead.
+
+Each user has a version counter next to the cached row. Saving or deleting
+the user and logging out bump it, and a cached row only counts while it
+carries the current version, so every worker stops serving the old copy at
+once. The version is read before the row is loaded from the database, so a
+row cached by a request that raced with a change is never served.
+
+The password hash is never cached; cached users come back with it deferred,
+so reading it loads it and saving them leaves it untouched.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import User
+
+# Columns kept in the cache, everything but the password hash
+CACHED_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields if field.attname != 'password'
+)
+
+
+def get_user_cache():
+    """Return the cache holding authenticated users"""
+    return caches[settings.JWT_USER_CACHE]
+
+
+def user_cache_key(user_id):
+    """Cache key for an authenticated user"""
+    return f"auth-user:{user_id}"
+
+
+def user_version_key(user_id):
+    """Cache key for the version a cached user must carry to be served"""
+    return f"auth-user-version:{user_id}"
+
+
+def get_cached_user(user_id):
+    """Return (cached user or None, current version) for an id"""
+    key, version_key = user_cache_key(user_id), user_version_key(user_id)
+    entries = get_user_cache().get_many([key, version_key])
+    version = entries.get(version_key, 0)
+    entry = entries.get(key)
+    if entry is None or entry[0] != version:
+        return None, version
+    return User.from_db(router.db_for_read(User), CACHED_FIELDS, entry[1]), version
+
+
+def cache_user(user, version):
+    """Store a user, loaded after reading version, for the configured TTL"""
+    values = tuple(getattr(user, name) for name in CACHED_FIELDS)
+    get_user_cache().set(user_cache_key(user.pk), (version, values), settings.JWT_USER_CACHE_TTL)
+
+
+def invalidate_cached_user(user_id):
+    """Stop every worker from serving the cached copy of a user"""
+    cache = get_user_cache()
+    version_key = user_version_key(user_id)
+    cache.add(version_key, 0, timeout=None)
+    cache.incr(version_key)
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that serves the token's user from the cache"""
+
+    def get_user(self, validated_token):
+        # Revocation checks compare against the password hash, which is not cached
+        if not settings.JWT_USER_CACHE_TTL or api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user, version = get_cached_user(user_id)
+        if user is None:
+            # Raises for unknown and inactive users, so only active users are cached
+            user = super().get_user(validated_token)
+            cache_user(user, version)
+        return user
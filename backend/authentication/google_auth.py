@@ -1,17 +1,26 @@
 """
 Google OAuth authentication views
 """
+import logging
+import re
 import requests
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
+from .google_tokens import InvalidGoogleToken, KeySourceError, verify_google_id_token
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
+# Concurrent sign-ups can claim the same username; give up after this many
+USERNAME_ATTEMPTS = 5
+
 
 def get_tokens_for_user(user):
     """Generate JWT tokens for user"""
@@ -22,6 +31,43 @@ def get_tokens_for_user(user):
     }
 
 
+def allocate_username(base):
+    """Return base, or base followed by the smallest free counter, with a single query"""
+    # startswith is a range scan on the username index, the counter suffix is checked here
+    numbered = re.compile(rf'{re.escape(base)}[0-9]*')
+    taken = {
+        username
+        for username in User.objects.filter(username__startswith=base).values_list('username', flat=True)
+        if numbered.fullmatch(username)
+    }
+    username = base
+    counter = 1
+    while username in taken:
+        username = f"{base}{counter}"
+        counter += 1
+    return username
+
+
+def get_or_create_google_user(email, defaults):
+    """Return (user, created) for a Google email, naming new users after the part before @"""
+    user = User.objects.filter(email=email).first()
+    if user is not None:
+        return user, False
+
+    base = email.split('@')[0]
+    for attempt in range(USERNAME_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return User.objects.create(email=email, username=allocate_username(base), **defaults), True
+        except IntegrityError:
+            # Either the same user signed up concurrently or another sign-up took the username
+            user = User.objects.filter(email=email).first()
+            if user is not None:
+                return user, False
+            if attempt == USERNAME_ATTEMPTS - 1:
+                raise
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def google_auth(request):
@@ -38,24 +84,19 @@ def google_auth(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Verify the ID token with Google
-        google_response = requests.get(
-            f'https://oauth2.googleapis.com/tokeninfo?id_token={id_token}'
-        )
-        
-        if google_response.status_code != 200:
+        # Verify the ID token locally against Google's signing keys
+        try:
+            google_data = verify_google_id_token(id_token)
+        except InvalidGoogleToken as e:
             return Response(
-                {'error': 'Invalid ID token'}, 
+                {'error': str(e)}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        google_data = google_response.json()
-        
-        # Verify the audience (client ID)
-        if google_data.get('aud') != settings.GOOGLE_OAUTH_CLIENT_ID:
+        except KeySourceError:
+            logger.exception("Google signing keys are unavailable")
             return Response(
-                {'error': 'Invalid token audience'}, 
-                status=status.HTTP_400_BAD_REQUEST
+                {'error': 'Google sign-in is temporarily unavailable'}, 
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
         
         # Extract user information
@@ -71,21 +112,10 @@ def google_auth(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Extract username from email (part before @)
-        username = email.split('@')[0]
-        
-        # Ensure username is unique
-        original_username = username
-        counter = 1
-        while User.objects.filter(username=username).exists():
-            username = f"{original_username}{counter}"
-            counter += 1
-
-        # Check if user exists
-        user, created = User.objects.get_or_create(
-            email=email,
+        # Look up the user, creating them with a fresh username on first sign-in
+        user, created = get_or_create_google_user(
+            email,
             defaults={
-                'username': username,
                 'first_name': first_name,
                 'last_name': last_name,
                 'is_active': True,
@@ -0,0 +1,246 @@
+"""
+Local verification of Google ID tokens
+
+Google signs ID tokens with RS256 keys published as a JWKS document. Tokens
+are checked here against those keys (signature, issuer, audience, expiry)
+instead of asking the tokeninfo endpoint on every sign-in.
+
+Keys come from GOOGLE_JWKS_KEY_SOURCE. HttpJWKSKeySource fetches the
+published document, keeps it in memory and in the default cache for as long
+as its Cache-Control max-age allows, and refreshes it in a background thread
+shortly before it expires. A token signed with a key id it has not seen
+triggers one early refresh, rate limited, to pick up rotated keys. When a
+refresh fails the keys it has keep being used and further attempts back off,
+so an outage of the JWKS endpoint does not put a fetch in front of every
+sign-in.
+FileJWKSKeySource reads a JWKS file and never touches the network, for tests
+and offline development.
+"""
+import json
+import logging
+import re
+import threading
+import time
+import jwt
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+# Seconds of clock skew tolerated on exp, iat and nbf
+LEEWAY = 60
+
+JWKS_CACHE_KEY = 'google-jwks'
+
+
+class InvalidGoogleToken(Exception):
+    """Raised when an ID token fails verification"""
+    pass
+
+
+class KeySourceError(Exception):
+    """Raised when no signing keys could be loaded"""
+    pass
+
+
+def parse_jwks(jwks):
+    """Map key ids to PyJWK keys, skipping keys that cannot verify RS256"""
+    keys = {}
+    for data in jwks.get('keys', []):
+        try:
+            key = jwt.PyJWK(data)
+        except jwt.PyJWTError:
+            continue
+        if key.key_id:
+            keys[key.key_id] = key
+    return keys
+
+
+def parse_max_age(response):
+    """Seconds a response may be cached for according to Cache-Control and Age, or None"""
+    match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+    if not match:
+        return None
+    try:
+        age = int(response.headers.get('Age', 0))
+    except ValueError:
+        age = 0
+    return max(int(match.group(1)) - age, 0)
+
+
+class StaticJWKSKeySource:
+    """Keys from a JWKS document held in memory"""
+
+    def __init__(self, jwks):
+        self.keys = parse_jwks(jwks)
+
+    def get_key(self, kid):
+        return self.keys.get(kid)
+
+
+class FileJWKSKeySource(StaticJWKSKeySource):
+    """Keys from a local JWKS file, GOOGLE_JWKS_FILE by default"""
+
+    def __init__(self, path=None):
+        with open(path or settings.GOOGLE_JWKS_FILE, encoding='utf-8') as f:
+            super().__init__(json.load(f))
+
+
+class HttpJWKSKeySource:
+    """Keys fetched from a JWKS URL and cached for their Cache-Control max-age"""
+
+    def __init__(
+        self, url=None, timeout=None, default_max_age=3600, refresh_margin=300, min_refresh_interval=60,
+        max_retry_interval=900,
+    ):
+        self.url = url or settings.GOOGLE_JWKS_URL
+        self.timeout = timeout or settings.GOOGLE_JWKS_TIMEOUT
+        self.default_max_age = default_max_age
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+        self.max_retry_interval = max_retry_interval
+        self.session = requests.Session()
+        self.keys = {}
+        self.expires_at = 0.0
+        self.fetched_at = 0.0
+        # No refresh before retry_at after failures, the interval doubles with each one
+        self.retry_at = 0.0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get_key(self, kid):
+        now = time.time()
+        if not self.keys:
+            self.refresh()
+        elif now >= self.retry_at:
+            if now >= self.expires_at:
+                self.refresh()
+            elif now >= self.expires_at - self.refresh_margin:
+                self.refresh_in_background()
+
+        key = self.keys.get(kid)
+        if key is None and time.time() >= max(self.fetched_at + self.min_refresh_interval, self.retry_at):
+            # Google may have rotated in a key this process has not fetched yet
+            self.refresh(force=True)
+            key = self.keys.get(kid)
+        return key
+
+    def refresh(self, force=False):
+        """Load the keys from the shared cache, or fetch them when it has nothing newer"""
+        with self._lock:
+            now = time.time()
+            if not force and self.keys and (now < self.expires_at - self.refresh_margin or now < self.retry_at):
+                # Another thread refreshed, or failed to, while this one waited
+                return
+
+            cached = cache.get(JWKS_CACHE_KEY)
+            if (
+                not force
+                and cached is not None
+                and cached['expires_at'] > self.expires_at
+                and time.time() < cached['expires_at'] - self.refresh_margin
+            ):
+                self.load(cached['jwks'], cached['expires_at'])
+                return
+
+            try:
+                jwks, max_age = self.fetch()
+            except (requests.RequestException, ValueError) as e:
+                if not self.keys:
+                    raise KeySourceError(f"Could not fetch Google signing keys: {e}") from e
+                # Keep verifying with the keys we have, Google rotates with overlap
+                self.failures += 1
+                retry_interval = min(self.min_refresh_interval * 2 ** (self.failures - 1), self.max_retry_interval)
+                logger.warning("Refreshing Google signing keys failed, retrying in %ds: %s", retry_interval, e)
+                self.fetched_at = time.time()
+                self.retry_at = self.fetched_at + retry_interval
+                return
+
+            expires_at = time.time() + max_age
+            self.load(jwks, expires_at)
+            cache.set(JWKS_CACHE_KEY, {'jwks': jwks, 'expires_at': expires_at}, max_age)
+
+    def refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except KeySourceError as e:
+                logger.warning("Background refresh of Google signing keys failed: %s", e)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='google-jwks-refresh', daemon=True).start()
+
+    def fetch(self):
+        response = self.session.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        max_age = parse_max_age(response)
+        return response.json(), self.default_max_age if max_age is None else max_age
+
+    def load(self, jwks, expires_at):
+        keys = parse_jwks(jwks)
+        if not keys:
+            raise KeySourceError("Google JWKS contained no usable keys")
+        self.keys = keys
+        self.expires_at = expires_at
+        self.fetched_at = time.time()
+        self.retry_at = 0.0
+        self.failures = 0
+
+
+_key_source = None
+_key_source_lock = threading.Lock()
+
+
+def get_key_source():
+    """Return the process-wide key source configured by GOOGLE_JWKS_KEY_SOURCE"""
+    global _key_source
+    if _key_source is None:
+        with _key_source_lock:
+            if _key_source is None:
+                _key_source = import_string(settings.GOOGLE_JWKS_KEY_SOURCE)()
+    return _key_source
+
+
+def reset_key_source():
+    """Drop the key source so the next call rebuilds it from settings"""
+    global _key_source
+    with _key_source_lock:
+        _key_source = None
+
+
+def verify_google_id_token(token, audience=None, key_source=None):
+    """Verify a Google ID token and return its claims"""
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.PyJWTError as e:
+        raise InvalidGoogleToken('Invalid ID token') from e
+
+    key = (key_source or get_key_source()).get_key(header.get('kid'))
+    if key is None:
+        raise InvalidGoogleToken('Invalid ID token')
+
+    try:
+        return jwt.decode(
+            token,
+            key.key,
+            algorithms=['RS256'],
+            audience=audience or settings.GOOGLE_OAUTH_CLIENT_ID,
+            issuer=GOOGLE_ISSUERS,
+            leeway=LEEWAY,
+            options={'require': ['exp', 'iat', 'iss', 'aud', 'sub']},
+        )
+    except jwt.InvalidAudienceError as e:
+        raise InvalidGoogleToken('Invalid token audience') from e
+    except jwt.PyJWTError as e:
+        raise InvalidGoogleToken('Invalid ID token') from e
@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .authentication import invalidate_cached_user
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user_on_change(sender, instance, **kwargs):
+    """Drop the cached copy once the change is committed, so a concurrent request cannot re-cache the old row"""
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
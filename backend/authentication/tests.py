@@ -0,0 +1,193 @@
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+import jwt
+import requests
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from .authentication import CachedJWTAuthentication, cache_user, get_cached_user, get_user_cache, invalidate_cached_user
+from .google_auth import allocate_username, get_or_create_google_user
+from .google_tokens import (
+    FileJWKSKeySource,
+    HttpJWKSKeySource,
+    InvalidGoogleToken,
+    KeySourceError,
+    verify_google_id_token,
+)
+from .models import User
+
+
+@override_settings(JWT_USER_CACHE_TTL=60)
+class CachedJWTAuthenticationTests(TestCase):
+    """Cached token users and their invalidation"""
+
+    def setUp(self):
+        get_user_cache().clear()
+        self.addCleanup(get_user_cache().clear)
+        self.user = User.objects.create_user('cached', 'cached@example.com', 'password')
+        self.token = {'user_id': self.user.pk}
+        self.auth = CachedJWTAuthentication()
+
+    def test_cached_user_needs_no_query(self):
+        self.auth.get_user(self.token)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.auth.get_user(self.token).pk, self.user.pk)
+
+    def test_deactivated_user_is_rejected(self):
+        self.auth.get_user(self.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(self.token)
+
+    def test_row_cached_while_the_user_changed_is_not_served(self):
+        _, version = get_cached_user(self.user.pk)
+        # The user changes between reading the version and caching the row
+        invalidate_cached_user(self.user.pk)
+        cache_user(self.user, version)
+        self.assertEqual(get_cached_user(self.user.pk)[0], None)
+
+
+class GoogleUserTests(TestCase):
+    """Usernames and accounts for Google sign-ups"""
+
+    def test_allocate_username(self):
+        self.assertEqual(allocate_username('ann'), 'ann')
+        for username in ['ann', 'ann1', 'ann3', 'annie', 'Ann2', 'ann.b']:
+            User.objects.create_user(username, f'{username}@example.com')
+        self.assertEqual(allocate_username('ann'), 'ann2')
+        self.assertEqual(allocate_username('ann.'), 'ann.')
+
+    def test_retries_when_the_username_is_taken_meanwhile(self):
+        User.objects.create_user('bob', 'other@example.com')
+        with mock.patch('authentication.google_auth.allocate_username', side_effect=['bob', 'bob1']):
+            user, created = get_or_create_google_user('bob@example.com', {})
+        self.assertTrue(created)
+        self.assertEqual(user.username, 'bob1')
+
+    def test_concurrent_sign_up_of_the_same_email(self):
+        existing = User.objects.create_user('carol', 'carol@example.com')
+        real_filter = User.objects.filter
+        lookups = []
+
+        def filter(*args, **kwargs):
+            # The first email lookup runs before the other sign-up commits
+            lookups.append(kwargs)
+            return User.objects.none() if len(lookups) == 1 else real_filter(*args, **kwargs)
+
+        with mock.patch.object(User.objects, 'filter', side_effect=filter):
+            user, created = get_or_create_google_user('carol@example.com', {})
+        self.assertFalse(created)
+        self.assertEqual(user, existing)
+
+    def test_gives_up_after_repeated_conflicts(self):
+        User.objects.create_user('dave', 'other@example.com')
+        with mock.patch('authentication.google_auth.allocate_username', return_value='dave'):
+            with self.assertRaises(IntegrityError):
+                get_or_create_google_user('dave@example.com', {})
+
+
+def make_key(kid):
+    """Return (private key, public JWK) for a fresh RSA key"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({'kid': kid, 'alg': 'RS256', 'use': 'sig'})
+    return private_key, jwk
+
+
+@override_settings(GOOGLE_OAUTH_CLIENT_ID='client-id')
+class GoogleIdTokenTests(TestCase):
+    """Local verification of Google ID tokens"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.private_key, cls.jwk = make_key('key-1')
+        cls.other_key, cls.other_jwk = make_key('key-2')
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'keys': [self.jwk]}, f)
+        self.addCleanup(os.unlink, f.name)
+        self.key_source = FileJWKSKeySource(f.name)
+
+    def make_token(self, private_key=None, kid='key-1', **claims):
+        now = int(time.time())
+        payload = {
+            'iss': 'https://accounts.google.com', 'aud': 'client-id', 'sub': '1234',
+            'email': 'user@example.com', 'iat': now, 'exp': now + 3600,
+        }
+        payload.update(claims)
+        return jwt.encode(payload, private_key or self.private_key, algorithm='RS256', headers={'kid': kid})
+
+    def verify(self, token):
+        return verify_google_id_token(token, key_source=self.key_source)
+
+    def test_valid_token(self):
+        self.assertEqual(self.verify(self.make_token())['email'], 'user@example.com')
+
+    def test_rejects_bad_signature(self):
+        with self.assertRaises(InvalidGoogleToken):
+            self.verify(self.make_token(private_key=self.other_key))
+
+    def test_rejects_other_audience(self):
+        with self.assertRaisesMessage(InvalidGoogleToken, 'Invalid token audience'):
+            self.verify(self.make_token(aud='someone-else'))
+
+    def test_rejects_other_issuer(self):
+        with self.assertRaises(InvalidGoogleToken):
+            self.verify(self.make_token(iss='https://evil.example.com'))
+
+    def test_rejects_expired_token(self):
+        past = int(time.time()) - 7200
+        with self.assertRaises(InvalidGoogleToken):
+            self.verify(self.make_token(iat=past, exp=past + 3600))
+
+    def test_rejects_unknown_key(self):
+        with self.assertRaises(InvalidGoogleToken):
+            self.verify(self.make_token(private_key=self.other_key, kid='key-2'))
+
+    def test_unknown_key_triggers_a_refresh(self):
+        key_source = HttpJWKSKeySource(url='https://keys.example.com', timeout=1, min_refresh_interval=0)
+        key_source.load({'keys': [self.jwk]}, time.time() + 3600)
+        with mock.patch.object(key_source, 'fetch', return_value=({'keys': [self.jwk, self.other_jwk]}, 3600)) as fetch:
+            claims = verify_google_id_token(
+                self.make_token(private_key=self.other_key, kid='key-2'), key_source=key_source,
+            )
+        self.assertEqual(claims['sub'], '1234')
+        self.assertEqual(fetch.call_count, 1)
+
+
+class HttpJWKSKeySourceTests(TestCase):
+    """Refreshing the published Google signing keys"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        _, self.jwk = make_key('key-1')
+        self.key_source = HttpJWKSKeySource(url='https://keys.example.com', timeout=1)
+
+    def test_failed_refresh_keeps_the_keys_and_backs_off(self):
+        self.key_source.load({'keys': [self.jwk]}, time.time() - 1)
+        with mock.patch.object(self.key_source, 'fetch', side_effect=requests.ConnectionError('down')) as fetch:
+            for _ in range(5):
+                self.assertIsNotNone(self.key_source.get_key('key-1'))
+        self.assertEqual(fetch.call_count, 1)
+
+        # Once the backoff has passed the next sign-in tries again
+        self.key_source.retry_at = 0.0
+        with mock.patch.object(self.key_source, 'fetch', return_value=({'keys': [self.jwk]}, 3600)) as fetch:
+            self.key_source.get_key('key-1')
+        self.assertEqual(fetch.call_count, 1)
+        self.assertGreater(self.key_source.expires_at, time.time())
+
+    def test_no_keys_at_all_is_an_error(self):
+        with mock.patch.object(self.key_source, 'fetch', side_effect=requests.ConnectionError('down')):
+            with self.assertRaises(KeySourceError):
+                self.key_source.get_key('key-1')
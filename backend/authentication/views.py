@@ -4,6 +4,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
+from .authentication import invalidate_cached_user
 from .models import User
 from .serializers import (
     UserRegistrationSerializer,
@@ -20,7 +21,6 @@ class RegisterView(generics.CreateAPIView):
     permission_classes = [AllowAny]
     
     def create(self, request, *args, **kwargs):
-        print(f"Registration data received: {request.data}")  # Debug logging
         serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
             print(f"Validation errors: {serializer.errors}")  # Debug logging
@@ -44,7 +44,6 @@ class LoginView(generics.GenericAPIView):
     permission_classes = [AllowAny]
     
     def post(self, request, *args, **kwargs):
-        print(f"Login data received: {request.data}")  # Debug logging
         serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
             print(f"Login validation errors: {serializer.errors}")  # Debug logging
@@ -68,6 +67,9 @@ class ProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_object(self):
+        # request.user may be a cached copy, update a fresh one
+        if self.request.method in ('PUT', 'PATCH'):
+            return User.objects.get(pk=self.request.user.pk)
         return self.request.user
 
 
@@ -75,6 +77,7 @@ class ProfileView(generics.RetrieveUpdateAPIView):
 @permission_classes([IsAuthenticated])
 def logout_view(request):
     """User logout view"""
+    invalidate_cached_user(request.user.pk)
     try:
         refresh_token = request.data.get('refresh_token')
         if refresh_token:
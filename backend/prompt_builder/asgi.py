@@ -3,6 +3,11 @@ ASGI config for prompt_builder project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with uvicorn workers so the async execute views can keep many Gemini
+calls in flight per process:
+
+    gunicorn prompt_builder.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -0,0 +1,287 @@
+"""
+Per-request timing breakdown and Prometheus-style metrics
+
+RequestMetricsMiddleware counts every request and its latency per view. A
+sample of requests (REQUEST_METRICS_SAMPLE_RATE) additionally gets a
+breakdown:
+
+- db: queries and their time, through an execute wrapper on every connection
+- llm: time spent waiting on the LLM provider (prompts.services), summed over
+  the parallel calls of a batch
+- render: time spent rendering response bodies to JSON (TimedJSONRenderer);
+  building serializer data inside the view is not included
+
+The breakdown of a sampled request is returned in a Server-Timing header and
+added to the aggregates served by metrics_view. Aggregates are kept per
+process, so with several workers each one reports its own counters.
+metrics_view answers requests carrying REQUEST_METRICS_TOKEN or coming from
+an address in REQUEST_METRICS_ALLOWED_IPS, and is off when neither is set.
+"""
+import contextvars
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from rest_framework.renderers import JSONRenderer
+
+PHASES = ('db', 'llm', 'render')
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Time spent per phase during one sampled request"""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.db_queries = 0
+        # Batch execution records from several threads at once
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds, queries=0):
+        with self._lock:
+            self.seconds[phase] += seconds
+            self.db_queries += queries
+
+    def server_timing(self, total):
+        """Render the breakdown as a Server-Timing header value"""
+        parts = [f'db;dur={self.seconds["db"] * 1000:.1f};desc="{self.db_queries} queries"']
+        parts.extend(f"{phase};dur={self.seconds[phase] * 1000:.1f}" for phase in PHASES[1:])
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ', '.join(parts)
+
+
+def start_sampling():
+    """Begin collecting a breakdown for the current request, returning the token to stop it"""
+    return _current.set(RequestTimings())
+
+
+def stop_sampling(token):
+    """Stop collecting and return the request's timings"""
+    timings = _current.get()
+    _current.reset(token)
+    return timings
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to the current request's phase, if it is sampled"""
+
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start)
+
+
+def query_timer(execute, sql, params, many, context):
+    """Database execute wrapper that times queries of sampled requests"""
+
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add('db', time.perf_counter() - start, queries=1)
+
+
+def install_query_timer(connection, **kwargs):
+    """Attach the query timer to a database connection once"""
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+def enable_query_timing():
+    """Time queries on every database connection opened from now on"""
+    connection_created.connect(install_query_timer, dispatch_uid='request-metrics-query-timer')
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSON renderer that records its time as the request's render phase"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class MetricsRegistry:
+    """Per-process aggregates of request counts, latencies and phase timings"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._latency = {}
+        self._sampled = {}
+
+    def record(self, view, method, status, total, timings=None):
+        with self._lock:
+            key = (view, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+            histogram = self._latency.get((view, method))
+            if histogram is None:
+                histogram = self._latency[(view, method)] = {
+                    'buckets': [0] * len(LATENCY_BUCKETS),
+                    'sum': 0.0,
+                    'count': 0,
+                }
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if total <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += total
+            histogram['count'] += 1
+
+            if timings is not None:
+                sampled = self._sampled.get((view, method))
+                if sampled is None:
+                    sampled = self._sampled[(view, method)] = {
+                        'count': 0,
+                        'db_queries': 0,
+                        'total': 0.0,
+                        **{phase: 0.0 for phase in PHASES},
+                    }
+                sampled['count'] += 1
+                sampled['db_queries'] += timings.db_queries
+                sampled['total'] += total
+                for phase in PHASES:
+                    sampled[phase] += timings.seconds[phase]
+
+    def render_prometheus(self):
+        """Render the aggregates in the Prometheus text exposition format"""
+
+        with self._lock:
+            requests = dict(self._requests)
+            latency = {key: dict(value, buckets=list(value['buckets'])) for key, value in self._latency.items()}
+            sampled = {key: dict(value) for key, value in self._sampled.items()}
+
+        lines = [
+            '# HELP http_requests_total Requests handled, by view, method and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (view, method, status), count in sorted(requests.items()):
+            lines.append(f'http_requests_total{{view="{view}",method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            '# HELP http_request_duration_seconds Request latency, by view and method.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (view, method), histogram in sorted(latency.items()):
+            labels = f'view="{view}",method="{method}"'
+            for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {histogram["sum"]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {histogram["count"]}')
+
+        counters = [
+            ('http_requests_sampled_total', 'count', 'Requests with a timing breakdown.'),
+            ('http_request_sampled_seconds_total', 'total', 'Total latency of sampled requests.'),
+            ('http_request_db_queries_total', 'db_queries', 'Database queries issued by sampled requests.'),
+            ('http_request_db_seconds_total', 'db', 'Database time of sampled requests.'),
+            ('http_request_llm_seconds_total', 'llm', 'LLM provider time of sampled requests.'),
+            ('http_request_render_seconds_total', 'render', 'Response rendering time of sampled requests.'),
+        ]
+        for name, field, description in counters:
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+            for (view, method), values in sorted(sampled.items()):
+                value = values[field]
+                formatted = f"{value:.6f}" if isinstance(value, float) else str(value)
+                lines.append(f'{name}{{view="{view}",method="{method}"}} {formatted}')
+
+        lines += self.render_llm_client_metrics()
+        lines += self.render_semantic_cache_metrics()
+        return '\n'.join(lines) + '\n'
+
+    def render_llm_client_metrics(self):
+        """Gauges for the shared LLM client pool and the circuit breaker"""
+
+        from prompts.clients import get_client_pool_stats
+        from prompts.resilience import CircuitBreaker, circuit_breaker
+
+        stats = get_client_pool_stats()
+        return [
+            '# HELP llm_client_pool_size Configured Gemini models kept in this process.',
+            '# TYPE llm_client_pool_size gauge',
+            f"llm_client_pool_size {stats['pool_size']}",
+            '# HELP llm_client_model_reuse_ratio Share of model lookups served from the pool.',
+            '# TYPE llm_client_model_reuse_ratio gauge',
+            f"llm_client_model_reuse_ratio {stats['model_reuse_rate']:.4f}",
+            '# HELP llm_client_connection_reuse_ratio Share of LLM requests sent over an already-open client.',
+            '# TYPE llm_client_connection_reuse_ratio gauge',
+            f"llm_client_connection_reuse_ratio {stats['connection_reuse_rate']:.4f}",
+            '# HELP llm_circuit_open Whether the LLM circuit breaker is failing calls fast.',
+            '# TYPE llm_circuit_open gauge',
+            f"llm_circuit_open {int(circuit_breaker.state == CircuitBreaker.OPEN)}",
+        ]
+
+    def render_semantic_cache_metrics(self):
+        """Lookups, hits, index size and lookup latency of the semantic response cache"""
+
+        from prompts.semantic_cache import get_semantic_cache_stats
+
+        stats = get_semantic_cache_stats()
+        return [
+            '# HELP semantic_cache_lookups_total Near-duplicate lookups after an exact cache miss.',
+            '# TYPE semantic_cache_lookups_total counter',
+            f"semantic_cache_lookups_total {stats['lookups']}",
+            '# HELP semantic_cache_hits_total Lookups answered with a near-duplicate\'s cached response.',
+            '# TYPE semantic_cache_hits_total counter',
+            f"semantic_cache_hits_total {stats['hits']}",
+            '# HELP semantic_cache_stale_total Neighbours found whose response had left the exact cache.',
+            '# TYPE semantic_cache_stale_total counter',
+            f"semantic_cache_stale_total {stats['stale']}",
+            '# HELP semantic_cache_hit_ratio Share of lookups that were hits.',
+            '# TYPE semantic_cache_hit_ratio gauge',
+            f"semantic_cache_hit_ratio {stats['hit_rate']:.4f}",
+            '# HELP semantic_cache_lookup_seconds_total Time spent embedding and searching the indexes.',
+            '# TYPE semantic_cache_lookup_seconds_total counter',
+            f"semantic_cache_lookup_seconds_total {stats['lookup_seconds']:.6f}",
+            '# HELP semantic_cache_entries Inputs held in the vector indexes of this process.',
+            '# TYPE semantic_cache_entries gauge',
+            f"semantic_cache_entries {stats['entries']}",
+            '# HELP semantic_cache_partitions Vector indexes (category, style, model, user) in this process.',
+            '# TYPE semantic_cache_partitions gauge',
+            f"semantic_cache_partitions {stats['partitions']}",
+            '# HELP semantic_cache_index_bytes Memory held by the index vectors.',
+            '# TYPE semantic_cache_index_bytes gauge',
+            f"semantic_cache_index_bytes {stats['index_bytes']}",
+        ]
+
+
+registry = MetricsRegistry()
+
+
+def metrics_view(request):
+    """
+    Serve the aggregated metrics to scrapers that present REQUEST_METRICS_TOKEN
+    or connect from an address in REQUEST_METRICS_ALLOWED_IPS.
+
+    The endpoint is hidden (404) when neither is configured. Only REMOTE_ADDR
+    is checked, forwarded-for headers are not trusted.
+    """
+
+    token = settings.REQUEST_METRICS_TOKEN
+    allowed_ips = settings.REQUEST_METRICS_ALLOWED_IPS
+    if not token and not allowed_ips:
+        raise Http404
+
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    authorized = bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
+    if not authorized and request.META.get('REMOTE_ADDR') not in allowed_ips:
+        return HttpResponseForbidden()
+
+    return HttpResponse(registry.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,115 @@
+"""
+Project-level middleware
+"""
+import random
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .metrics import (
+    enable_query_timing,
+    install_query_timer,
+    registry,
+    start_sampling,
+    stop_sampling,
+)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise middleware that can also run in an async middleware chain.
+
+    The stock middleware is sync-only, which forces Django to run every ASGI
+    request through a single thread-sensitive executor and serialises the
+    async execute views behind it.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+    
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class RequestMetricsMiddleware:
+    """
+    Record latency per view and, for a sample of requests, where the time went.
+
+    Sampled requests get a Server-Timing header with their database, LLM and
+    response rendering time. For streamed responses the numbers cover the time until
+    the response starts, not the stream itself.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = settings.REQUEST_METRICS_ENABLED
+        self.sample_rate = settings.REQUEST_METRICS_SAMPLE_RATE
+        self.server_timing = settings.REQUEST_METRICS_SERVER_TIMING
+        if self.enabled:
+            enable_query_timing()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        
+        token = self.begin()
+        if token is not None:
+            # Connections opened before the signal handler was connected need the timer too
+            install_query_timer(connection)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            timings = stop_sampling(token) if token is not None else None
+        return self.finish(request, response, time.perf_counter() - start, timings)
+    
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        
+        token = self.begin()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timings = stop_sampling(token) if token is not None else None
+        return self.finish(request, response, time.perf_counter() - start, timings)
+    
+    def begin(self):
+        """Decide whether to sample this request, returning the sampling token if so"""
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            return start_sampling()
+        return None
+    
+    def finish(self, request, response, total, timings):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else 'unresolved'
+        registry.record(view, request.method, response.status_code, total, timings)
+        
+        if timings is not None and self.server_timing:
+            response['Server-Timing'] = timings.server_timing(total)
+        return response
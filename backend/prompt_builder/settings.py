@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -60,9 +61,10 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'prompt_builder.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'prompt_builder.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -151,7 +153,7 @@ AUTH_USER_MODEL = 'authentication.User'
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -159,13 +161,27 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'prompt_builder.metrics.TimedJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
     ],
 }
 
+# Request metrics: every request is counted per view, REQUEST_METRICS_SAMPLE_RATE
+# of them also record database, LLM and response rendering time (returned in a
+# Server-Timing header when REQUEST_METRICS_SERVER_TIMING is on). Aggregates
+# are served at /metrics/ to requests with the REQUEST_METRICS_TOKEN bearer
+# token or from an address in REQUEST_METRICS_ALLOWED_IPS (loopback only in
+# DEBUG, nothing otherwise); with neither set the endpoint is off.
+REQUEST_METRICS_ENABLED = config('REQUEST_METRICS_ENABLED', default=True, cast=bool)
+REQUEST_METRICS_SAMPLE_RATE = config('REQUEST_METRICS_SAMPLE_RATE', default=0.05, cast=float)
+REQUEST_METRICS_SERVER_TIMING = config('REQUEST_METRICS_SERVER_TIMING', default=DEBUG, cast=bool)
+REQUEST_METRICS_TOKEN = config('REQUEST_METRICS_TOKEN', default='')
+REQUEST_METRICS_ALLOWED_IPS = [
+    ip.strip() for ip in config('REQUEST_METRICS_ALLOWED_IPS', default='127.0.0.1,::1' if DEBUG else '').split(',') if ip.strip()
+]
+
 # JWT configuration
 from datetime import timedelta
 
@@ -183,12 +199,185 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
 }
 
+# Authenticated users are cached in JWT_USER_CACHE for this many seconds
+# instead of being loaded on every request (0 disables). Saves, deletes and
+# logout invalidate the entry for every worker sharing that cache.
+JWT_USER_CACHE_TTL = config('JWT_USER_CACHE_TTL', default=60, cast=int)
+JWT_USER_CACHE = config('JWT_USER_CACHE', default='shared')
+
 # CORS configuration
 CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS', default='http://localhost:3000').split(',')
 CORS_ALLOW_CREDENTIALS = True
 
+# LLM provider used by the execute endpoints, as a dotted path to a provider
+# class: prompts.providers.GeminiProvider, or prompts.providers.FakeProvider to
+# answer locally (load tests, offline development)
+LLM_PROVIDER = config('LLM_PROVIDER', default='prompts.providers.GeminiProvider')
+# Fake provider profile: latency_distribution is one of constant, uniform,
+# normal or lognormal around latency_median seconds (latency_spread for
+# uniform/normal, latency_sigma for lognormal); for streams the latency is the
+# time to the first chunk. throttle_rate/error_rate inject 429s and 503s.
+LLM_FAKE_PROVIDER = {
+    'seed': config('LLM_FAKE_SEED', default=42, cast=int),
+    'latency_distribution': config('LLM_FAKE_LATENCY_DISTRIBUTION', default='lognormal'),
+    'latency_median': config('LLM_FAKE_LATENCY_MEDIAN', default=0.8, cast=float),
+    'latency_spread': config('LLM_FAKE_LATENCY_SPREAD', default=0.3, cast=float),
+    'latency_sigma': config('LLM_FAKE_LATENCY_SIGMA', default=0.5, cast=float),
+    'error_rate': config('LLM_FAKE_ERROR_RATE', default=0.0, cast=float),
+    'throttle_rate': config('LLM_FAKE_THROTTLE_RATE', default=0.0, cast=float),
+    'stream_chunk_size': config('LLM_FAKE_STREAM_CHUNK_SIZE', default=40, cast=int),
+    'stream_chunk_delay': config('LLM_FAKE_STREAM_CHUNK_DELAY', default=0.02, cast=float),
+    'response_words': config('LLM_FAKE_RESPONSE_WORDS', default=200, cast=int),
+}
+
 # Google Gemini configuration
 GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
+GEMINI_MODEL = config('GEMINI_MODEL', default='gemini-1.5-flash')
+GEMINI_GENERATION_CONFIG = {
+    'max_output_tokens': 2000,
+    'temperature': 0.7,
+}
+# Transport for the shared client ('grpc', 'rest' or empty for the SDK default),
+# how many (model, config) instances each process keeps, and whether to open
+# the connection at startup instead of on the first request
+GEMINI_TRANSPORT = config('GEMINI_TRANSPORT', default='')
+GEMINI_CLIENT_POOL_SIZE = config('GEMINI_CLIENT_POOL_SIZE', default=8, cast=int)
+GEMINI_WARMUP = config('GEMINI_WARMUP', default=False, cast=bool)
+
+# Resilience for LLM calls: per-attempt and overall deadlines (seconds),
+# retries with jittered exponential backoff for transient errors, optional
+# hedging (a second attempt once the first runs past the recent p95 latency,
+# or GEMINI_HEDGE_DELAY until GEMINI_HEDGE_MIN_SAMPLES calls have been seen)
+# and a circuit breaker that fails fast for GEMINI_CIRCUIT_RESET_TIMEOUT
+# seconds after GEMINI_CIRCUIT_FAILURE_THRESHOLD consecutive failures
+GEMINI_REQUEST_TIMEOUT = config('GEMINI_REQUEST_TIMEOUT', default=30, cast=float)
+GEMINI_TOTAL_DEADLINE = config('GEMINI_TOTAL_DEADLINE', default=60, cast=float)
+GEMINI_MAX_RETRIES = config('GEMINI_MAX_RETRIES', default=2, cast=int)
+GEMINI_RETRY_BASE_DELAY = 0.5
+GEMINI_RETRY_MAX_DELAY = 8.0
+GEMINI_HEDGING_ENABLED = config('GEMINI_HEDGING_ENABLED', default=False, cast=bool)
+GEMINI_HEDGE_DELAY = config('GEMINI_HEDGE_DELAY', default=5.0, cast=float)
+GEMINI_HEDGE_MIN_SAMPLES = 20
+GEMINI_HEDGE_MAX_WORKERS = config('GEMINI_HEDGE_MAX_WORKERS', default=16, cast=int)
+GEMINI_CIRCUIT_FAILURE_THRESHOLD = config('GEMINI_CIRCUIT_FAILURE_THRESHOLD', default=5, cast=int)
+GEMINI_CIRCUIT_RESET_TIMEOUT = config('GEMINI_CIRCUIT_RESET_TIMEOUT', default=30, cast=float)
+
+# Outbound LLM rate limiting. Request counters live in LLM_RATE_LIMIT_CACHE,
+# the shared cache by default, so every worker draws from the same budget. The
+# global rate is halved on each provider 429 (down to LLM_RATE_LIMIT_MIN_MULTIPLIER
+# of the configured rate) and recovers by LLM_RATE_LIMIT_RECOVERY_STEP per success.
+LLM_RATE_LIMIT_ENABLED = config('LLM_RATE_LIMIT_ENABLED', default=True, cast=bool)
+LLM_RATE_LIMIT_CACHE = config('LLM_RATE_LIMIT_CACHE', default='shared')
+LLM_RATE_LIMIT_GLOBAL_PER_MINUTE = config('LLM_RATE_LIMIT_GLOBAL_PER_MINUTE', default=600, cast=float)
+LLM_RATE_LIMIT_GLOBAL_BURST = config('LLM_RATE_LIMIT_GLOBAL_BURST', default=20, cast=int)
+LLM_RATE_LIMIT_USER_PER_MINUTE = config('LLM_RATE_LIMIT_USER_PER_MINUTE', default=60, cast=float)
+LLM_RATE_LIMIT_USER_BURST = config('LLM_RATE_LIMIT_USER_BURST', default=10, cast=int)
+LLM_RATE_LIMIT_MAX_WAIT = config('LLM_RATE_LIMIT_MAX_WAIT', default=10, cast=float)
+LLM_RATE_LIMIT_MIN_MULTIPLIER = 0.1
+LLM_RATE_LIMIT_RECOVERY_STEP = 0.05
+
+# Prompt templates: extra JSON template files, pinned versions per category
+# (e.g. {'doubt': 1}) and how often database templates are reloaded (seconds)
+PROMPT_TEMPLATES_DIR = config('PROMPT_TEMPLATES_DIR', default='')
+PROMPT_TEMPLATE_VERSIONS = {}
+PROMPT_TEMPLATE_RELOAD_INTERVAL = config('PROMPT_TEMPLATE_RELOAD_INTERVAL', default=60, cast=int)
+
+# Compression of stored generated prompts and AI responses: the preset
+# dictionary version used for new rows (see prompts/compression_dictionaries)
+# and the zlib level
+PROMPT_COMPRESSION_DICTIONARY = config('PROMPT_COMPRESSION_DICTIONARY', default=1, cast=int)
+PROMPT_COMPRESSION_LEVEL = config('PROMPT_COMPRESSION_LEVEL', default=6, cast=int)
+
+# Prompt history import (/api/prompts/import/): most prompts accepted per request.
+# The import_prompts management command has no limit.
+PROMPT_IMPORT_MAX_PROMPTS = config('PROMPT_IMPORT_MAX_PROMPTS', default=100000, cast=int)
+
+# Batch execution (/api/prompts/execute-batch/)
+GEMINI_BATCH_CONCURRENCY = config('GEMINI_BATCH_CONCURRENCY', default=4, cast=int)
+GEMINI_BATCH_MAX_ITEMS = config('GEMINI_BATCH_MAX_ITEMS', default=10, cast=int)
+
+# Gemini response cache
+# Point GEMINI_CACHE_BACKEND at a shared backend (Redis or the database cache)
+# so that every gunicorn worker sees the same entries.
+GEMINI_CACHE_ENABLED = config('GEMINI_CACHE_ENABLED', default=True, cast=bool)
+GEMINI_CACHE_BACKEND = config('GEMINI_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+GEMINI_CACHE_LOCATION = config('GEMINI_CACHE_LOCATION', default='gemini-responses')
+GEMINI_CACHE_TTL = config('GEMINI_CACHE_TTL', default=3600, cast=int)
+GEMINI_CACHE_MAX_ENTRIES = config('GEMINI_CACHE_MAX_ENTRIES', default=1000, cast=int)
+
+# Cache shared by every worker, for state that must agree across processes
+# such as the LLM rate limit counters, cached users and dashboard stats. It needs atomic increments across
+# processes, so outside DEBUG it has to be Redis or Memcached; the in-process
+# default only suits a single development server.
+SHARED_CACHE_BACKEND = config(
+    'SHARED_CACHE_BACKEND',
+    default='django.core.cache.backends.locmem.LocMemCache' if DEBUG else 'django.core.cache.backends.redis.RedisCache',
+)
+SHARED_CACHE_LOCATION = config('SHARED_CACHE_LOCATION', default='shared' if DEBUG else 'redis://localhost:6379/0')
+
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+# Shared, but incr is a read followed by a write
+NON_ATOMIC_CACHE_BACKENDS = (
+    'django.core.cache.backends.db.DatabaseCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+)
+if SHARED_CACHE_BACKEND in NON_ATOMIC_CACHE_BACKENDS or (not DEBUG and SHARED_CACHE_BACKEND in PROCESS_LOCAL_CACHE_BACKENDS):
+    raise ImproperlyConfigured(
+        f"SHARED_CACHE_BACKEND={SHARED_CACHE_BACKEND} is not shared between workers with atomic "
+        "increments, use Redis or Memcached"
+    )
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': SHARED_CACHE_BACKEND,
+        'LOCATION': SHARED_CACHE_LOCATION,
+    },
+    'gemini_responses': {
+        'BACKEND': GEMINI_CACHE_BACKEND,
+        'LOCATION': GEMINI_CACHE_LOCATION,
+        'TIMEOUT': GEMINI_CACHE_TTL,
+    },
+}
+
+# Redis evicts through its own maxmemory-policy (use allkeys-lru), the other
+# backends cap the number of entries themselves
+if 'redis' not in GEMINI_CACHE_BACKEND:
+    CACHES['gemini_responses']['OPTIONS'] = {
+        'MAX_ENTRIES': GEMINI_CACHE_MAX_ENTRIES,
+    }
+
+# Semantic cache: near-duplicate inputs (same category, style, model, rendered
+# template and, by default, user) reuse a response from the cache above when
+# the cosine similarity of their embeddings reaches SEMANTIC_CACHE_THRESHOLD.
+# Needs NumPy and GEMINI_CACHE_ENABLED. Indexes are per process and hold up to
+# SEMANTIC_CACHE_MAX_ENTRIES inputs for each of SEMANTIC_CACHE_MAX_PARTITIONS partitions.
+# Templates that render the username keep users apart even with
+# SEMANTIC_CACHE_PER_USER off, which only lets users share under templates that do not.
+SEMANTIC_CACHE_ENABLED = config('SEMANTIC_CACHE_ENABLED', default=False, cast=bool)
+SEMANTIC_CACHE_THRESHOLD = config('SEMANTIC_CACHE_THRESHOLD', default=0.9, cast=float)
+SEMANTIC_CACHE_PER_USER = config('SEMANTIC_CACHE_PER_USER', default=True, cast=bool)
+SEMANTIC_CACHE_MAX_ENTRIES = config('SEMANTIC_CACHE_MAX_ENTRIES', default=2000, cast=int)
+SEMANTIC_CACHE_MAX_PARTITIONS = config('SEMANTIC_CACHE_MAX_PARTITIONS', default=1000, cast=int)
+SEMANTIC_CACHE_EMBEDDER = config('SEMANTIC_CACHE_EMBEDDER', default='prompts.semantic_cache.HashedNgramEmbedder')
+SEMANTIC_CACHE_EMBEDDER_OPTIONS = {
+    'dimensions': config('SEMANTIC_CACHE_DIMENSIONS', default=512, cast=int),
+}
+
+# Dashboard stats snapshot, kept in DASHBOARD_STATS_CACHE and invalidated for
+# every worker sharing that cache when a prompt save or delete commits.
+DASHBOARD_STATS_CACHE_TTL = config('DASHBOARD_STATS_CACHE_TTL', default=300, cast=int)
+DASHBOARD_STATS_CACHE = config('DASHBOARD_STATS_CACHE', default='shared')
+
+# Background execution workers (manage.py run_execution_workers)
+EXECUTION_WORKERS = config('EXECUTION_WORKERS', default=4, cast=int)
+EXECUTION_JOB_POLL_INTERVAL = config('EXECUTION_JOB_POLL_INTERVAL', default=1.0, cast=float)
+EXECUTION_JOB_TIMEOUT = config('EXECUTION_JOB_TIMEOUT', default=600, cast=int)
 
 # Django Sites Framework
 SITE_ID = 1
@@ -232,6 +421,15 @@ SOCIALACCOUNT_PROVIDERS = {
 GOOGLE_OAUTH_CLIENT_ID = config('GOOGLE_OAUTH_CLIENT_ID', default='')
 GOOGLE_OAUTH_CLIENT_SECRET = config('GOOGLE_OAUTH_CLIENT_SECRET', default='')
 
+# Google ID tokens are verified locally against Google's published signing keys.
+# The JWKS is cached for its Cache-Control max-age and refreshed in the background;
+# use authentication.google_tokens.FileJWKSKeySource with GOOGLE_JWKS_FILE to
+# verify against a local JWKS instead (tests, offline development).
+GOOGLE_JWKS_KEY_SOURCE = config('GOOGLE_JWKS_KEY_SOURCE', default='authentication.google_tokens.HttpJWKSKeySource')
+GOOGLE_JWKS_URL = config('GOOGLE_JWKS_URL', default='https://www.googleapis.com/oauth2/v3/certs')
+GOOGLE_JWKS_FILE = config('GOOGLE_JWKS_FILE', default='')
+GOOGLE_JWKS_TIMEOUT = config('GOOGLE_JWKS_TIMEOUT', default=5, cast=float)
+
 # Security settings for production
 if not DEBUG:
     SECURE_BROWSER_XSS_FILTER = True
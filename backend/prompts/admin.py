@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Prompt
+from .models import ExecutionJob, Prompt, PromptTemplate
 
 
 @admin.register(Prompt)
@@ -7,7 +7,7 @@ class PromptAdmin(admin.ModelAdmin):
     list_display = ['title', 'user', 'category', 'response_style', 'created_at']
     list_filter = ['category', 'response_style', 'created_at']
     search_fields = ['title', 'user__username', 'input_text']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['generated_prompt', 'ai_response', 'created_at', 'updated_at']
     
     fieldsets = (
         (None, {
@@ -22,3 +22,20 @@ class PromptAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+
+@admin.register(ExecutionJob)
+class ExecutionJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'status', 'save_result', 'attempts', 'created_at', 'finished_at']
+    list_filter = ['status', 'save_result', 'created_at']
+    search_fields = ['user__username']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
+
+
+
+@admin.register(PromptTemplate)
+class PromptTemplateAdmin(admin.ModelAdmin):
+    list_display = ['category', 'version', 'description_label', 'is_active', 'updated_at']
+    list_filter = ['category', 'is_active']
+    readonly_fields = ['created_at', 'updated_at']
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class PromptsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'prompts'
+
+    def ready(self):
+        from django.conf import settings
+        from . import signals  # noqa: F401
+        
+        if settings.GEMINI_WARMUP and settings.GEMINI_API_KEY:
+            from .clients import start_warm_up
+            start_warm_up()
@@ -0,0 +1,129 @@
+"""
+Async prompt execution views for ASGI deployments
+
+Plain Django async views rather than DRF views (DRF has no async support), so
+they authenticate with the JWT header and validate with the DRF serializers
+themselves. The Gemini call is awaited, leaving the worker free to serve other
+requests while it is in flight.
+"""
+import json
+import math
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import exceptions, status
+from authentication.authentication import CachedJWTAuthentication
+from .ratelimit import RateLimitExceeded
+from .resilience import CircuitOpenError
+from .serializers import ExecutePromptSerializer, PromptSerializer
+from .services import acreate_and_execute_prompt, aexecute_prompt_only
+
+
+async def authenticate_request(request):
+    """Authenticate a request from its JWT header, returning the user or None"""
+    result = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    return result[0] if result else None
+
+
+async def validate_execute_request(request):
+    """Authenticate and validate an execute request, returning (data, error_response)"""
+    
+    try:
+        user = await authenticate_request(request)
+    except exceptions.APIException as e:
+        return None, JsonResponse({'detail': e.detail}, status=e.status_code)
+    
+    if user is None:
+        return None, JsonResponse(
+            {'detail': 'Authentication credentials were not provided.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return None, JsonResponse(
+            {'detail': 'JSON parse error'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    request.user = user
+    serializer = ExecutePromptSerializer(data=payload, context={'request': request})
+    if not await sync_to_async(serializer.is_valid)():
+        return None, JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    return serializer.validated_data, None
+
+
+def execution_error_response(e):
+    """Map an error raised while executing a prompt to the response the sync views give"""
+    
+    if isinstance(e, (RateLimitExceeded, CircuitOpenError)):
+        # The circuit breaker failing fast is a 503, running out of budget a 429
+        code = (
+            status.HTTP_503_SERVICE_UNAVAILABLE if isinstance(e, CircuitOpenError)
+            else status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        response = JsonResponse({
+            'error': str(e)
+        }, status=code)
+        if e.retry_after:
+            response['Retry-After'] = str(math.ceil(e.retry_after))
+        return response
+    
+    if isinstance(e, ValueError):
+        return JsonResponse({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    return JsonResponse({
+        'error': f'Failed to execute prompt: {str(e)}'
+    }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_POST
+async def execute_prompt_async_view(request):
+    """Execute a prompt with Gemini (without saving) on the event loop"""
+    
+    data, error_response = await validate_execute_request(request)
+    if error_response is not None:
+        return error_response
+    
+    try:
+        result = await aexecute_prompt_only(user=request.user, data=data)
+        
+        return JsonResponse({
+            'generated_prompt': result['generated_prompt'],
+            'response': result['ai_response'],
+            'cached': result['cached']
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        return execution_error_response(e)
+
+
+@csrf_exempt
+@require_POST
+async def execute_and_save_prompt_async_view(request):
+    """Execute a prompt with Gemini and store the result on the event loop, updating the prompt when prompt_id is given"""
+    
+    data, error_response = await validate_execute_request(request)
+    if error_response is not None:
+        return error_response
+    
+    # prompt_id was checked against the user by ExecutePromptSerializer
+    created = 'prompt' not in data
+    try:
+        prompt, ai_response, cached = await acreate_and_execute_prompt(user=request.user, data=data)
+        prompt_data = await sync_to_async(lambda: PromptSerializer(prompt).data)()
+        
+        return JsonResponse({
+            'prompt': prompt_data,
+            'response': ai_response,
+            'cached': cached
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+        
+    except Exception as e:
+        return execution_error_response(e)
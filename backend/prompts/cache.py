@@ -0,0 +1,85 @@
+"""
+Content-addressed cache for Gemini responses
+"""
+import hashlib
+import json
+import logging
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ALIAS = 'gemini_responses'
+RESPONSE_CACHE_KEY_PREFIX = 'gemini-response'
+
+
+def get_response_cache():
+    """Return the Django cache backing the response cache"""
+    return caches[RESPONSE_CACHE_ALIAS]
+
+
+def response_cache_enabled():
+    """Check whether response caching is switched on"""
+    return getattr(settings, 'GEMINI_CACHE_ENABLED', False)
+
+
+def make_response_cache_key(model_name, generation_config, prompt_hash):
+    """Build a cache key from a hash of the model, generation config and prompt text hash"""
+    payload = json.dumps(
+        {
+            'model': model_name,
+            'config': generation_config,
+            'prompt': prompt_hash,
+        },
+        sort_keys=True,
+        separators=(',', ':'),
+    )
+    digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    return f"{RESPONSE_CACHE_KEY_PREFIX}:{digest}"
+
+
+def get_cached_response(cache_key):
+    """Return the cached response for a key, or None on a miss"""
+    if not response_cache_enabled():
+        return None
+
+    try:
+        return get_response_cache().get(cache_key)
+    except Exception as e:
+        # A broken cache must never break prompt execution
+        logger.warning(f"Response cache read failed: {str(e)}")
+        return None
+
+
+def set_cached_response(cache_key, response_text):
+    """Store a response under a key for the configured TTL"""
+    if not response_cache_enabled() or not response_text:
+        return
+
+    try:
+        get_response_cache().set(cache_key, response_text)
+    except Exception as e:
+        logger.warning(f"Response cache write failed: {str(e)}")
+
+
+async def aget_cached_response(cache_key):
+    """Async version of get_cached_response"""
+    if not response_cache_enabled():
+        return None
+
+    try:
+        return await get_response_cache().aget(cache_key)
+    except Exception as e:
+        logger.warning(f"Response cache read failed: {str(e)}")
+        return None
+
+
+async def aset_cached_response(cache_key, response_text):
+    """Async version of set_cached_response"""
+    if not response_cache_enabled() or not response_text:
+        return
+
+    try:
+        await get_response_cache().aset(cache_key, response_text)
+    except Exception as e:
+        logger.warning(f"Response cache write failed: {str(e)}")
@@ -0,0 +1,126 @@
+"""
+Process-wide pool of configured Gemini models
+
+Building a GenerativeModel and GenerationConfig per request is cheap on its
+own, but reconfiguring the SDK drops its cached transport and with it the open
+gRPC/HTTP connection. The SDK is configured once per process here and one
+model is kept per (model name, generation config), so every request reuses the
+same underlying client and connection.
+"""
+import json
+import logging
+import threading
+from collections import OrderedDict
+import google.generativeai as genai
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_configured = False
+_models = OrderedDict()
+_seen_clients = set()
+_stats = {
+    'models_created': 0,
+    'models_reused': 0,
+    'models_evicted': 0,
+    'requests': 0,
+    'clients_created': 0,
+}
+
+
+def configure_gemini():
+    """Configure the Gemini SDK once per process"""
+    global _configured
+
+    if _configured:
+        return
+
+    with _lock:
+        if _configured:
+            return
+        if not getattr(settings, 'GEMINI_API_KEY', ''):
+            raise ValueError("Gemini API key not configured")
+
+        options = {'api_key': settings.GEMINI_API_KEY}
+        if settings.GEMINI_TRANSPORT:
+            options['transport'] = settings.GEMINI_TRANSPORT
+        genai.configure(**options)
+        _configured = True
+
+
+def get_model(model_name=None, generation_config=None):
+    """Return the shared model for a (model, generation config) pair, creating it on first use"""
+
+    configure_gemini()
+
+    model_name = model_name or settings.GEMINI_MODEL
+    if generation_config is None:
+        generation_config = settings.GEMINI_GENERATION_CONFIG
+    key = (model_name, json.dumps(generation_config, sort_keys=True))
+
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            _models.move_to_end(key)
+            _stats['models_reused'] += 1
+            return model
+
+        model = genai.GenerativeModel(
+            model_name,
+            generation_config=genai.types.GenerationConfig(**generation_config)
+        )
+        _models[key] = model
+        _stats['models_created'] += 1
+
+        while len(_models) > settings.GEMINI_CLIENT_POOL_SIZE:
+            _models.popitem(last=False)
+            _stats['models_evicted'] += 1
+
+        return model
+
+
+def record_request(model):
+    """Count a request and whether it went over an already-open client"""
+
+    # The SDK attaches its process-wide client to the model on first use
+    clients = [client for client in (model._client, model._async_client) if client is not None]
+    with _lock:
+        _stats['requests'] += 1
+        for client in clients:
+            if id(client) not in _seen_clients:
+                _seen_clients.add(id(client))
+                _stats['clients_created'] += 1
+
+
+def get_client_pool_stats():
+    """Return pool counters plus model and connection reuse rates"""
+
+    with _lock:
+        stats = dict(_stats)
+        stats['pool_size'] = len(_models)
+
+    lookups = stats['models_created'] + stats['models_reused']
+    stats['model_reuse_rate'] = stats['models_reused'] / lookups if lookups else 0.0
+    stats['connection_reuse_rate'] = (
+        1 - stats['clients_created'] / stats['requests'] if stats['requests'] else 0.0
+    )
+    return stats
+
+
+def warm_up():
+    """Configure the SDK, build the default model and open its connection ahead of the first request"""
+
+    try:
+        model = get_model()
+        # Counting tokens goes over the same generative client and opens its connection
+        model.count_tokens('warm up')
+        record_request(model)
+        logger.info("Gemini client warmed up")
+    except Exception as e:
+        logger.warning(f"Gemini client warm-up failed: {str(e)}")
+
+
+def start_warm_up():
+    """Warm the client up in a background thread so startup is not delayed"""
+    threading.Thread(target=warm_up, name='gemini-warm-up', daemon=True).start()
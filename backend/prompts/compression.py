@@ -0,0 +1,101 @@
+"""
+Compression for the large prompt text columns
+
+Values are zlib streams primed with a preset dictionary of text that keeps
+recurring in prompts: the literal parts of the prompt templates and common
+response phrasing. Each stored value starts with one format byte:
+
+- 0: uncompressed UTF-8, used when compression would not make it smaller
+- n > 0: zlib with dictionary version n
+
+Dictionaries live in compression_dictionaries/v<n>.txt and must never change
+once rows reference them; train a new version with the
+train_compression_dictionary command and select it with
+PROMPT_COMPRESSION_DICTIONARY instead. The empty string is stored as empty
+bytes so that ``field=''`` lookups keep working.
+"""
+import zlib
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from django.conf import settings
+
+DICTIONARY_DIR = Path(__file__).resolve().parent / 'compression_dictionaries'
+
+FORMAT_RAW = 0
+
+# zlib only uses the last 32 KiB of a preset dictionary
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+
+@lru_cache(maxsize=None)
+def load_dictionary(version):
+    """Return the preset dictionary bytes for a version"""
+    path = DICTIONARY_DIR / f"v{version}.txt"
+    if not path.exists():
+        raise ValueError(f"Unknown compression dictionary version: {version}")
+    return path.read_bytes()
+
+
+def compress_text(text, version=None, level=None):
+    """Compress text for storage, returning bytes"""
+
+    if not text:
+        return b''
+
+    raw = text.encode('utf-8')
+    version = version or settings.PROMPT_COMPRESSION_DICTIONARY
+    compressor = zlib.compressobj(
+        level if level is not None else settings.PROMPT_COMPRESSION_LEVEL,
+        zdict=load_dictionary(version),
+    )
+    compressed = compressor.compress(raw) + compressor.flush()
+
+    if len(compressed) >= len(raw):
+        return bytes([FORMAT_RAW]) + raw
+    return bytes([version]) + compressed
+
+
+def decompress_text(data):
+    """Turn stored bytes back into text"""
+
+    if not data:
+        return ''
+
+    data = bytes(data)
+    version, payload = data[0], data[1:]
+    if version == FORMAT_RAW:
+        return payload.decode('utf-8')
+
+    decompressor = zlib.decompressobj(zdict=load_dictionary(version))
+    return (decompressor.decompress(payload) + decompressor.flush()).decode('utf-8')
+
+
+def train_dictionary(template_bodies, samples=(), size=MAX_DICTIONARY_SIZE, min_count=2):
+    """
+    Build a preset dictionary from template bodies and sample texts.
+
+    Template literals recur in every generated prompt, and lines that recur
+    across samples are likely to recur in future rows. zlib finds matches near
+    the end of the dictionary most cheaply, so the most valuable strings go last.
+    """
+    from .prompt_templates import compile_segments
+
+    scores = Counter()
+    for body in template_bodies:
+        for literal, _ in compile_segments(body):
+            literal = literal.strip('\n')
+            if literal:
+                # Template text appears in every prompt rendered from it
+                scores[literal] += len(literal) * 1000
+
+    line_counts = Counter()
+    for sample in samples:
+        line_counts.update({line.strip() for line in sample.splitlines() if len(line.strip()) > 3})
+    for line, count in line_counts.items():
+        if count >= min_count:
+            scores[line] += len(line) * count
+
+    ordered = sorted(scores, key=lambda text: (scores[text], text))
+    dictionary = '\n'.join(ordered).encode('utf-8')
+    return dictionary[-size:]
@@ -0,0 +1,30 @@
+"""
+Custom model fields
+"""
+from django.db import models
+from .compression import compress_text, decompress_text
+
+
+class CompressedTextField(models.TextField):
+    """
+    Text field stored compressed in a binary column.
+
+    Behaves like a TextField everywhere outside the database (forms, admin,
+    serializers), values are compressed on write and decompressed on load.
+    Only exact lookups against the empty string are meaningful in SQL.
+    """
+
+    def get_internal_type(self):
+        return 'BinaryField'
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decompress_text(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        return connection.Database.Binary(compress_text(value))
@@ -0,0 +1,150 @@
+"""
+Database-backed queue for background prompt execution
+"""
+import logging
+import threading
+from datetime import timedelta
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import ExecutionJob
+from .services import create_and_execute_prompt, execute_prompt_only
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_execution_job(user, data, save=False):
+    """Queue a prompt execution for the worker pool"""
+    # The payload is stored as JSON, the worker reloads the prompt from prompt_id
+    payload = {key: value for key, value in data.items() if key != 'prompt'}
+    return ExecutionJob.objects.create(
+        user=user,
+        prompt_id=data.get('prompt_id'),
+        payload=payload,
+        save_result=save,
+    )
+
+
+def claim_next_job():
+    """
+    Claim the oldest queued job, or return None when the queue is empty.
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED so concurrent workers never block on
+    each other's rows; the conditional UPDATE keeps the claim safe on backends
+    without row locks (SQLite ignores select_for_update).
+    """
+    with transaction.atomic():
+        job = (
+            ExecutionJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=ExecutionJob.STATUS_QUEUED)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        
+        started_at = timezone.now()
+        claimed = ExecutionJob.objects.filter(
+            pk=job.pk,
+            status=ExecutionJob.STATUS_QUEUED
+        ).update(
+            status=ExecutionJob.STATUS_RUNNING,
+            started_at=started_at,
+            attempts=F('attempts') + 1
+        )
+        if not claimed:
+            return None
+    
+    job.status = ExecutionJob.STATUS_RUNNING
+    job.started_at = started_at
+    job.attempts += 1
+    return job
+
+
+def run_job(job):
+    """Execute a claimed job and record its outcome"""
+    
+    data = dict(job.payload)
+    
+    try:
+        if job.save_result:
+            prompt, ai_response, cached = create_and_execute_prompt(job.user, data)
+            job.prompt = prompt
+            job.generated_prompt = prompt.generated_prompt
+        else:
+            result = execute_prompt_only(job.user, data)
+            job.generated_prompt = result['generated_prompt']
+            ai_response = result['ai_response']
+            cached = result['cached']
+        
+        job.ai_response = ai_response
+        job.cached = cached
+        job.status = ExecutionJob.STATUS_DONE
+    
+    except Exception as e:
+        logger.error(f"Execution job {job.id} failed: {str(e)}")
+        job.error = str(e)
+        job.status = ExecutionJob.STATUS_FAILED
+    
+    job.finished_at = timezone.now()
+    job.save(update_fields=[
+        'prompt', 'generated_prompt', 'ai_response', 'cached',
+        'error', 'status', 'finished_at'
+    ])
+    return job
+
+
+def process_next_job():
+    """Claim and run a single job, returning it or None when the queue is empty"""
+    job = claim_next_job()
+    if job is not None:
+        run_job(job)
+    return job
+
+
+def requeue_stale_jobs(timeout):
+    """Put jobs left running longer than timeout seconds (e.g. by a killed worker) back on the queue"""
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return ExecutionJob.objects.filter(
+        status=ExecutionJob.STATUS_RUNNING,
+        started_at__lt=cutoff
+    ).update(status=ExecutionJob.STATUS_QUEUED, started_at=None)
+
+
+def run_worker(stop_event, poll_interval=1.0, drain=False):
+    """Process jobs until stop_event is set, or until the queue is empty when drain is True"""
+    
+    try:
+        while not stop_event.is_set():
+            close_old_connections()
+            try:
+                job = process_next_job()
+            except Exception as e:
+                logger.error(f"Execution worker error: {str(e)}")
+                job = None
+            
+            if job is None:
+                if drain:
+                    return
+                stop_event.wait(poll_interval)
+    finally:
+        connection.close()
+
+
+def start_worker_pool(size, poll_interval=1.0, drain=False):
+    """Start size worker threads, returning (threads, stop_event)"""
+    
+    stop_event = threading.Event()
+    threads = []
+    for index in range(size):
+        thread = threading.Thread(
+            target=run_worker,
+            args=(stop_event,),
+            kwargs={'poll_interval': poll_interval, 'drain': drain},
+            name=f"execution-worker-{index}",
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+    return threads, stop_event
@@ -0,0 +1,364 @@
+import itertools
+import json
+import statistics
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+from prompts.models import Prompt, TextBlob
+from prompts.providers import reset_provider
+
+User = get_user_model()
+
+BENCH_USERNAME_PREFIX = 'bench-api-'
+BENCH_PASSWORD = 'bench-api-password-1'
+PROMPT_PAYLOAD = {
+    'input_text': 'How do B-tree indexes speed up ordered scans?',
+    'category': 'doubt',
+    'response_style': 'detailed',
+}
+
+
+class Scenario:
+    """One endpoint to drive: path and body are built per request from the virtual user and request number"""
+
+    def __init__(self, name, method, path, body=None, auth=True, expected_status=200):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.auth = auth
+        self.expected_status = expected_status
+
+    def build(self, bench_user, number):
+        path = self.path(bench_user, number) if callable(self.path) else self.path
+        body = self.body(bench_user, number) if callable(self.body) else self.body
+        return path, body
+
+
+class BenchUser:
+    """A seeded user with an access token and the ids of their prompts"""
+
+    def __init__(self, user, prompt_ids):
+        self.user = user
+        self.token = str(AccessToken.for_user(user))
+        self.prompt_ids = prompt_ids
+
+
+def build_scenarios(run_id):
+    """The endpoints covered by the suite, keyed by name"""
+
+    registrations = itertools.count()
+
+    def register_body(bench_user, number):
+        username = f"{BENCH_USERNAME_PREFIX}reg-{run_id}-{next(registrations)}"
+        return {
+            'username': username,
+            'email': f"{username}@example.com",
+            'password': BENCH_PASSWORD,
+            'confirm_password': BENCH_PASSWORD,
+        }
+
+    scenarios = [
+        Scenario('prompt-list', 'get', '/api/prompts/'),
+        Scenario('prompt-list-summary', 'get', '/api/prompts/?view=summary'),
+        Scenario(
+            'prompt-create', 'post', '/api/prompts/',
+            body=lambda bench_user, number: dict(PROMPT_PAYLOAD, title=f"Benchmark prompt {number}"),
+            expected_status=201,
+        ),
+        Scenario(
+            'prompt-detail', 'get',
+            lambda bench_user, number: f"/api/prompts/{bench_user.prompt_ids[number % len(bench_user.prompt_ids)]}/",
+        ),
+        Scenario('dashboard-stats', 'get', '/api/prompts/dashboard-stats/'),
+        Scenario('execute', 'post', '/api/prompts/execute/', body=PROMPT_PAYLOAD),
+        Scenario(
+            'login', 'post', '/api/auth/login/',
+            body=lambda bench_user, number: {'username': bench_user.user.username, 'password': BENCH_PASSWORD},
+            auth=False,
+        ),
+        Scenario('register', 'post', '/api/auth/register/', body=register_body, auth=False, expected_status=201),
+    ]
+    return {scenario.name: scenario for scenario in scenarios}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed users and prompts, drive the prompts and auth API endpoints with '
+        'concurrent in-process clients and report throughput, latency '
+        'percentiles and query counts. Prompt execution uses the fake LLM '
+        'provider. Run it against a scratch database: it refuses to run '
+        'unless DEBUG is on or --allow-live-db is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Number of seeded users (virtual clients cycle through them)')
+        parser.add_argument('--prompts-per-user', type=int, default=200, help='Prompts seeded for each user')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients per scenario')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per scenario before timing')
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Only run the named scenario (repeatable)',
+        )
+        parser.add_argument('--llm-latency', type=float, default=0.5, help='Median latency of the fake LLM in seconds')
+        parser.add_argument('--llm-error-rate', type=float, default=0.0, help='Share of fake LLM calls that fail')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Compare against a previous JSON results file')
+        parser.add_argument('--threshold', type=float, default=10.0, help='Percent change flagged when comparing')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the benchmark users and prompts afterwards')
+        parser.add_argument(
+            '--allow-live-db', action='store_true',
+            help='Run even though DEBUG is off, i.e. against what may be a production database',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['allow_live_db']:
+            raise CommandError(
+                'DEBUG is off, so this may be a production database. The benchmark seeds users and prompts '
+                'and registers new accounts; pass --allow-live-db to run it anyway.'
+            )
+
+        run_id = timezone.now().strftime('%Y%m%d%H%M%S')
+        scenarios = build_scenarios(run_id)
+        selected = options['scenarios'] or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}. Available: {', '.join(scenarios)}")
+
+        bench_users = self.seed(options['users'], options['prompts_per_user'])
+
+        fake_provider = dict(
+            settings.LLM_FAKE_PROVIDER,
+            latency_median=options['llm_latency'],
+            error_rate=options['llm_error_rate'],
+        )
+        overrides = override_settings(
+            ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver'],
+            LLM_PROVIDER='prompts.providers.FakeProvider',
+            LLM_FAKE_PROVIDER=fake_provider,
+            # Measure the execute path itself, not the response cache or our own throttling
+            GEMINI_CACHE_ENABLED=False,
+            LLM_RATE_LIMIT_ENABLED=False,
+        )
+
+        results = {}
+        with overrides:
+            reset_provider()
+            try:
+                for name in selected:
+                    results[name] = self.run_scenario(scenarios[name], bench_users, options)
+                    self.report(name, results[name])
+            finally:
+                reset_provider()
+
+        output = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'commit': self.git_commit(),
+                'database': connection.vendor,
+                'users': options['users'],
+                'prompts_per_user': options['prompts_per_user'],
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+                'llm_latency': options['llm_latency'],
+                'llm_error_rate': options['llm_error_rate'],
+            },
+            'results': results,
+        }
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(output, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            self.compare(baseline, output, options['threshold'])
+
+        if options['cleanup']:
+            User.objects.filter(username__startswith=BENCH_USERNAME_PREFIX).delete()
+            self.stdout.write('Removed benchmark users and prompts')
+
+    def seed(self, user_count, prompts_per_user):
+        """Create missing benchmark users and give each one prompts_per_user prompts"""
+
+        password = make_password(BENCH_PASSWORD)
+        usernames = [f"{BENCH_USERNAME_PREFIX}{i}" for i in range(user_count)]
+        User.objects.bulk_create(
+            [User(username=username, email=f"{username}@example.com", password=password) for username in usernames],
+            ignore_conflicts=True,
+        )
+        users = list(User.objects.filter(username__in=usernames).order_by('id'))
+
+        start = time.perf_counter()
+        created = 0
+        for user in users:
+            missing = prompts_per_user - Prompt.objects.filter(user=user).count()
+            if missing > 0:
+                # bulk_create skips Prompt.save(), so reference the text blobs and fill the preview here
+                executed = [bool(i % 3) for i in range(missing)]
+                generated_key = TextBlob.objects.acquire('Benchmark generated prompt', count=missing)
+                response_key = TextBlob.objects.acquire('Benchmark response', count=sum(executed))
+                Prompt.objects.bulk_create([
+                    Prompt(
+                        user=user,
+                        title=f"Benchmark prompt {i}",
+                        generated_prompt_blob_id=generated_key,
+                        ai_response_blob_id=response_key if executed[i] else None,
+                        response_preview='Benchmark response' if executed[i] else '',
+                        **PROMPT_PAYLOAD,
+                    )
+                    for i in range(missing)
+                ], batch_size=1000)
+                created += missing
+        if created:
+            self.stdout.write(f"Seeded {created} prompts in {time.perf_counter() - start:.1f}s")
+
+        prompt_ids = {}
+        for user_id, prompt_id in Prompt.objects.filter(user__in=users).values_list('user_id', 'id'):
+            prompt_ids.setdefault(user_id, []).append(prompt_id)
+        return [BenchUser(user, prompt_ids.get(user.id, [])) for user in users]
+
+    def run_scenario(self, scenario, bench_users, options):
+        """Drive one scenario with concurrent clients and summarise the measured requests"""
+
+        concurrency = max(1, options['concurrency'])
+        counter = itertools.count()
+
+        def worker(worker_index, total):
+            client = Client()
+            samples = []
+            try:
+                while True:
+                    number = next(counter)
+                    if number >= total:
+                        break
+                    bench_user = bench_users[(worker_index + number) % len(bench_users)]
+                    samples.append(self.timed_request(client, scenario, bench_user, number))
+            finally:
+                # Worker threads open their own connections
+                close_old_connections()
+                connection.close()
+            return samples
+
+        def run(total):
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = [executor.submit(worker, i, total) for i in range(concurrency)]
+            return [sample for future in futures for sample in future.result()]
+
+        if options['warmup']:
+            run(options['warmup'])
+            counter = itertools.count()
+
+        started = time.perf_counter()
+        samples = run(options['requests'])
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(sample['latency'] for sample in samples)
+        queries = sorted(sample['queries'] for sample in samples)
+        errors = [sample for sample in samples if sample['status'] != scenario.expected_status]
+
+        return {
+            'requests': len(samples),
+            'errors': len(errors),
+            'error_statuses': sorted({sample['status'] for sample in errors}),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+                'p50': round(percentile(latencies, 0.50), 2),
+                'p95': round(percentile(latencies, 0.95), 2),
+                'p99': round(percentile(latencies, 0.99), 2),
+                'max': round(latencies[-1], 2) if latencies else 0.0,
+            },
+            'queries': {
+                'mean': round(statistics.fmean(queries), 2) if queries else 0.0,
+                'p95': percentile(queries, 0.95),
+                'max': queries[-1] if queries else 0,
+            },
+        }
+
+    def timed_request(self, client, scenario, bench_user, number):
+        """Send one request, returning its status, latency in ms and query count"""
+
+        path, body = scenario.build(bench_user, number)
+        extra = {}
+        if scenario.auth:
+            extra['HTTP_AUTHORIZATION'] = f"Bearer {bench_user.token}"
+        if body is not None:
+            extra['data'] = json.dumps(body)
+            extra['content_type'] = 'application/json'
+
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = getattr(client, scenario.method)(path, **extra)
+            latency = (time.perf_counter() - start) * 1000
+
+        return {'status': response.status_code, 'latency': latency, 'queries': len(captured)}
+
+    def report(self, name, result):
+        latency = result['latency_ms']
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(
+            f"  {result['requests']} requests, {result['errors']} errors, "
+            f"{result['throughput_rps']} req/s\n"
+            f"  latency ms: p50 {latency['p50']}, p95 {latency['p95']}, "
+            f"p99 {latency['p99']}, max {latency['max']}\n"
+            f"  queries per request: mean {result['queries']['mean']}, max {result['queries']['max']}"
+        )
+
+    def compare(self, baseline, current, threshold):
+        """Print p95 latency, throughput and query changes against a baseline run"""
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Compared with {baseline['meta'].get('commit') or 'baseline'} ({baseline['meta'].get('timestamp')})"
+        ))
+        for name, result in current['results'].items():
+            before = baseline['results'].get(name)
+            if before is None:
+                self.stdout.write(f"  {name}: not in baseline")
+                continue
+
+            changes = [
+                ('p95', before['latency_ms']['p95'], result['latency_ms']['p95'], True),
+                ('req/s', before['throughput_rps'], result['throughput_rps'], False),
+                ('queries', before['queries']['mean'], result['queries']['mean'], True),
+            ]
+            parts = []
+            regressed = False
+            for label, old, new, lower_is_better in changes:
+                delta = (new - old) / old * 100 if old else 0.0
+                parts.append(f"{label} {old} -> {new} ({delta:+.1f}%)")
+                if (delta > threshold) if lower_is_better else (delta < -threshold):
+                    regressed = True
+
+            line = f"  {name}: " + ', '.join(parts)
+            self.stdout.write(self.style.ERROR(line + '  REGRESSION') if regressed else line)
+
+    def git_commit(self):
+        """Short hash of the checked-out commit, if any"""
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
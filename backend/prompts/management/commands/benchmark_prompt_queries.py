@@ -0,0 +1,136 @@
+import random
+import statistics
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from prompts.models import Prompt, TextBlob
+from prompts.pagination import PromptCursorPagination, after_position
+
+User = get_user_model()
+
+BENCH_USERNAME_PREFIX = 'bench-user-'
+
+# The listing order the API uses, matching the (user, -created_at, -id) indexes
+ORDERING = PromptCursorPagination.ordering
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed the prompts table and print query plans and timings for the '
+        'per-user listing queries. Run it against a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Number of prompts to seed')
+        parser.add_argument('--users', type=int, default=1000, help='Number of users to spread them over')
+        parser.add_argument('--batch-size', type=int, default=5000, help='bulk_create batch size')
+        parser.add_argument('--repeat', type=int, default=50, help='Timed runs per query')
+        parser.add_argument('--skip-seed', action='store_true', help='Reuse previously seeded rows')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the seeded users and prompts afterwards')
+
+    def handle(self, *args, **options):
+        if not options['skip_seed']:
+            self.seed(options['rows'], options['users'], options['batch_size'])
+
+        # The heaviest user is the interesting case for the listing queries
+        user = (
+            User.objects
+            .filter(username__startswith=BENCH_USERNAME_PREFIX)
+            .annotate(prompt_count=Count('prompts'))
+            .order_by('-prompt_count')
+            .first()
+        )
+        if user is None:
+            self.stderr.write('No benchmark users found, run without --skip-seed first')
+            return
+
+        self.stdout.write(f"Benchmarking as {user.username} ({user.prompt_count} prompts)\n")
+
+        # Position of the last prompt before the deep page, as a cursor would carry it
+        position = (
+            Prompt.objects.filter(user=user).order_by(*ORDERING).values_list('created_at', 'id')[999:1000].first()
+        )
+
+        queries = {
+            'list page (user, -created_at, -id)': lambda: (
+                Prompt.objects.filter(user=user).order_by(*ORDERING)[:20]
+            ),
+            'deep list page (offset 1000)': lambda: (
+                Prompt.objects.filter(user=user).order_by(*ORDERING)[1000:1020]
+            ),
+            'deep cursor page (after prompt 1000)': lambda: (
+                after_position(Prompt.objects.filter(user=user), *position)[:20]
+            ),
+            'category counts (user, category)': lambda: (
+                Prompt.objects.filter(user=user).order_by().values('category').annotate(total=Count('id'))
+            ),
+            'executed prompts (partial index)': lambda: (
+                Prompt.objects.filter(user=user, ai_response_blob__isnull=False).order_by(*ORDERING)[:20]
+            ),
+        }
+
+        if position is None:
+            # Too few prompts for a deep page
+            del queries['deep cursor page (after prompt 1000)']
+
+        for name, build_queryset in queries.items():
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                list(build_queryset())
+                timings.append((time.perf_counter() - start) * 1000)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(build_queryset().explain())
+            self.stdout.write(
+                f"median {statistics.median(timings):.2f} ms, "
+                f"max {max(timings):.2f} ms over {len(timings)} runs\n"
+            )
+
+        if options['cleanup']:
+            User.objects.filter(username__startswith=BENCH_USERNAME_PREFIX).delete()
+            self.stdout.write('Removed benchmark users and prompts')
+
+    def seed(self, rows, user_count, batch_size):
+        """Insert user_count users and rows prompts with a skewed per-user distribution"""
+
+        users = [
+            User(username=f"{BENCH_USERNAME_PREFIX}{i}", email=f"{BENCH_USERNAME_PREFIX}{i}@example.com")
+            for i in range(user_count)
+        ]
+        User.objects.bulk_create(users, batch_size=batch_size, ignore_conflicts=True)
+        user_ids = list(
+            User.objects.filter(username__startswith=BENCH_USERNAME_PREFIX).values_list('id', flat=True)
+        )
+
+        categories = [choice for choice, _ in Prompt.CATEGORY_CHOICES]
+        styles = [choice for choice, _ in Prompt.STYLE_CHOICES]
+        rng = random.Random(42)
+
+        created = 0
+        start = time.perf_counter()
+        while created < rows:
+            size = min(batch_size, rows - created)
+            executed_flags = [rng.random() < 0.6 for _ in range(size)]
+            # bulk_create skips Prompt.save(), so reference the text blobs and fill the preview here
+            generated_key = TextBlob.objects.acquire('Benchmark generated prompt', count=size)
+            response_key = TextBlob.objects.acquire('Benchmark response', count=sum(executed_flags))
+            batch = []
+            for i, executed in enumerate(executed_flags):
+                # Skew ownership towards the first users to get a few power users with long histories
+                owner = user_ids[int(len(user_ids) * rng.random() ** 3)]
+                batch.append(Prompt(
+                    user_id=owner,
+                    title=f"Benchmark prompt {created + i}",
+                    input_text='How do B-tree indexes speed up ordered scans?',
+                    category=rng.choice(categories),
+                    response_style=rng.choice(styles),
+                    generated_prompt_blob_id=generated_key,
+                    ai_response_blob_id=response_key if executed else None,
+                    response_preview='Benchmark response' if executed else '',
+                ))
+            Prompt.objects.bulk_create(batch, batch_size=batch_size)
+            created += len(batch)
+
+        self.stdout.write(f"Seeded {created} prompts in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,165 @@
+import timeit
+from types import SimpleNamespace
+from django.core.management.base import BaseCommand
+from prompts.models import Prompt
+from prompts.prompt_templates import template_registry
+
+
+def legacy_generate_prompt_template(user, category, input_text, style, description=None):
+    """generate_prompt_template before the registry: all six f-strings built on every call"""
+
+    templates = {
+        'doubt': f"""
+As an AI assistant helping {user.username} (a {user.role}), please provide a {style} answer to the following question:
+
+Question: {input_text}
+
+{f"Additional context: {description}" if description else ""}
+
+Please ensure your response is {style} and tailored to someone with a {user.role} background.
+        """.strip(),
+
+        'image_generation': f"""
+Create a {style} image generation prompt based on the following request from {user.username} (a {user.role}):
+
+Request: {input_text}
+
+{f"Additional requirements: {description}" if description else ""}
+
+Generate a detailed prompt that includes:
+- Visual style and composition
+- Lighting and atmosphere
+- Color palette suggestions
+- Technical specifications
+- Art style references
+
+Make it suitable for AI image generation tools and {style} in nature.
+        """.strip(),
+
+        'learning_roadmap': f"""
+Create a {style} learning roadmap for {user.username} (a {user.role}) on the following topic:
+
+Topic: {input_text}
+
+{f"Learning goals: {description}" if description else ""}
+
+Please provide:
+- Learning objectives
+- Step-by-step progression
+- Recommended resources
+- Time estimates
+- Milestone assessments
+- Practical projects
+
+Tailor the roadmap to a {user.role} background and make it {style}.
+        """.strip(),
+
+        'video_generation': f"""
+Develop a {style} video concept and script for {user.username} (a {user.role}) based on:
+
+Video idea: {input_text}
+
+{f"Additional requirements: {description}" if description else ""}
+
+Please include:
+- Video concept overview
+- Target audience
+- Script outline
+- Visual suggestions
+- Pacing and structure
+- Call-to-action
+
+Make it engaging and {style}, suitable for a {user.role}'s perspective.
+        """.strip(),
+
+        'deep_research': f"""
+Conduct a {style} research analysis for {user.username} (a {user.role}) on:
+
+Research topic: {input_text}
+
+{f"Research focus: {description}" if description else ""}
+
+Please provide:
+- Research methodology
+- Key findings and insights
+- Data analysis
+- Supporting evidence
+- Conclusions and implications
+- Further research suggestions
+
+Present the research in a {style} manner appropriate for a {user.role}.
+        """.strip(),
+
+        'idea_exploration': f"""
+Explore and expand on the following idea for {user.username} (a {user.role}):
+
+Initial idea: {input_text}
+
+{f"Exploration direction: {description}" if description else ""}
+
+Please provide:
+- Concept expansion
+- Creative variations
+- Implementation possibilities
+- Potential challenges
+- Market opportunities
+- Next steps
+
+Make the exploration {style} and relevant to a {user.role}'s perspective.
+        """.strip(),
+    }
+
+    return templates.get(category, templates['doubt'])
+
+
+class Command(BaseCommand):
+    help = (
+        'Micro-benchmark prompt rendering: the old f-string generate_prompt_template as a baseline, '
+        'the registry rendering every category and picking one, and the registry rendering the selected template only'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=100000, help='Renders per measurement')
+        parser.add_argument('--category', default='deep_research', help='Category to render')
+
+    def handle(self, *args, **options):
+        user = SimpleNamespace(username='benchmark', role='developer')
+        categories = [choice for choice, _ in Prompt.CATEGORY_CHOICES]
+        context = {
+            'username': user.username,
+            'role': user.role,
+            'style': 'detailed',
+            'input_text': 'How do B-tree indexes speed up ordered scans?',
+            'description': 'Focus on PostgreSQL',
+        }
+        template_registry.ensure_loaded()
+
+        def render_legacy():
+            return legacy_generate_prompt_template(
+                user, options['category'], context['input_text'], context['style'], context['description']
+            )
+
+        def render_selected():
+            return template_registry.render(options['category'], **context)
+
+        def render_all():
+            rendered = {category: template_registry.render(category, **context) for category in categories}
+            return rendered[options['category']]
+
+        # Only a like-for-like comparison means anything
+        if render_legacy() != render_selected():
+            self.stderr.write("Registry output differs from the legacy f-string template, check database or file overrides")
+
+        number = options['number']
+        timings = {}
+        for name, func in [
+            ('legacy f-string', render_legacy),
+            ('all categories', render_all),
+            ('selected only', render_selected),
+        ]:
+            timings[name] = min(timeit.repeat(func, number=number, repeat=5)) / number
+            self.stdout.write(f"{name:>15}: {timings[name] * 1e6:.2f} us per render")
+
+        self.stdout.write(
+            f"Registry is {timings['legacy f-string'] / timings['selected only']:.2f}x the legacy f-string speed"
+        )
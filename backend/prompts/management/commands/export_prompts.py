@@ -0,0 +1,46 @@
+import sys
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from prompts.models import Prompt
+from prompts.transfer import EXPORT_CHUNK_SIZE, export_rows, iter_gzip, iter_ndjson
+
+
+class Command(BaseCommand):
+    help = (
+        'Export prompts as NDJSON, one object per line, for one user or everyone. '
+        'Exports of all users carry a "user" field with the owner\'s username.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to export, all users when omitted')
+        parser.add_argument('--output', default='-', help='File to write, stdout by default')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output (implied by a .gz output file)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='Rows fetched per database round trip')
+
+    def handle(self, *args, **options):
+        queryset = Prompt.objects.all()
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"Unknown user {options['user']}")
+            queryset = queryset.filter(user=user)
+
+        chunks = iter_ndjson(
+            export_rows(queryset, include_user=not options['user'], chunk_size=options['chunk_size'])
+        )
+        if options['gzip'] or options['output'].endswith('.gz'):
+            chunks = iter_gzip(chunks)
+
+        start = time.perf_counter()
+        written = 0
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+
+        self.stderr.write(f"Wrote {written / 1024 / 1024:.1f} MiB in {time.perf_counter() - start:.1f}s")
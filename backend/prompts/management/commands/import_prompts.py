@@ -0,0 +1,36 @@
+import sys
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from prompts.transfer import IMPORT_BATCH_SIZE, PromptImportError, import_prompts, read_ndjson
+
+
+class Command(BaseCommand):
+    help = (
+        'Import prompts from an NDJSON file, plain or gzipped, in the export_prompts format. '
+        'Nothing is imported if any line is invalid.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read, - for stdin')
+        parser.add_argument('--user', help='Username that owns every imported prompt, otherwise each line\'s "user"')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Prompts per bulk insert')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"Unknown user {options['user']}")
+
+        start = time.perf_counter()
+        source = sys.stdin.buffer if options['path'] == '-' else open(options['path'], 'rb')
+        try:
+            imported = import_prompts(read_ndjson(source), user=user, batch_size=options['batch_size'])
+        except PromptImportError as e:
+            raise CommandError(f"{e} {e.detail if not isinstance(e.detail, str) else ''}".strip())
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+
+        self.stdout.write(f"Imported {imported} prompts in {time.perf_counter() - start:.1f}s")
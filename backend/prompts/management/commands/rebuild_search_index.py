@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from prompts.models import Prompt
+from prompts.search import get_search_backend, prompt_index_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Drop and rebuild the full-text search index from the stored prompts. '
+        'Needed after writing prompts in bulk, which bypasses the signals that keep it current.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Prompts indexed per transaction')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            self.stderr.write(f"Full-text search is not available on {connection.vendor}")
+            return
+
+        with connection.cursor() as cursor:
+            backend.drop(cursor)
+            backend.create(cursor)
+
+        start = time.perf_counter()
+        indexed = 0
+        last_id = 0
+        while True:
+            prompts = list(
+                Prompt.objects.with_texts().filter(id__gt=last_id).order_by('id')[:options['batch_size']]
+            )
+            if not prompts:
+                break
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    backend.index(cursor, prompt_index_rows(prompts))
+            indexed += len(prompts)
+            last_id = prompts[-1].id
+
+        self.stdout.write(f"Indexed {indexed} prompts in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from prompts.jobs import requeue_stale_jobs, start_worker_pool
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of worker threads that execute queued prompt jobs'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.EXECUTION_WORKERS,
+            help='Number of worker threads',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.EXECUTION_JOB_POLL_INTERVAL,
+            help='Seconds an idle worker waits before polling the queue again',
+        )
+        parser.add_argument(
+            '--drain',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling forever',
+        )
+    
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs(settings.EXECUTION_JOB_TIMEOUT)
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s)")
+        
+        threads, stop_event = start_worker_pool(
+            options['workers'],
+            poll_interval=options['poll_interval'],
+            drain=options['drain'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Started {len(threads)} execution worker(s)"))
+        
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1.0)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping workers...')
+            stop_event.set()
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from prompts.compression import DICTIONARY_DIR, MAX_DICTIONARY_SIZE, compress_text, train_dictionary
+from prompts.models import PromptTemplate, TextBlob
+from prompts.prompt_templates import BUILTIN_TEMPLATES
+
+
+class Command(BaseCommand):
+    help = (
+        'Train a new compression dictionary for generated prompts and AI '
+        'responses from the templates and a sample of stored texts. Select it '
+        'with PROMPT_COMPRESSION_DICTIONARY; rows written with older versions stay readable.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=10000, help='Most recent stored texts to sample')
+        parser.add_argument('--size', type=int, default=MAX_DICTIONARY_SIZE, help='Dictionary size in bytes')
+
+    def handle(self, *args, **options):
+        bodies = [template['body'] for template in BUILTIN_TEMPLATES]
+        bodies += list(PromptTemplate.objects.filter(is_active=True).values_list('body', flat=True))
+
+        samples = list(
+            TextBlob.objects.order_by('-created_at').values_list('content', flat=True)[:options['samples']]
+        )
+
+        dictionary = train_dictionary(bodies, samples, size=options['size'])
+
+        existing = [int(path.stem[1:]) for path in DICTIONARY_DIR.glob('v*.txt')]
+        version = max(existing, default=0) + 1
+        if version > 255:
+            self.stderr.write('No dictionary versions left')
+            return
+        path = DICTIONARY_DIR / f"v{version}.txt"
+        path.write_bytes(dictionary)
+
+        raw = sum(len(sample.encode('utf-8')) for sample in samples)
+        compressed = sum(len(compress_text(sample, version=version)) for sample in samples)
+        self.stdout.write(f"Wrote {len(dictionary)} byte dictionary to {path}")
+        if raw:
+            self.stdout.write(f"Sampled text compresses to {compressed / raw:.1%} of its size")
+        self.stdout.write(f"Set PROMPT_COMPRESSION_DICTIONARY={version} to use it for new rows")
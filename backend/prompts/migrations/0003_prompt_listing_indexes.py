@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-17 04:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0002_executionjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(fields=['user', '-created_at'], name='prompt_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(fields=['user', 'category'], name='prompt_user_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(condition=models.Q(('ai_response', ''), _negated=True), fields=['user', '-created_at'], name='prompt_user_executed_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-17 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0003_prompt_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromptTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('doubt', 'Question & Doubt'), ('image_generation', 'Image Generation'), ('learning_roadmap', 'Learning Roadmap'), ('video_generation', 'Video Generation'), ('deep_research', 'Deep Research'), ('idea_exploration', 'Idea Exploration')], max_length=20)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('description_label', models.CharField(default='Additional context', max_length=100)),
+                ('body', models.TextField(help_text='Placeholders: {username}, {role}, {style}, {input_text}, {description_block}')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['category', '-version'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='prompttemplate',
+            constraint=models.UniqueConstraint(fields=('category', 'version'), name='prompttemplate_category_version_uniq'),
+        ),
+    ]
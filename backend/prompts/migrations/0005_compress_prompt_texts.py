@@ -0,0 +1,181 @@
+import hashlib
+import prompts.fields
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 1000
+PREVIEW_LENGTH = 200
+
+# The codec as of this migration, frozen here rather than imported from
+# prompts.compression: one format byte, then zlib at level 6 primed with
+# dictionary v1, or the raw UTF-8 when that is not smaller. Other format bytes
+# name the dictionary the value was written with.
+DICTIONARY_DIR = Path(__file__).resolve().parent.parent / 'compression_dictionaries'
+DICTIONARY_VERSION = 1
+DICTIONARY_SHA256 = '02997267a1ea2ec891c7d58626889fbd58ef1d2a37056ff1a2b405186e4b1d9a'
+COMPRESSION_LEVEL = 6
+FORMAT_RAW = 0
+
+
+@lru_cache(maxsize=None)
+def load_dictionary(version):
+    dictionary = (DICTIONARY_DIR / f"v{version}.txt").read_bytes()
+    if version == DICTIONARY_VERSION and hashlib.sha256(dictionary).hexdigest() != DICTIONARY_SHA256:
+        raise RuntimeError(f"compression_dictionaries/v{version}.txt changed after rows were written with it")
+    return dictionary
+
+
+def compress_text(text):
+    if not text:
+        return b''
+    raw = text.encode('utf-8')
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=load_dictionary(DICTIONARY_VERSION))
+    compressed = compressor.compress(raw) + compressor.flush()
+    if len(compressed) >= len(raw):
+        return bytes([FORMAT_RAW]) + raw
+    return bytes([DICTIONARY_VERSION]) + compressed
+
+
+def decompress_text(data):
+    if not data:
+        return ''
+    data = bytes(data)
+    version, payload = data[0], data[1:]
+    if version == FORMAT_RAW:
+        return payload.decode('utf-8')
+    decompressor = zlib.decompressobj(zdict=load_dictionary(version))
+    return (decompressor.decompress(payload) + decompressor.flush()).decode('utf-8')
+
+
+def iter_batches(Prompt, fields):
+    """Yield lists of (id, *fields) rows in primary key order"""
+    last_id = 0
+    while True:
+        rows = list(
+            Prompt.objects.filter(id__gt=last_id).order_by('id').values_list('id', *fields)[:BATCH_SIZE]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def update_rows(schema_editor, Prompt, columns, params):
+    """Run one UPDATE per row for a batch; executemany is far cheaper than bulk_update's CASE expressions"""
+    quote_name = schema_editor.quote_name
+    assignments = ', '.join(f"{quote_name(column)} = %s" for column in columns)
+    sql = f"UPDATE {quote_name(Prompt._meta.db_table)} SET {assignments} WHERE {quote_name('id')} = %s"
+    with transaction.atomic(using=schema_editor.connection.alias):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+
+def compress_texts(apps, schema_editor):
+    Prompt = apps.get_model('prompts', 'Prompt')
+    Binary = schema_editor.connection.Database.Binary
+    for rows in iter_batches(Prompt, ['generated_prompt', 'ai_response']):
+        update_rows(
+            schema_editor,
+            Prompt,
+            ['generated_prompt_compressed', 'ai_response_compressed', 'response_preview'],
+            [
+                (
+                    Binary(compress_text(generated_prompt)),
+                    Binary(compress_text(ai_response)),
+                    ai_response[:PREVIEW_LENGTH],
+                    prompt_id,
+                )
+                for prompt_id, generated_prompt, ai_response in rows
+            ],
+        )
+
+
+def decompress_texts(apps, schema_editor):
+    Prompt = apps.get_model('prompts', 'Prompt')
+    for rows in iter_batches(Prompt, ['generated_prompt_compressed', 'ai_response_compressed']):
+        update_rows(
+            schema_editor,
+            Prompt,
+            ['generated_prompt', 'ai_response'],
+            [
+                (decompress_text(generated_prompt), decompress_text(ai_response), prompt_id)
+                for prompt_id, generated_prompt, ai_response in rows
+            ],
+        )
+
+
+class Migration(migrations.Migration):
+
+    # Each batch commits on its own so large tables are not rewritten in one transaction
+    atomic = False
+
+    dependencies = [
+        ('prompts', '0004_prompttemplate'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='prompt',
+            name='prompt_user_executed_idx',
+        ),
+        migrations.AddField(
+            model_name='prompt',
+            name='generated_prompt_compressed',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='prompt',
+            name='ai_response_compressed',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='prompt',
+            name='response_preview',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.RunPython(compress_texts, decompress_texts),
+        # Lets the columns be re-added to existing rows when migrating backwards
+        migrations.AlterField(
+            model_name='prompt',
+            name='generated_prompt',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='prompt',
+            name='generated_prompt',
+        ),
+        migrations.RemoveField(
+            model_name='prompt',
+            name='ai_response',
+        ),
+        migrations.RenameField(
+            model_name='prompt',
+            old_name='generated_prompt_compressed',
+            new_name='generated_prompt',
+        ),
+        migrations.RenameField(
+            model_name='prompt',
+            old_name='ai_response_compressed',
+            new_name='ai_response',
+        ),
+        migrations.AlterField(
+            model_name='prompt',
+            name='generated_prompt',
+            field=prompts.fields.CompressedTextField(),
+        ),
+        migrations.AlterField(
+            model_name='prompt',
+            name='ai_response',
+            field=prompts.fields.CompressedTextField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(
+                condition=models.Q(('ai_response', ''), _negated=True),
+                fields=['user', '-created_at'],
+                name='prompt_user_executed_idx',
+            ),
+        ),
+    ]
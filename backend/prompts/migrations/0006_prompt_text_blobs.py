@@ -0,0 +1,180 @@
+import django.db.models.deletion
+import hashlib
+import prompts.fields
+import zlib
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from django.db import migrations, models, transaction
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+# The codec as of this migration, frozen here rather than imported from
+# prompts.compression: one format byte, then zlib at level 6 primed with
+# dictionary v1, or the raw UTF-8 when that is not smaller. Other format bytes
+# name the dictionary the value was written with.
+DICTIONARY_DIR = Path(__file__).resolve().parent.parent / 'compression_dictionaries'
+DICTIONARY_VERSION = 1
+DICTIONARY_SHA256 = '02997267a1ea2ec891c7d58626889fbd58ef1d2a37056ff1a2b405186e4b1d9a'
+COMPRESSION_LEVEL = 6
+FORMAT_RAW = 0
+
+
+@lru_cache(maxsize=None)
+def load_dictionary(version):
+    dictionary = (DICTIONARY_DIR / f"v{version}.txt").read_bytes()
+    if version == DICTIONARY_VERSION and hashlib.sha256(dictionary).hexdigest() != DICTIONARY_SHA256:
+        raise RuntimeError(f"compression_dictionaries/v{version}.txt changed after rows were written with it")
+    return dictionary
+
+
+def compress_text(text):
+    if not text:
+        return b''
+    raw = text.encode('utf-8')
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=load_dictionary(DICTIONARY_VERSION))
+    compressed = compressor.compress(raw) + compressor.flush()
+    if len(compressed) >= len(raw):
+        return bytes([FORMAT_RAW]) + raw
+    return bytes([DICTIONARY_VERSION]) + compressed
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def iter_batches(Prompt, fields):
+    """Yield lists of (id, *fields) rows in primary key order"""
+    last_id = 0
+    while True:
+        rows = list(
+            Prompt.objects.filter(id__gt=last_id).order_by('id').values_list('id', *fields)[:BATCH_SIZE]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def move_texts_to_blobs(apps, schema_editor):
+    Prompt = apps.get_model('prompts', 'Prompt')
+    TextBlob = apps.get_model('prompts', 'TextBlob')
+    connection = schema_editor.connection
+    quote_name = schema_editor.quote_name
+    Binary = connection.Database.Binary
+    blob_table = quote_name(TextBlob._meta.db_table)
+    prompt_table = quote_name(Prompt._meta.db_table)
+
+    for rows in iter_batches(Prompt, ['generated_prompt', 'ai_response']):
+        texts = {}
+        counts = Counter()
+        params = []
+        for prompt_id, generated_prompt, ai_response in rows:
+            keys = []
+            for text in (generated_prompt, ai_response):
+                key = content_hash(text) if text else None
+                if key:
+                    texts[key] = text
+                    counts[key] += 1
+                keys.append(key)
+            params.append((*keys, prompt_id))
+
+        with transaction.atomic(using=connection.alias):
+            existing = set(TextBlob.objects.filter(hash__in=counts).values_list('hash', flat=True))
+            now = connection.ops.adapt_datetimefield_value(timezone.now())
+            with connection.cursor() as cursor:
+                # Written with the frozen codec, the model field would use the current one
+                cursor.executemany(
+                    f"INSERT INTO {blob_table} ({quote_name('hash')}, {quote_name('content')}, "
+                    f"{quote_name('ref_count')}, {quote_name('created_at')}) VALUES (%s, %s, %s, %s)",
+                    [
+                        (key, Binary(compress_text(texts[key])), count, now)
+                        for key, count in counts.items()
+                        if key not in existing
+                    ],
+                )
+                cursor.executemany(
+                    f"UPDATE {blob_table} SET {quote_name('ref_count')} = {quote_name('ref_count')} + %s "
+                    f"WHERE {quote_name('hash')} = %s",
+                    [(counts[key], key) for key in existing],
+                )
+                cursor.executemany(
+                    f"UPDATE {prompt_table} SET {quote_name('generated_prompt_blob_id')} = %s, "
+                    f"{quote_name('ai_response_blob_id')} = %s WHERE {quote_name('id')} = %s",
+                    params,
+                )
+
+
+def move_texts_back(apps, schema_editor):
+    Prompt = apps.get_model('prompts', 'Prompt')
+    connection = schema_editor.connection
+    Binary = connection.Database.Binary
+    quote_name = schema_editor.quote_name
+    sql = (
+        f"UPDATE {quote_name(Prompt._meta.db_table)} SET {quote_name('generated_prompt')} = %s, "
+        f"{quote_name('ai_response')} = %s WHERE {quote_name('id')} = %s"
+    )
+
+    for rows in iter_batches(Prompt, ['generated_prompt_blob__content', 'ai_response_blob__content']):
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, [
+                    (Binary(compress_text(generated_prompt or '')), Binary(compress_text(ai_response or '')), prompt_id)
+                    for prompt_id, generated_prompt, ai_response in rows
+                ])
+
+
+class Migration(migrations.Migration):
+
+    # Each batch commits on its own so large tables are not rewritten in one transaction
+    atomic = False
+
+    dependencies = [
+        ('prompts', '0005_compress_prompt_texts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextBlob',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('content', prompts.fields.CompressedTextField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='prompt',
+            name='prompt_user_executed_idx',
+        ),
+        migrations.AddField(
+            model_name='prompt',
+            name='generated_prompt_blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='prompts.textblob'),
+        ),
+        migrations.AddField(
+            model_name='prompt',
+            name='ai_response_blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='prompts.textblob'),
+        ),
+        migrations.RunPython(move_texts_to_blobs, move_texts_back),
+        # Lets the column be re-added to existing rows when migrating backwards
+        migrations.AlterField(
+            model_name='prompt',
+            name='generated_prompt',
+            field=prompts.fields.CompressedTextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='prompt',
+            name='generated_prompt',
+        ),
+        migrations.RemoveField(
+            model_name='prompt',
+            name='ai_response',
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(condition=models.Q(('ai_response_blob__isnull', False)), fields=['user', '-created_at'], name='prompt_user_executed_idx'),
+        ),
+    ]
@@ -0,0 +1,96 @@
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+# The index as this migration creates it, frozen here rather than imported from
+# prompts.search so later changes to that module cannot change this migration
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS prompts_prompt_fts "
+    "USING fts5(title, input_text, ai_response, owner, tokenize='porter unicode61')",
+]
+SQLITE_INSERT = (
+    "INSERT OR REPLACE INTO prompts_prompt_fts (rowid, title, input_text, ai_response, owner) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+SQLITE_DROP = "DROP TABLE IF EXISTS prompts_prompt_fts"
+
+POSTGRES_CREATE = [
+    "CREATE TABLE IF NOT EXISTS prompts_prompt_search ("
+    "prompt_id bigint PRIMARY KEY REFERENCES prompts_prompt (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "user_id bigint NOT NULL, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS prompts_prompt_search_document_idx ON prompts_prompt_search USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS prompts_prompt_search_user_idx ON prompts_prompt_search (user_id)",
+]
+POSTGRES_INSERT = (
+    "INSERT INTO prompts_prompt_search (prompt_id, user_id, document) VALUES (%s, %s, "
+    "setweight(to_tsvector('english', %s), 'A') || "
+    "setweight(to_tsvector('english', %s), 'B') || "
+    "setweight(to_tsvector('english', %s), 'C')) "
+    "ON CONFLICT (prompt_id) DO UPDATE SET user_id = EXCLUDED.user_id, document = EXCLUDED.document"
+)
+POSTGRES_DROP = "DROP TABLE IF EXISTS prompts_prompt_search"
+
+
+def sqlite_row(prompt_id, user_id, title, input_text, ai_response):
+    return (prompt_id, title, input_text, ai_response, f"u{user_id}")
+
+
+def postgres_row(prompt_id, user_id, title, input_text, ai_response):
+    return (prompt_id, user_id, title, input_text, ai_response)
+
+
+# vendor: (create statements, insert statement, row builder, drop statement)
+SEARCH_INDEXES = {
+    'sqlite': (SQLITE_CREATE, SQLITE_INSERT, sqlite_row, SQLITE_DROP),
+    'postgresql': (POSTGRES_CREATE, POSTGRES_INSERT, postgres_row, POSTGRES_DROP),
+}
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in SEARCH_INDEXES:
+        return
+    create, insert, build_row, _ = SEARCH_INDEXES[connection.vendor]
+
+    Prompt = apps.get_model('prompts', 'Prompt')
+    with connection.cursor() as cursor:
+        for statement in create:
+            cursor.execute(statement)
+
+    last_id = 0
+    while True:
+        rows = list(
+            Prompt.objects.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'user_id', 'title', 'input_text', 'ai_response_blob__content'
+            )[:BATCH_SIZE]
+        )
+        if not rows:
+            return
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.executemany(insert, [build_row(*row[:4], row[4] or '') for row in rows])
+        last_id = rows[-1][0]
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in SEARCH_INDEXES:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_INDEXES[connection.vendor][3])
+
+
+class Migration(migrations.Migration):
+
+    # Each batch commits on its own so large tables are not indexed in one transaction
+    atomic = False
+
+    dependencies = [
+        ('prompts', '0006_prompt_text_blobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-17 05:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0007_prompt_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='prompt',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-17 05:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0008_prompt_created_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='prompt',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='prompt',
+            name='prompt_user_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='prompt',
+            name='prompt_user_executed_idx',
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='prompt_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(condition=models.Q(('ai_response_blob__isnull', False)), fields=['user', '-created_at', '-id'], name='prompt_user_executed_idx'),
+        ),
+    ]
@@ -1,5 +1,131 @@
-from django.db import models
+import hashlib
+from collections import Counter, defaultdict
+from django.db import IntegrityError, models, router, transaction
+from django.utils import timezone
 from django.conf import settings
+from .fields import CompressedTextField
+
+RESPONSE_PREVIEW_LENGTH = 200
+
+# Prompt texts stored through the blob table
+TEXT_FIELDS = ('generated_prompt', 'ai_response')
+
+
+def content_hash(text):
+    """Key of a text in the blob table"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class TextBlobQuerySet(models.QuerySet):
+    """QuerySet with the reference counting helpers for TextBlob"""
+    
+    def acquire(self, text, count=1):
+        """Add references to the blob holding text, creating it if needed, and return its key"""
+        
+        if not text:
+            return None
+        
+        key = content_hash(text)
+        with transaction.atomic(using=self.db):
+            if self.filter(hash=key).update(ref_count=models.F('ref_count') + count):
+                return key
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(hash=key, content=text, ref_count=count)
+            except IntegrityError:
+                # Another request stored the same text first
+                self.filter(hash=key).update(ref_count=models.F('ref_count') + count)
+        return key
+    
+    def acquire_many(self, texts):
+        """Add one reference per text, creating missing blobs in bulk, and return their keys in order"""
+        
+        keys = [content_hash(text) if text else None for text in texts]
+        counts = Counter(key for key in keys if key)
+        if not counts:
+            return keys
+        
+        contents = dict(zip(keys, texts))
+        with transaction.atomic(using=self.db):
+            # Lock the existing blobs so a concurrent release cannot delete them in between
+            existing = set(self.select_for_update().filter(hash__in=counts).values_list('hash', flat=True))
+            groups = defaultdict(list)
+            for key in existing:
+                groups[counts[key]].append(key)
+            for count, group in groups.items():
+                self.filter(hash__in=group).update(ref_count=models.F('ref_count') + count)
+            
+            missing = [key for key in counts if key not in existing]
+            try:
+                with transaction.atomic(using=self.db):
+                    self.bulk_create([
+                        self.model(hash=key, content=contents[key], ref_count=counts[key]) for key in missing
+                    ])
+            except IntegrityError:
+                # Another request stored some of the same texts first
+                for key in missing:
+                    self.acquire(contents[key], count=counts[key])
+        return keys
+    
+    def release(self, keys):
+        """Drop one reference per key and delete blobs nothing points to any more"""
+        
+        counts = Counter(key for key in keys if key)
+        if not counts:
+            return
+        
+        with transaction.atomic(using=self.db):
+            for key, count in counts.items():
+                self.filter(hash=key).update(ref_count=models.F('ref_count') - count)
+            self.filter(hash__in=counts, ref_count__lte=0).delete()
+
+
+class TextBlob(models.Model):
+    """Model for deduplicated prompt texts, keyed by a hash of their content"""
+    
+    hash = models.CharField(max_length=64, primary_key=True)
+    # Stored compressed, see prompts.compression
+    content = CompressedTextField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = TextBlobQuerySet.as_manager()
+    
+    def __str__(self):
+        return f"{self.hash[:12]} ({self.ref_count} refs)"
+
+
+def blob_text(name):
+    """Property exposing the text behind the <name>_blob foreign key, saved by Prompt.save()"""
+    
+    def fget(self):
+        pending = vars(self).get('_pending_texts', {})
+        if name in pending:
+            return pending[name]
+        blob = getattr(self, f"{name}_blob")
+        return blob.content if blob is not None else ''
+    
+    def fset(self, value):
+        vars(self).setdefault('_pending_texts', {})[name] = value or ''
+    
+    return property(fget, fset)
+
+
+class PromptQuerySet(models.QuerySet):
+    """QuerySet with helpers for the prompt list endpoints"""
+    
+    def summaries(self):
+        """Skip the text blobs, relying on the stored preview of the AI response"""
+        return self.annotate(
+            has_response=models.ExpressionWrapper(
+                models.Q(ai_response_blob__isnull=False),
+                output_field=models.BooleanField()
+            ),
+        )
+    
+    def with_texts(self):
+        """Join the text blobs so generated_prompt and ai_response need no extra queries"""
+        return self.select_related('generated_prompt_blob', 'ai_response_blob')
 
 
 class Prompt(models.Model):
@@ -28,13 +154,146 @@ class Prompt(models.Model):
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
     response_style = models.CharField(max_length=20, choices=STYLE_CHOICES)
     description = models.TextField(blank=True)
-    generated_prompt = models.TextField()
+    # Texts live in the deduplicated blob table, empty ones are stored as NULL
+    generated_prompt_blob = models.ForeignKey(
+        TextBlob, on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name='+'
+    )
+    ai_response_blob = models.ForeignKey(
+        TextBlob, on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name='+'
+    )
+    # Uncompressed start of ai_response for list views, maintained by save()
+    response_preview = models.CharField(max_length=RESPONSE_PREVIEW_LENGTH, blank=True, editable=False)
+    # A default rather than auto_now_add, so bulk imports can keep the original time
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = PromptQuerySet.as_manager()
+    
+    generated_prompt = blob_text('generated_prompt')
+    ai_response = blob_text('ai_response')
+    
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='prompt_user_created_idx'),
+            models.Index(fields=['user', 'category'], name='prompt_user_category_idx'),
+            # Executed prompts only, i.e. ones with an AI response
+            models.Index(
+                fields=['user', '-created_at', '-id'],
+                name='prompt_user_executed_idx',
+                condition=models.Q(ai_response_blob__isnull=False),
+            ),
+        ]
+        
+    def __str__(self):
+        return f"{self.title} - {self.user.username}"
+    
+    def save(self, *args, **kwargs):
+        pending = dict(vars(self).get('_pending_texts', {}))
+        
+        # update_fields may name the text properties, which map to their blob keys
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = {f"{name}_blob" if name in TEXT_FIELDS else name for name in update_fields}
+            if 'ai_response_blob' in update_fields:
+                update_fields.add('response_preview')
+            kwargs['update_fields'] = update_fields
+            pending = {name: text for name, text in pending.items() if f"{name}_blob" in update_fields}
+        
+        if not pending:
+            super().save(*args, **kwargs)
+            return
+        
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        blobs = TextBlob.objects.db_manager(using)
+        previous = {name: getattr(self, f"{name}_blob_id") for name in pending}
+        try:
+            with transaction.atomic(using=using):
+                released = []
+                for name, text in pending.items():
+                    key = content_hash(text) if text else None
+                    if key != previous[name]:
+                        blobs.acquire(text)
+                        released.append(previous[name])
+                    # Cache the blob so reading the text back does not query it
+                    setattr(self, f"{name}_blob", TextBlob(hash=key, content=text) if key else None)
+                if 'ai_response' in pending:
+                    self.response_preview = pending['ai_response'][:RESPONSE_PREVIEW_LENGTH]
+                super().save(*args, **kwargs)
+                blobs.release(released)
+        except Exception:
+            for name, key in previous.items():
+                setattr(self, f"{name}_blob_id", key)
+            raise
+        
+        for name in pending:
+            del self._pending_texts[name]
+
+
+class ExecutionJob(models.Model):
+    """Model for prompt executions queued for the background workers"""
+    
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='execution_jobs')
+    prompt = models.ForeignKey(Prompt, on_delete=models.SET_NULL, null=True, blank=True, related_name='execution_jobs')
+    payload = models.JSONField(default=dict)
+    save_result = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    generated_prompt = models.TextField(blank=True)
     ai_response = models.TextField(blank=True)
+    cached = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='executionjob_status_idx'),
+        ]
+        
+    def __str__(self):
+        return f"Job {self.id} ({self.status}) - {self.user.username}"
+
+
+class PromptTemplate(models.Model):
+    """Model for versioned prompt templates that override the built-in ones"""
+    
+    category = models.CharField(max_length=20, choices=Prompt.CATEGORY_CHOICES)
+    version = models.PositiveIntegerField(default=1)
+    description_label = models.CharField(max_length=100, default='Additional context')
+    body = models.TextField(help_text='Placeholders: {username}, {role}, {style}, {input_text}, {description_block}')
+    is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['category', '-version']
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'version'], name='prompttemplate_category_version_uniq'),
+        ]
         
     def __str__(self):
-        return f"{self.title} - {self.user.username}"
+        return f"{self.category} v{self.version}"
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .prompt_templates import compile_segments
+        
+        try:
+            compile_segments(self.body)
+        except ValueError as e:
+            raise ValidationError({'body': str(e)})
@@ -0,0 +1,146 @@
+from base64 import b64decode, b64encode
+from collections import namedtuple
+from urllib import parse
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+
+KeysetCursor = namedtuple('KeysetCursor', ['created_at', 'id', 'reverse'])
+
+
+def after_position(queryset, created_at, prompt_id, reverse=False):
+    """Prompts listed after (created_at, id) newest first, or before it oldest first when reverse"""
+    # (created_at, id) < (c, i), spelled with a plain bound on created_at so the
+    # database can start the (user, created_at, id) index scan at the cursor
+    if reverse:
+        return queryset.filter(
+            Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(id__gt=prompt_id))
+        ).order_by('created_at', 'id')
+    return queryset.filter(
+        Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=prompt_id))
+    ).order_by('-created_at', '-id')
+
+
+class PromptCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_at, id) that never issues a COUNT query.
+
+    A cursor holds the created_at and id of the last prompt on the page, or
+    the first one when paging backwards, and the next page starts strictly
+    after that pair. Unlike DRF's cursor, which keys on created_at alone and
+    skips ties with an offset, pages stay a single index range scan however
+    many prompts share a timestamp.
+    """
+    
+    ordering = ('-created_at', '-id')
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        
+        if self.cursor is None:
+            queryset = queryset.order_by(*self.ordering)
+        else:
+            queryset = after_position(queryset, self.cursor.created_at, self.cursor.id, reverse)
+        
+        # One extra row tells whether there is anything beyond this page
+        results = list(queryset[:self.page_size + 1])
+        has_following = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self.cursor is not None
+        
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+    
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        return self.encode_cursor(KeysetCursor(last.created_at, last.id, False))
+    
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        first = self.page[0]
+        return self.encode_cursor(KeysetCursor(first.created_at, first.id, True))
+    
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            created_at = parse_datetime(tokens['c'][0])
+            prompt_id = int(tokens['i'][0])
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return KeysetCursor(created_at, prompt_id, reverse)
+    
+    def encode_cursor(self, cursor):
+        tokens = {'c': cursor.created_at.isoformat(), 'i': str(cursor.id)}
+        if cursor.reverse:
+            tokens['r'] = '1'
+        encoded = b64encode(parse.urlencode(tokens).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+
+class PromptListPagination(PageNumberPagination):
+    """
+    Page-number pagination by default, keyset pagination on request.
+
+    Clients opt in with ?pagination=cursor and then follow the returned
+    next/previous links, which carry the cursor parameter. Both modes order by
+    (created_at, id), so prompts sharing a timestamp, as bulk imports produce,
+    are neither skipped nor repeated across pages.
+    """
+    
+    mode_query_param = 'pagination'
+    ordering = PromptCursorPagination.ordering
+    
+    def __init__(self):
+        self.cursor_paginator = PromptCursorPagination()
+        self.use_cursor = False
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_paginator.cursor_query_param in request.query_params
+        )
+        if self.use_cursor:
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset.order_by(*self.ordering), request, view)
+    
+    def get_paginated_response(self, data):
+        if self.use_cursor:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+    
+    def get_paginated_response_schema(self, schema):
+        if self.use_cursor:
+            return self.cursor_paginator.get_paginated_response_schema(schema)
+        return super().get_paginated_response_schema(schema)
+
+
+class PromptSearchPagination(LimitOffsetPagination):
+    """Limit/offset pagination over ranked search results"""
+    
+    default_limit = 20
+    max_limit = 100
@@ -0,0 +1,323 @@
+"""
+Prompt template registry
+
+Templates are plain data: a body with ``{field}`` placeholders plus the label
+used for the optional description line. Each body is parsed once into literal
+segments and field names, so rendering a prompt only joins the segments of the
+selected template.
+
+Templates come from three sources, later ones overriding earlier ones at the
+same version: the built-in templates below, JSON files in
+PROMPT_TEMPLATES_DIR, and active PromptTemplate rows in the database. The
+highest registered version of a category is used unless PROMPT_TEMPLATE_VERSIONS
+pins another one.
+"""
+import json
+import logging
+import string
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FIELDS = {'username', 'role', 'style', 'input_text', 'description_block'}
+
+DEFAULT_CATEGORY = 'doubt'
+
+BUILTIN_TEMPLATES = [
+    {
+        'category': 'doubt',
+        'version': 1,
+        'description_label': 'Additional context',
+        'body': """
+As an AI assistant helping {username} (a {role}), please provide a {style} answer to the following question:
+
+Question: {input_text}
+
+{description_block}
+
+Please ensure your response is {style} and tailored to someone with a {role} background.
+""",
+    },
+    {
+        'category': 'image_generation',
+        'version': 1,
+        'description_label': 'Additional requirements',
+        'body': """
+Create a {style} image generation prompt based on the following request from {username} (a {role}):
+
+Request: {input_text}
+
+{description_block}
+
+Generate a detailed prompt that includes:
+- Visual style and composition
+- Lighting and atmosphere
+- Color palette suggestions
+- Technical specifications
+- Art style references
+
+Make it suitable for AI image generation tools and {style} in nature.
+""",
+    },
+    {
+        'category': 'learning_roadmap',
+        'version': 1,
+        'description_label': 'Learning goals',
+        'body': """
+Create a {style} learning roadmap for {username} (a {role}) on the following topic:
+
+Topic: {input_text}
+
+{description_block}
+
+Please provide:
+- Learning objectives
+- Step-by-step progression
+- Recommended resources
+- Time estimates
+- Milestone assessments
+- Practical projects
+
+Tailor the roadmap to a {role} background and make it {style}.
+""",
+    },
+    {
+        'category': 'video_generation',
+        'version': 1,
+        'description_label': 'Additional requirements',
+        'body': """
+Develop a {style} video concept and script for {username} (a {role}) based on:
+
+Video idea: {input_text}
+
+{description_block}
+
+Please include:
+- Video concept overview
+- Target audience
+- Script outline
+- Visual suggestions
+- Pacing and structure
+- Call-to-action
+
+Make it engaging and {style}, suitable for a {role}'s perspective.
+""",
+    },
+    {
+        'category': 'deep_research',
+        'version': 1,
+        'description_label': 'Research focus',
+        'body': """
+Conduct a {style} research analysis for {username} (a {role}) on:
+
+Research topic: {input_text}
+
+{description_block}
+
+Please provide:
+- Research methodology
+- Key findings and insights
+- Data analysis
+- Supporting evidence
+- Conclusions and implications
+- Further research suggestions
+
+Present the research in a {style} manner appropriate for a {role}.
+""",
+    },
+    {
+        'category': 'idea_exploration',
+        'version': 1,
+        'description_label': 'Exploration direction',
+        'body': """
+Explore and expand on the following idea for {username} (a {role}):
+
+Initial idea: {input_text}
+
+{description_block}
+
+Please provide:
+- Concept expansion
+- Creative variations
+- Implementation possibilities
+- Potential challenges
+- Market opportunities
+- Next steps
+
+Make the exploration {style} and relevant to a {role}'s perspective.
+""",
+    },
+]
+
+
+def compile_segments(body):
+    """Split a template body into (literal, field_name) pairs, field_name is None for the tail"""
+
+    segments = []
+    for literal, field_name, format_spec, conversion in string.Formatter().parse(body.strip()):
+        if field_name is not None:
+            if field_name not in TEMPLATE_FIELDS:
+                raise ValueError(f"Unknown template field: {field_name}")
+            if format_spec or conversion:
+                raise ValueError(f"Format specs are not supported in templates: {field_name}")
+        segments.append((literal, field_name))
+    return tuple(segments)
+
+
+class CompiledTemplate:
+    """A prompt template parsed into literal segments and field names"""
+
+    def __init__(self, category, body, description_label, version=1, source='builtin'):
+        self.category = category
+        self.body = body
+        self.description_label = description_label
+        self.version = version
+        self.source = source
+        self.segments = compile_segments(body)
+
+    def render(self, username, role, style, input_text, description=None):
+        context = {
+            'username': str(username),
+            'role': str(role),
+            'style': str(style),
+            'input_text': str(input_text),
+            'description_block': f"{self.description_label}: {description}" if description else "",
+        }
+
+        parts = []
+        for literal, field_name in self.segments:
+            parts.append(literal)
+            if field_name is not None:
+                parts.append(context[field_name])
+        return ''.join(parts)
+
+    def __repr__(self):
+        return f"<CompiledTemplate {self.category} v{self.version} ({self.source})>"
+
+
+class TemplateRegistry:
+    """Versioned prompt templates by category"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._static = {}
+        self._database = {}
+        self._active = {}
+        self._loaded = False
+        # Monotonic time after which database templates are reloaded, None forces a reload
+        self._database_expires_at = None
+
+    def register(self, category, body, description_label, version=1, source='builtin'):
+        """Compile and register a template, replacing any with the same category and version"""
+        template = CompiledTemplate(category, body, description_label, version=version, source=source)
+        with self._lock:
+            self._static.setdefault(category, {})[version] = template
+            self._rebuild_active()
+        return template
+
+    def load_definitions(self, definitions, source):
+        """Register a list of template dicts with category, version, description_label and body"""
+        for definition in definitions:
+            self.register(
+                definition['category'],
+                definition['body'],
+                definition.get('description_label', 'Additional context'),
+                version=int(definition.get('version', 1)),
+                source=source,
+            )
+
+    def load_directory(self, path):
+        """Register every *.json template file in a directory"""
+        for file_path in sorted(Path(path).glob('*.json')):
+            with open(file_path, encoding='utf-8') as f:
+                definitions = json.load(f)
+            if isinstance(definitions, dict):
+                definitions = [definitions]
+            self.load_definitions(definitions, source=str(file_path))
+
+    def load_database(self):
+        """Load the active PromptTemplate rows, replacing previously loaded ones"""
+        from .models import PromptTemplate
+
+        templates = {}
+        for row in PromptTemplate.objects.filter(is_active=True):
+            template = CompiledTemplate(
+                row.category,
+                row.body,
+                row.description_label,
+                version=row.version,
+                source='database',
+            )
+            templates.setdefault(row.category, {})[row.version] = template
+
+        with self._lock:
+            self._database = templates
+            self._rebuild_active()
+
+    def invalidate_database(self):
+        """Reload database templates on the next lookup"""
+        self._database_expires_at = None
+
+    def ensure_loaded(self):
+        """Load built-in and file templates once, and refresh database templates when stale"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load_definitions(BUILTIN_TEMPLATES, source='builtin')
+                    templates_dir = getattr(settings, 'PROMPT_TEMPLATES_DIR', '')
+                    if templates_dir:
+                        self.load_directory(templates_dir)
+                    self._loaded = True
+
+        expires_at = self._database_expires_at
+        now = time.monotonic()
+        if expires_at is None or now > expires_at:
+            self._database_expires_at = now + getattr(settings, 'PROMPT_TEMPLATE_RELOAD_INTERVAL', 60)
+            try:
+                self.load_database()
+            except Exception as e:
+                # Keep serving the previous templates if the table is unavailable
+                logger.warning(f"Could not load prompt templates from the database: {str(e)}")
+
+    def versions(self, category):
+        """Return every available version of a category's template, keyed by version"""
+        self.ensure_loaded()
+        return self._versions(category)
+
+    def get(self, category, version=None):
+        """Return the template for a category, falling back to the default category"""
+        self.ensure_loaded()
+        if version is not None:
+            return self._versions(category).get(version) or self._active[DEFAULT_CATEGORY]
+        return self._active.get(category) or self._active[DEFAULT_CATEGORY]
+
+    def render(self, category, username, role, style, input_text, description=None, version=None):
+        """Render only the selected category's template"""
+        return self.get(category, version=version).render(
+            username=username,
+            role=role,
+            style=style,
+            input_text=input_text,
+            description=description,
+        )
+
+    def _versions(self, category):
+        versions = dict(self._static.get(category, {}))
+        versions.update(self._database.get(category, {}))
+        return versions
+
+    def _rebuild_active(self):
+        # Resolve pinned or latest versions up front so lookups are a single dict access
+        pinned = getattr(settings, 'PROMPT_TEMPLATE_VERSIONS', {})
+        active = {}
+        for category in set(self._static) | set(self._database):
+            versions = self._versions(category)
+            version = pinned.get(category)
+            active[category] = versions[version] if version in versions else versions[max(versions)]
+        self._active = active
+
+
+template_registry = TemplateRegistry()
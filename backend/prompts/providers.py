@@ -0,0 +1,269 @@
+"""
+LLM provider backends
+
+The execute paths talk to a provider selected by the LLM_PROVIDER setting (a
+dotted path to a provider class) instead of calling google.generativeai
+directly. Providers raise the exceptions below for transient failures so that
+retries and rate limiting do not depend on a particular SDK.
+
+- GeminiProvider sends prompts to Google Gemini through the shared client pool
+- FakeProvider answers locally with deterministic text after a simulated
+  latency, for load tests and capacity planning without quota or network
+"""
+import asyncio
+import hashlib
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+class ProviderUnavailable(Exception):
+    """Transient provider failure worth retrying (5xx, timeouts, dropped connections)"""
+
+
+class ProviderThrottled(ProviderUnavailable):
+    """The provider rejected the request because its quota was exceeded"""
+
+
+class BaseProvider:
+    """Interface every LLM provider implements"""
+
+    display_name = 'LLM'
+
+    @property
+    def model_name(self):
+        """Model identifier, part of the response cache key"""
+        raise NotImplementedError
+
+    @property
+    def generation_config(self):
+        """Generation settings, part of the response cache key"""
+        return {}
+
+    def check_configured(self):
+        """Raise ValueError when the provider cannot be used"""
+
+    def generate(self, prompt_text, timeout):
+        """Return the full response text"""
+        raise NotImplementedError
+
+    def stream(self, prompt_text, timeout):
+        """
+        Return an iterator of response text chunks.
+
+        Failures before the first chunk must be raised from this call rather
+        than from the iterator, so they can be retried.
+        """
+        raise NotImplementedError
+
+    async def agenerate(self, prompt_text, timeout):
+        """Async version of generate"""
+        raise NotImplementedError
+
+
+class GeminiProvider(BaseProvider):
+    """Google Gemini through the process-wide client pool"""
+
+    display_name = 'Gemini'
+
+    @property
+    def model_name(self):
+        return settings.GEMINI_MODEL
+
+    @property
+    def generation_config(self):
+        return settings.GEMINI_GENERATION_CONFIG
+
+    def check_configured(self):
+        if not getattr(settings, 'GEMINI_API_KEY', ''):
+            raise ValueError("Gemini API key not configured")
+
+    @contextmanager
+    def translate_errors(self):
+        """Re-raise the SDK's transient errors as provider errors"""
+        from google.api_core import exceptions as google_exceptions
+
+        try:
+            yield
+        except google_exceptions.TooManyRequests as e:
+            raise ProviderThrottled(str(e)) from e
+        except (
+            google_exceptions.InternalServerError,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.DeadlineExceeded,
+        ) as e:
+            raise ProviderUnavailable(str(e)) from e
+
+    def generate(self, prompt_text, timeout):
+        from .clients import get_model, record_request
+
+        model = get_model()
+        with self.translate_errors():
+            response = model.generate_content(prompt_text, request_options={'timeout': timeout})
+        record_request(model)
+        return response.text.strip()
+
+    def stream(self, prompt_text, timeout):
+        from .clients import get_model, record_request
+
+        model = get_model()
+        with self.translate_errors():
+            # The SDK reads the first chunk here, so failures before any output surface now
+            response = model.generate_content(prompt_text, stream=True, request_options={'timeout': timeout})
+        record_request(model)
+        return self._iter_text(response)
+
+    def _iter_text(self, response):
+        with self.translate_errors():
+            for chunk in response:
+                # Chunks without parts (e.g. safety metadata) carry no text
+                if chunk.parts:
+                    yield chunk.text
+
+    async def agenerate(self, prompt_text, timeout):
+        from .clients import get_model, record_request
+
+        model = get_model()
+        with self.translate_errors():
+            response = await model.generate_content_async(prompt_text, request_options={'timeout': timeout})
+        record_request(model)
+        return response.text.strip()
+
+
+WORDS = (
+    'prompt', 'model', 'answer', 'context', 'latency', 'example', 'detail',
+    'result', 'step', 'idea', 'request', 'response', 'token', 'output',
+    'summary', 'structure', 'approach', 'practice', 'review', 'plan',
+)
+
+
+class FakeProvider(BaseProvider):
+    """
+    Local provider with a simulated latency profile.
+
+    The text of a response depends only on the prompt. Latencies and injected
+    errors come from a seeded random generator, so a load test issuing the same
+    requests in the same order sees the same profile on every run.
+    """
+
+    display_name = 'Fake LLM'
+
+    def __init__(self, options=None):
+        self.options = dict(settings.LLM_FAKE_PROVIDER, **(options or {}))
+        self._random = random.Random(self.options['seed'])
+        self._lock = threading.Lock()
+
+    @property
+    def model_name(self):
+        return 'fake'
+
+    @property
+    def generation_config(self):
+        return {'response_words': self.options['response_words']}
+
+    def sample_latency(self):
+        """Draw a response latency in seconds from the configured distribution"""
+
+        distribution = self.options['latency_distribution']
+        median = self.options['latency_median']
+        with self._lock:
+            if distribution == 'constant' or median <= 0:
+                latency = median
+            elif distribution == 'uniform':
+                spread = self.options['latency_spread']
+                latency = self._random.uniform(median - spread, median + spread)
+            elif distribution == 'normal':
+                latency = self._random.gauss(median, self.options['latency_spread'])
+            elif distribution == 'lognormal':
+                # Long right tail, the usual shape of LLM latencies
+                latency = self._random.lognormvariate(math.log(median), self.options['latency_sigma'])
+            else:
+                raise ValueError(f"Unknown fake latency distribution: {distribution}")
+        return max(0.0, latency)
+
+    def sample_outcome(self):
+        """Return the error to inject for the next request, or None"""
+
+        with self._lock:
+            roll = self._random.random()
+        throttle_rate = self.options['throttle_rate']
+        if roll < throttle_rate:
+            return ProviderThrottled("429 Fake provider quota exceeded")
+        if roll < throttle_rate + self.options['error_rate']:
+            return ProviderUnavailable("503 Fake provider unavailable")
+        return None
+
+    def response_text(self, prompt_text):
+        """Deterministic response for a prompt"""
+
+        digest = hashlib.sha256(prompt_text.encode('utf-8')).digest()
+        words = [
+            WORDS[digest[i % len(digest)] % len(WORDS)]
+            for i in range(self.options['response_words'])
+        ]
+        return f"Fake response {digest.hex()[:12]}: " + ' '.join(words) + '.'
+
+    def _plan(self, timeout):
+        """Sample latency and outcome, returning (latency, error) with deadline overruns turned into timeouts"""
+
+        latency = self.sample_latency()
+        error = self.sample_outcome()
+        if latency > timeout:
+            return timeout, TimeoutError(f"Fake provider timed out after {timeout:.1f}s")
+        return latency, error
+
+    def generate(self, prompt_text, timeout):
+        latency, error = self._plan(timeout)
+        time.sleep(latency)
+        if error is not None:
+            raise error
+        return self.response_text(prompt_text)
+
+    def stream(self, prompt_text, timeout):
+        # The sampled latency is the time to the first chunk
+        latency, error = self._plan(timeout)
+        time.sleep(latency)
+        if error is not None:
+            raise error
+        return self._iter_chunks(self.response_text(prompt_text))
+
+    def _iter_chunks(self, text):
+        size = self.options['stream_chunk_size']
+        delay = self.options['stream_chunk_delay']
+        for start in range(0, len(text), size):
+            if start and delay:
+                time.sleep(delay)
+            yield text[start:start + size]
+
+    async def agenerate(self, prompt_text, timeout):
+        latency, error = self._plan(timeout)
+        await asyncio.sleep(latency)
+        if error is not None:
+            raise error
+        return self.response_text(prompt_text)
+
+
+def get_provider():
+    """Return the process-wide instance of the configured provider"""
+    global _provider
+
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = import_string(settings.LLM_PROVIDER)()
+    return _provider
+
+
+def reset_provider():
+    """Drop the provider instance so the next lookup picks up changed settings"""
+    global _provider
+
+    with _provider_lock:
+        _provider = None
@@ -0,0 +1,177 @@
+"""
+Rate limiting of outbound LLM calls
+
+Request counts live in a shared cache (LLM_RATE_LIMIT_CACHE) so that every
+worker draws from the same budget. A global limit keeps us under the provider
+quota and a per-user limit stops one user from draining it. Callers wait for
+budget up to a deadline and get RateLimitExceeded after that.
+
+Budgets are fixed windows: each admits the burst size and lasts as long as
+the configured rate takes to refill it, so the average rate matches and at
+most two bursts pass back to back across a window boundary. A window is a
+counter created with cache.add and bumped with cache.incr, both atomic in
+Redis and Memcached, so no lock is needed.
+
+The global rate adapts to the provider: a 429 halves it and every successful
+call wins a little of it back, so throughput settles just below the quota.
+"""
+import asyncio
+import logging
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'llm-ratelimit'
+GLOBAL_SCOPE = 'global'
+MULTIPLIER_KEY = f"{KEY_PREFIX}:multiplier"
+
+
+class RateLimitExceeded(Exception):
+    """Raised when no LLM request budget becomes available before the deadline"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def rate_limit_enabled():
+    """Check whether outbound rate limiting is switched on"""
+    return getattr(settings, 'LLM_RATE_LIMIT_ENABLED', False)
+
+
+def get_limiter_cache():
+    """Return the cache holding the request counters"""
+    return caches[settings.LLM_RATE_LIMIT_CACHE]
+
+
+def get_rate_multiplier(cache):
+    """Current adaptive factor applied to the global rate"""
+    return cache.get(MULTIPLIER_KEY, 1.0)
+
+
+def take_token(cache, scope, limit, window_seconds):
+    """Count a request against the scope's current window, returning (0 or the seconds to wait, counter key)"""
+
+    now = time.time()
+    window = int(now // window_seconds)
+    key = f"{KEY_PREFIX}:{scope}:{window_seconds:g}:{window}"
+
+    # Outlive the window so the counter cannot expire between add and incr
+    cache.add(key, 0, timeout=int(window_seconds) + 60)
+    count = cache.incr(key)
+    if count <= limit:
+        return 0, key
+    return (window + 1) * window_seconds - now, key
+
+
+def return_token(cache, key):
+    """Give back a request counted by take_token when the request did not go out"""
+    try:
+        cache.decr(key)
+    except ValueError:
+        # The window is already gone
+        pass
+
+
+def try_acquire(user_id=None):
+    """Count a request against the user and global windows, returning 0 or the seconds to wait"""
+
+    cache = get_limiter_cache()
+
+    if user_id is not None:
+        user_burst = settings.LLM_RATE_LIMIT_USER_BURST
+        wait, user_key = take_token(
+            cache,
+            f"user:{user_id}",
+            user_burst,
+            user_burst * 60.0 / settings.LLM_RATE_LIMIT_USER_PER_MINUTE,
+        )
+        if wait:
+            return wait
+
+    # A throttled provider shrinks how many requests each global window admits
+    global_burst = settings.LLM_RATE_LIMIT_GLOBAL_BURST
+    wait, _ = take_token(
+        cache,
+        GLOBAL_SCOPE,
+        max(1, int(global_burst * get_rate_multiplier(cache))),
+        global_burst * 60.0 / settings.LLM_RATE_LIMIT_GLOBAL_PER_MINUTE,
+    )
+    if wait and user_id is not None:
+        return_token(cache, user_key)
+    return wait
+
+
+def acquire(user_id=None, max_wait=None):
+    """Block until the request may go out, or raise RateLimitExceeded once max_wait has passed"""
+
+    if not rate_limit_enabled():
+        return
+
+    if max_wait is None:
+        max_wait = settings.LLM_RATE_LIMIT_MAX_WAIT
+    deadline = time.monotonic() + max_wait
+
+    while True:
+        wait = try_acquire(user_id)
+        if not wait:
+            return
+        remaining = deadline - time.monotonic()
+        if wait > remaining:
+            raise RateLimitExceeded("Too many AI requests, please retry shortly", retry_after=wait)
+        time.sleep(wait)
+
+
+def acquire_nowait(user_id=None):
+    """Take a token only if one is available right now, returning whether the request may go out"""
+
+    if not rate_limit_enabled():
+        return True
+    return not try_acquire(user_id)
+
+
+async def aacquire(user_id=None, max_wait=None):
+    """Async version of acquire that waits on the event loop"""
+
+    if not rate_limit_enabled():
+        return
+
+    if max_wait is None:
+        max_wait = settings.LLM_RATE_LIMIT_MAX_WAIT
+    deadline = time.monotonic() + max_wait
+
+    while True:
+        wait = await sync_to_async(try_acquire)(user_id)
+        if not wait:
+            return
+        remaining = deadline - time.monotonic()
+        if wait > remaining:
+            raise RateLimitExceeded("Too many AI requests, please retry shortly", retry_after=wait)
+        await asyncio.sleep(wait)
+
+
+def record_throttled():
+    """Halve the global rate after the provider answered 429"""
+
+    if not rate_limit_enabled():
+        return
+
+    cache = get_limiter_cache()
+    multiplier = max(settings.LLM_RATE_LIMIT_MIN_MULTIPLIER, get_rate_multiplier(cache) / 2)
+    cache.set(MULTIPLIER_KEY, multiplier, timeout=3600)
+    logger.warning(f"LLM provider throttled us, global rate now at {multiplier:.0%}")
+
+
+def record_success():
+    """Win back a step of the global rate after a successful call"""
+
+    if not rate_limit_enabled():
+        return
+
+    cache = get_limiter_cache()
+    multiplier = get_rate_multiplier(cache)
+    if multiplier < 1.0:
+        cache.set(MULTIPLIER_KEY, min(1.0, multiplier + settings.LLM_RATE_LIMIT_RECOVERY_STEP), timeout=3600)
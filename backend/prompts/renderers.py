@@ -0,0 +1,31 @@
+import json
+from rest_framework.renderers import BaseRenderer
+
+
+def format_sse(event, payload):
+    """Encode a single Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+class ServerSentEventRenderer(BaseRenderer):
+    """Renderer that lets views negotiate text/event-stream responses"""
+    
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Regular Responses (validation errors, auth failures) become a single error event
+        return format_sse('error', data).encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Renderer that lets views negotiate application/x-ndjson responses"""
+    
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Regular Responses (validation errors, auth failures) become a single line
+        return (json.dumps(data) + '\n').encode(self.charset)
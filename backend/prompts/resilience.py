@@ -0,0 +1,277 @@
+"""
+Deadlines, retries, hedged requests and a circuit breaker for LLM calls
+
+call_with_resilience() runs a request function that accepts a ``timeout``:
+
+- every attempt gets a per-call deadline, bounded by an overall deadline
+- transient provider errors are retried with full-jitter exponential backoff
+- optionally a second, hedged attempt is started once the first has been
+  running longer than the recent p95 latency, and whichever answers first wins
+- a per-process circuit breaker fails fast while the provider keeps failing;
+  429s are left to the rate limiter and do not count against it
+- retries take a request token first, so they stay inside the rate limit budget
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from .providers import ProviderThrottled, ProviderUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Providers raise ProviderUnavailable (and its ProviderThrottled subclass) for transient failures
+RETRYABLE_ERRORS = (
+    ProviderUnavailable,
+    TimeoutError,
+    ConnectionError,
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while the circuit breaker is open"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call runs past its deadline"""
+
+
+def is_retryable(error):
+    """Transient errors worth another attempt"""
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a single probe through once the reset timeout passes"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def state(self):
+        return self._state
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go out, returning whether it is the half-open probe"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return False
+
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self._state == self.OPEN and remaining <= 0:
+                # Let one probe through, everyone else keeps failing fast
+                self._state = self.HALF_OPEN
+                return True
+
+            raise CircuitOpenError(
+                "AI provider is unavailable, please retry shortly",
+                retry_after=max(remaining, 1),
+            )
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def release_probe(self):
+        """Give up the half-open slot of a probe that ended without a verdict, so the next call probes again"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuit breaker opened after {self._failures} failure(s)")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+circuit_breaker = CircuitBreaker(
+    failure_threshold=settings.GEMINI_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.GEMINI_CIRCUIT_RESET_TIMEOUT,
+)
+latency_tracker = LatencyTracker()
+_hedge_executor = ThreadPoolExecutor(
+    max_workers=settings.GEMINI_HEDGE_MAX_WORKERS,
+    thread_name_prefix='llm-hedge',
+)
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given retry number (0-based)"""
+    cap = min(settings.GEMINI_RETRY_MAX_DELAY, settings.GEMINI_RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+def hedge_delay():
+    """How long to wait for the first attempt before hedging: the recent p95, or the configured default"""
+    if len(latency_tracker) < settings.GEMINI_HEDGE_MIN_SAMPLES:
+        return settings.GEMINI_HEDGE_DELAY
+    return latency_tracker.percentile(0.95)
+
+
+def run_hedged(request, timeout, may_hedge=None):
+    """Run request(timeout=...) and race a second attempt against it if the first is slow"""
+
+    started = time.monotonic()
+    futures = [_hedge_executor.submit(request, timeout=timeout)]
+
+    done, _ = wait(futures, timeout=min(hedge_delay(), timeout))
+    if not done and (may_hedge is None or may_hedge()):
+        remaining = timeout - (time.monotonic() - started)
+        if remaining > 0:
+            logger.info("Hedging slow LLM request")
+            futures.append(_hedge_executor.submit(request, timeout=remaining))
+
+    last_error = None
+    pending = set(futures)
+    while pending:
+        remaining = timeout - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # The losing attempt cannot be interrupted; it finishes in the background
+                return future.result()
+            last_error = future.exception()
+
+    if last_error is not None:
+        raise last_error
+    raise DeadlineExceeded(f"LLM request timed out after {timeout:.1f}s")
+
+
+def call_with_resilience(request, may_hedge=None, hedge=True, acquire_token=None):
+    """
+    Call request(timeout=...) with deadlines, retries, optional hedging and the circuit breaker.
+
+    may_hedge is consulted before a hedged attempt is started, so callers can
+    refuse to hedge when it would exceed their request budget. Pass hedge=False
+    for requests that must not be duplicated. acquire_token(max_wait=...) is
+    called before every retry and should block until the retry may go out.
+    """
+
+    probe = circuit_breaker.before_call()
+    try:
+        deadline = time.monotonic() + settings.GEMINI_TOTAL_DEADLINE
+        attempt = 0
+        while True:
+            timeout = min(settings.GEMINI_REQUEST_TIMEOUT, deadline - time.monotonic())
+            started = time.monotonic()
+            try:
+                if hedge and settings.GEMINI_HEDGING_ENABLED:
+                    result = run_hedged(request, timeout, may_hedge=may_hedge)
+                else:
+                    result = request(timeout=timeout)
+            except Exception as e:
+                if not is_retryable(e):
+                    if probe:
+                        # The provider answered, the request itself was at fault
+                        circuit_breaker.record_success()
+                    raise
+
+                if not isinstance(e, ProviderThrottled):
+                    circuit_breaker.record_failure()
+                delay = backoff_delay(attempt)
+                attempt += 1
+                out_of_time = time.monotonic() + delay >= deadline
+                if attempt > settings.GEMINI_MAX_RETRIES or out_of_time or circuit_breaker.state == CircuitBreaker.OPEN:
+                    raise
+
+                logger.warning(f"Retrying LLM request in {delay:.2f}s after: {str(e)}")
+                time.sleep(delay)
+                if acquire_token is not None:
+                    acquire_token(max_wait=max(deadline - time.monotonic(), 0))
+                continue
+
+            latency_tracker.record(time.monotonic() - started)
+            circuit_breaker.record_success()
+            return result
+    finally:
+        if probe:
+            # Cancellations and other errors without a verdict must not leave the breaker half open
+            circuit_breaker.release_probe()
+
+
+async def acall_with_resilience(request, acquire_token=None):
+    """Async version of call_with_resilience for request coroutines (hedging is not applied)"""
+
+    probe = circuit_breaker.before_call()
+    try:
+        deadline = time.monotonic() + settings.GEMINI_TOTAL_DEADLINE
+        attempt = 0
+        while True:
+            timeout = min(settings.GEMINI_REQUEST_TIMEOUT, deadline - time.monotonic())
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(request(timeout=timeout), timeout=timeout)
+            except asyncio.TimeoutError as e:
+                error = DeadlineExceeded(f"LLM request timed out after {timeout:.1f}s")
+                error.__cause__ = e
+            except Exception as e:
+                if not is_retryable(e):
+                    if probe:
+                        circuit_breaker.record_success()
+                    raise
+                error = e
+            else:
+                latency_tracker.record(time.monotonic() - started)
+                circuit_breaker.record_success()
+                return result
+
+            if not isinstance(error, ProviderThrottled):
+                circuit_breaker.record_failure()
+            delay = backoff_delay(attempt)
+            attempt += 1
+            out_of_time = time.monotonic() + delay >= deadline
+            if attempt > settings.GEMINI_MAX_RETRIES or out_of_time or circuit_breaker.state == CircuitBreaker.OPEN:
+                raise error
+
+            logger.warning(f"Retrying LLM request in {delay:.2f}s after: {str(error)}")
+            await asyncio.sleep(delay)
+            if acquire_token is not None:
+                await acquire_token(max_wait=max(deadline - time.monotonic(), 0))
+    finally:
+        if probe:
+            circuit_breaker.release_probe()
@@ -0,0 +1,319 @@
+"""
+Full-text search over prompts
+
+The searchable text (title, input_text and ai_response) is kept in a
+separate index that is updated whenever a prompt is saved or deleted:
+
+- SQLite: an FTS5 virtual table keyed by the prompt id, ranked with bm25().
+  Each row also carries an owner token so a user's search intersects with
+  their own documents inside the index instead of filtering afterwards.
+- PostgreSQL: a table of tsvector documents with a GIN index, ranked with
+  ts_rank_cd() and highlighted with ts_headline().
+
+Other databases have no index and the search endpoint reports it as
+unavailable. Rebuild the index with the rebuild_search_index command after
+writing prompts in bulk, which skips the signals that maintain it.
+"""
+import re
+from django.db import connection
+from django.utils.html import escape
+from .models import Prompt
+
+# Fields that feed the index, by their model field names
+INDEXED_FIELDS = frozenset({'title', 'input_text', 'ai_response_blob'})
+
+MAX_TERMS = 16
+
+# Private use characters mark highlighted terms in raw snippets, so the text
+# can be escaped before they are turned into <mark> tags
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_END = '\ue001'
+
+
+class SearchUnavailable(Exception):
+    """Raised when the database has no full-text index"""
+    pass
+
+
+def search_terms(query):
+    """Split a user query into the words that are searched for, all of which must match"""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def render_snippet(snippet):
+    """Escape a raw snippet and turn the highlight markers into <mark> tags"""
+    return escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+
+
+class SqliteSearchBackend:
+    """FTS5 index, one row per prompt with rowid = prompt id"""
+
+    table = 'prompts_prompt_fts'
+
+    # FTS5 keeps its own copy of the text and builds snippets from it
+    stores_text = True
+
+    # bm25() weights per column: title, input_text, ai_response, owner
+    weights = (8.0, 4.0, 1.0, 0.0)
+
+    # Columns the user's terms are matched against; owner only scopes the search
+    text_columns = ('title', 'input_text', 'ai_response')
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+            f"USING fts5(title, input_text, ai_response, owner, tokenize='porter unicode61')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index(self, cursor, rows):
+        """Insert or replace (id, user_id, title, input_text, ai_response) rows"""
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {self.table} (rowid, title, input_text, ai_response, owner) "
+            f"VALUES (%s, %s, %s, %s, %s)",
+            [
+                (prompt_id, title, input_text, ai_response, f"u{user_id}")
+                for prompt_id, user_id, title, input_text, ai_response in rows
+            ],
+        )
+
+    def remove(self, cursor, prompt_ids):
+        cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(prompt_id,) for prompt_id in prompt_ids])
+
+    def match_expression(self, user_id, terms):
+        # Quoted terms are taken literally, the last one also matches as a prefix
+        words = ' '.join(f'"{term}"' for term in terms[:-1])
+        words = f'{words} "{terms[-1]}"*'.strip()
+        # Without the column filter a search for "u<id>" would match every owner token
+        columns = ' '.join(self.text_columns)
+        return f'owner:"u{user_id}" AND {{{columns}}}:({words})'
+
+    def where(self, user_id, terms, filters):
+        conditions = [f"{self.table} MATCH %s"]
+        params = [self.match_expression(user_id, terms)]
+        for column, value in filters.items():
+            conditions.append(f"p.{column} = %s")
+            params.append(value)
+        return ' AND '.join(conditions), params
+
+    def count(self, cursor, user_id, terms, filters):
+        where, params = self.where(user_id, terms, filters)
+        cursor.execute(
+            f"SELECT COUNT(*) FROM {self.table} f JOIN prompts_prompt p ON p.id = f.rowid WHERE {where}",
+            params,
+        )
+        return cursor.fetchone()[0]
+
+    def search(self, cursor, user_id, terms, filters, limit, offset):
+        """Return (prompt_id, rank, snippet) rows, best match first"""
+        where, params = self.where(user_id, terms, filters)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        snippet_args = f"'{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 24"
+        cursor.execute(
+            f"SELECT f.rowid, bm25({self.table}, {weights}) AS score, "
+            f"snippet({self.table}, 2, {snippet_args}), snippet({self.table}, 1, {snippet_args}) "
+            f"FROM {self.table} f JOIN prompts_prompt p ON p.id = f.rowid "
+            f"WHERE {where} ORDER BY score, f.rowid DESC LIMIT %s OFFSET %s",
+            params + [limit, offset],
+        )
+        results = []
+        for prompt_id, score, response_snippet, input_snippet in cursor.fetchall():
+            # Prefer the response excerpt, unless only the input matched
+            snippet = response_snippet if HIGHLIGHT_START in response_snippet else input_snippet
+            # bm25() scores are lower for better matches
+            results.append((prompt_id, -score, snippet))
+        return results
+
+
+class PostgresSearchBackend:
+    """tsvector documents in their own table with a GIN index"""
+
+    table = 'prompts_prompt_search'
+    config = 'english'
+
+    # Only the tsvector is stored, snippets need the text passed to headlines()
+    stores_text = False
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            f"prompt_id bigint PRIMARY KEY REFERENCES prompts_prompt (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            f"user_id bigint NOT NULL, "
+            f"document tsvector NOT NULL)"
+        )
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_document_idx ON {self.table} USING GIN (document)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_user_idx ON {self.table} (user_id)")
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index(self, cursor, rows):
+        """Insert or replace (id, user_id, title, input_text, ai_response) rows"""
+        cursor.executemany(
+            f"INSERT INTO {self.table} (prompt_id, user_id, document) VALUES (%s, %s, "
+            f"setweight(to_tsvector('{self.config}', %s), 'A') || "
+            f"setweight(to_tsvector('{self.config}', %s), 'B') || "
+            f"setweight(to_tsvector('{self.config}', %s), 'C')) "
+            f"ON CONFLICT (prompt_id) DO UPDATE SET user_id = EXCLUDED.user_id, document = EXCLUDED.document",
+            list(rows),
+        )
+
+    def remove(self, cursor, prompt_ids):
+        cursor.execute(f"DELETE FROM {self.table} WHERE prompt_id = ANY(%s)", [list(prompt_ids)])
+
+    def ts_query(self, terms):
+        # The last term also matches as a prefix
+        return ' & '.join(terms) + ':*'
+
+    def where(self, user_id, terms, filters):
+        conditions = ["s.user_id = %s", f"s.document @@ to_tsquery('{self.config}', %s)"]
+        params = [user_id, self.ts_query(terms)]
+        for column, value in filters.items():
+            conditions.append(f"p.{column} = %s")
+            params.append(value)
+        return ' AND '.join(conditions), params
+
+    def count(self, cursor, user_id, terms, filters):
+        where, params = self.where(user_id, terms, filters)
+        cursor.execute(
+            f"SELECT COUNT(*) FROM {self.table} s JOIN prompts_prompt p ON p.id = s.prompt_id WHERE {where}",
+            params,
+        )
+        return cursor.fetchone()[0]
+
+    def search(self, cursor, user_id, terms, filters, limit, offset):
+        """Return (prompt_id, rank, None) rows, best match first; snippets come from headlines()"""
+        where, params = self.where(user_id, terms, filters)
+        cursor.execute(
+            f"SELECT s.prompt_id, ts_rank_cd(s.document, to_tsquery('{self.config}', %s)) AS score, NULL "
+            f"FROM {self.table} s JOIN prompts_prompt p ON p.id = s.prompt_id "
+            f"WHERE {where} ORDER BY score DESC, s.prompt_id DESC LIMIT %s OFFSET %s",
+            [self.ts_query(terms)] + params + [limit, offset],
+        )
+        return cursor.fetchall()
+
+    def headlines(self, cursor, terms, texts):
+        """Highlight the query in each text; the texts are not stored in the index, so they are passed in"""
+        if not texts:
+            return []
+        options = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=35, MinWords=15"
+        cursor.execute(
+            f"SELECT ts_headline('{self.config}', t.text, to_tsquery('{self.config}', %s), %s) "
+            f"FROM unnest(%s::text[]) WITH ORDINALITY AS t(text, position) ORDER BY t.position",
+            [self.ts_query(terms), options, list(texts)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SqliteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(vendor=None):
+    """Return the search backend for a database vendor, or None when it has no full-text index"""
+    backend_class = BACKENDS.get(vendor or connection.vendor)
+    return backend_class() if backend_class else None
+
+
+def prompt_index_rows(prompts):
+    """Index rows for prompts, ideally loaded with with_texts()"""
+    return [
+        (prompt.id, prompt.user_id, prompt.title, prompt.input_text, prompt.ai_response)
+        for prompt in prompts
+    ]
+
+
+def index_prompts(prompts):
+    """Add or refresh prompts in the search index"""
+    backend = get_search_backend()
+    if backend is None:
+        return
+    rows = prompt_index_rows(prompts)
+    if rows:
+        with connection.cursor() as cursor:
+            backend.index(cursor, rows)
+
+
+def remove_prompts(prompt_ids):
+    """Drop prompts from the search index"""
+    backend = get_search_backend()
+    if backend is None or not prompt_ids:
+        return
+    with connection.cursor() as cursor:
+        backend.remove(cursor, prompt_ids)
+
+
+class PromptSearch:
+    """
+    Lazy search results for one user's prompts.
+
+    Supports count() and slicing, so the DRF paginators can page through it
+    like a queryset. Sliced results are Prompt summaries carrying the extra
+    rank and snippet attributes.
+    """
+
+    def __init__(self, user, q, category=None, response_style=None):
+        self.backend = get_search_backend()
+        if self.backend is None:
+            raise SearchUnavailable(f"Full-text search is not available on {connection.vendor}")
+        self.user = user
+        self.terms = search_terms(q)
+        self.filters = {}
+        if category:
+            self.filters['category'] = category
+        if response_style:
+            self.filters['response_style'] = response_style
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            with connection.cursor() as cursor:
+                self._count = self.backend.count(cursor, self.user.id, self.terms, self.filters)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError('PromptSearch only supports slicing without a step')
+        offset = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        if stop <= offset:
+            return []
+        return self.fetch(stop - offset, offset)
+
+    def fetch(self, limit, offset):
+        with connection.cursor() as cursor:
+            rows = self.backend.search(cursor, self.user.id, self.terms, self.filters, limit, offset)
+
+        prompt_ids = [row[0] for row in rows]
+        queryset = Prompt.objects.summaries()
+        if not self.backend.stores_text:
+            queryset = queryset.with_texts()
+        prompts = queryset.in_bulk(prompt_ids)
+
+        # Prompts deleted since the index was queried are left out
+        rows = [row for row in rows if row[0] in prompts]
+        prompt_ids = [row[0] for row in rows]
+
+        if not self.backend.stores_text:
+            texts = [
+                '\n'.join(filter(None, [prompts[prompt_id].input_text, prompts[prompt_id].ai_response]))
+                for prompt_id in prompt_ids
+            ]
+            with connection.cursor() as cursor:
+                snippets = self.backend.headlines(cursor, self.terms, texts)
+            rows = [(prompt_id, rank, snippet) for (prompt_id, rank, _), snippet in zip(rows, snippets)]
+
+        results = []
+        for prompt_id, rank, snippet in rows:
+            prompt = prompts[prompt_id]
+            prompt.rank = rank
+            prompt.snippet = render_snippet(snippet)
+            results.append(prompt)
+        return results
@@ -0,0 +1,369 @@
+"""
+Semantic near-duplicate cache for LLM responses
+
+The exact response cache only helps when the generated prompt is byte for
+byte the same. This cache sits behind it and catches paraphrases ("explain
+recursion" and "what is recursion"): the input text is embedded and looked
+up in an in-process nearest-neighbour index, one per partition of category,
+response style, model, the prompt the template renders around the input and
+(by default) user. A neighbour whose cosine
+similarity reaches SEMANTIC_CACHE_THRESHOLD lends its response, which is
+still read from the exact response cache, so entries share its TTL and
+eviction.
+
+Embeddings come from SEMANTIC_CACHE_EMBEDDER. The default hashes words and
+character n-grams into a fixed-size vector and needs nothing beyond NumPy;
+SentenceTransformerEmbedder uses a local sentence-transformers model when
+that package is installed. Each process keeps its own index, so a paraphrase
+served by another worker is only seen here once this worker has answered it.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from .cache import aget_cached_response, get_cached_response, response_cache_enabled
+from .models import content_hash
+from .prompt_templates import template_registry
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Words that change how a question is phrased but not what it is about
+STOP_WORDS = frozenset("""
+a about an and are as at be can could do does explain for give how i in is it
+me my of on or please show should tell that the this to what whats when where
+which who why will with would you your describe define meaning mean
+""".split())
+
+
+class HashedNgramEmbedder:
+    """Signed feature hashing of content words and their character n-grams"""
+
+    def __init__(self, dimensions=512, ngram=4, word_weight=1.0, ngram_weight=0.5):
+        self.dimensions = dimensions
+        self.ngram = ngram
+        self.word_weight = word_weight
+        self.ngram_weight = ngram_weight
+
+    def features(self, text):
+        words = [word for word in re.findall(r'\w+', text.lower()) if word not in STOP_WORDS]
+        for word in words:
+            yield word, self.word_weight
+            padded = f" {word} "
+            # Shared n-grams let "index" and "indexes" land close together
+            for i in range(max(1, len(padded) - self.ngram + 1)):
+                yield f"#{padded[i:i + self.ngram]}", self.ngram_weight
+        for first, second in zip(words, words[1:]):
+            yield f"{first} {second}", self.word_weight
+
+    def embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature, weight in self.features(text):
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'little')
+            sign = 1.0 if value & 1 else -1.0
+            vector[(value >> 1) % self.dimensions] += sign * weight
+        return vector
+
+
+class SentenceTransformerEmbedder:
+    """Embeddings from a local sentence-transformers model, run on the CPU"""
+
+    def __init__(self, model_name='all-MiniLM-L6-v2', **kwargs):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImproperlyConfigured('SentenceTransformerEmbedder needs the sentence-transformers package') from e
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, text):
+        return np.asarray(self.model.encode(text), dtype=np.float32)
+
+
+class VectorIndex:
+    """
+    Approximate nearest-neighbour index over unit vectors.
+
+    Vectors live in one matrix that grows geometrically up to max_entries
+    and is then reused as a ring buffer, overwriting the oldest entry. Small
+    indexes are searched exhaustively; larger ones shortlist candidates with
+    random hyperplane LSH tables and rank only those exactly.
+    """
+
+    def __init__(self, dimensions, max_entries, tables=4, bits=12, exact_limit=2048, initial_capacity=64, seed=0):
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self.exact_limit = exact_limit
+        self.vectors = np.zeros((min(initial_capacity, max_entries), dimensions), dtype=np.float32)
+        self.values = []
+        self.slot_buckets = []
+        self.next_slot = 0
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((tables, bits, dimensions)).astype(np.float32)
+        self.buckets = [{} for _ in range(tables)]
+        self.powers = 1 << np.arange(bits, dtype=np.int64)
+
+    def bucket_keys(self, vector):
+        signs = (self.planes @ vector) > 0
+        return [int(key) for key in signs.astype(np.int64) @ self.powers]
+
+    def add(self, vector, value):
+        slot = self.next_slot
+        if slot == len(self.values):
+            if slot == len(self.vectors):
+                grown = np.zeros((min(slot * 2, self.max_entries), self.dimensions), dtype=np.float32)
+                grown[:slot] = self.vectors
+                self.vectors = grown
+            self.values.append(None)
+            self.slot_buckets.append(None)
+        elif self.values[slot] is not None:
+            self.discard_slot(slot)
+
+        self.vectors[slot] = vector
+        self.values[slot] = value
+        keys = self.bucket_keys(vector)
+        for buckets, key in zip(self.buckets, keys):
+            buckets.setdefault(key, set()).add(slot)
+        self.slot_buckets[slot] = keys
+        self.next_slot = (slot + 1) % self.max_entries
+
+    def discard_slot(self, slot):
+        for buckets, key in zip(self.buckets, self.slot_buckets[slot]):
+            members = buckets.get(key)
+            if members is not None:
+                members.discard(slot)
+                if not members:
+                    del buckets[key]
+        self.values[slot] = None
+        self.slot_buckets[slot] = None
+        self.vectors[slot] = 0
+
+    def remove(self, value):
+        for slot, stored in enumerate(self.values):
+            if stored == value:
+                self.discard_slot(slot)
+
+    def nearest(self, vector):
+        """Return (similarity, value) of the closest stored vector, or (0.0, None)"""
+        used = len(self.values)
+        if not used:
+            return 0.0, None
+
+        if used <= self.exact_limit:
+            candidates = np.arange(used)
+        else:
+            slots = set()
+            for buckets, key in zip(self.buckets, self.bucket_keys(vector)):
+                slots.update(buckets.get(key, ()))
+            if not slots:
+                return 0.0, None
+            candidates = np.fromiter(slots, dtype=np.int64, count=len(slots))
+
+        similarities = self.vectors[candidates] @ vector
+        best = int(np.argmax(similarities))
+        value = self.values[int(candidates[best])]
+        if value is None:
+            return 0.0, None
+        return float(similarities[best]), value
+
+    @property
+    def entries(self):
+        return sum(value is not None for value in self.values)
+
+    @property
+    def nbytes(self):
+        return self.vectors.nbytes
+
+
+class SemanticQuery:
+    """What the semantic cache embeds for one execution, and the index it belongs to"""
+
+    def __init__(self, partition, text):
+        self.partition = partition
+        self.text = text
+
+
+class SemanticCache:
+    """Per-partition vector indexes mapping embedded inputs to exact response cache keys"""
+
+    def __init__(self, embedder, threshold, max_entries, max_partitions):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_partitions = max_partitions
+        # Least recently used partitions are dropped first
+        self.indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'lookups': 0,
+            'hits': 0,
+            'stale': 0,
+            'lookup_seconds': 0.0,
+        }
+
+    def embed(self, text):
+        vector = self.embedder.embed(text)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def find(self, query):
+        """Return the response cache key of the nearest neighbour above the threshold, or None"""
+
+        start = time.perf_counter()
+        vector = self.embed(query.text)
+        key = None
+        with self._lock:
+            index = self.indexes.get(query.partition)
+            if vector is not None and index is not None:
+                self.indexes.move_to_end(query.partition)
+                similarity, candidate = index.nearest(vector)
+                if similarity >= self.threshold:
+                    key = candidate
+            self._stats['lookups'] += 1
+            self._stats['lookup_seconds'] += time.perf_counter() - start
+        return key
+
+    def record_hit(self, query, key, hit):
+        with self._lock:
+            if hit:
+                self._stats['hits'] += 1
+            else:
+                # The exact cache dropped the response, forget the neighbour too
+                self._stats['stale'] += 1
+                index = self.indexes.get(query.partition)
+                if index is not None:
+                    index.remove(key)
+
+    def lookup(self, query):
+        """Return a cached response for a near-duplicate of the query, or None"""
+        key = self.find(query)
+        if key is None:
+            return None
+        response = get_cached_response(key)
+        self.record_hit(query, key, response is not None)
+        return response
+
+    async def alookup(self, query):
+        """Async version of lookup"""
+        key = self.find(query)
+        if key is None:
+            return None
+        response = await aget_cached_response(key)
+        self.record_hit(query, key, response is not None)
+        return response
+
+    def add(self, query, cache_key):
+        """Remember that the query was answered with the response stored under cache_key"""
+        vector = self.embed(query.text)
+        if vector is None:
+            return
+        with self._lock:
+            index = self.indexes.get(query.partition)
+            if index is None:
+                index = self.indexes[query.partition] = VectorIndex(len(vector), self.max_entries)
+                while len(self.indexes) > self.max_partitions:
+                    self.indexes.popitem(last=False)
+            else:
+                self.indexes.move_to_end(query.partition)
+            index.add(vector, cache_key)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['partitions'] = len(self.indexes)
+            stats['entries'] = sum(index.entries for index in self.indexes.values())
+            stats['index_bytes'] = sum(index.nbytes for index in self.indexes.values())
+        stats['hit_rate'] = stats['hits'] / stats['lookups'] if stats['lookups'] else 0.0
+        return stats
+
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+
+def semantic_cache_enabled():
+    """Check whether the semantic cache is switched on and can run"""
+    return settings.SEMANTIC_CACHE_ENABLED and response_cache_enabled() and np is not None
+
+
+def get_semantic_cache():
+    """Return the process-wide semantic cache, or None when it is disabled"""
+    global _semantic_cache
+
+    if not semantic_cache_enabled():
+        if settings.SEMANTIC_CACHE_ENABLED and np is None:
+            logger.warning("Semantic cache is enabled but NumPy is not installed")
+        return None
+
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                embedder_class = import_string(settings.SEMANTIC_CACHE_EMBEDDER)
+                _semantic_cache = SemanticCache(
+                    embedder_class(**settings.SEMANTIC_CACHE_EMBEDDER_OPTIONS),
+                    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                    max_partitions=settings.SEMANTIC_CACHE_MAX_PARTITIONS,
+                )
+    return _semantic_cache
+
+
+def reset_semantic_cache():
+    """Drop the semantic cache so the next call rebuilds it from settings"""
+    global _semantic_cache
+    with _semantic_cache_lock:
+        _semantic_cache = None
+
+
+def get_semantic_cache_stats():
+    """Return lookup, hit and index size counters, all zero while the cache is off"""
+    cache = _semantic_cache
+    if cache is None:
+        return {
+            'lookups': 0, 'hits': 0, 'stale': 0, 'lookup_seconds': 0.0,
+            'partitions': 0, 'entries': 0, 'index_bytes': 0, 'hit_rate': 0.0,
+        }
+    return cache.stats()
+
+
+def build_semantic_query(user, data, model_name, generation_config):
+    """Describe an execution for the semantic cache, or return None when the cache is off"""
+    if get_semantic_cache() is None:
+        return None
+
+    # The template renders the username, role and style around the input, so
+    # users only share responses when their prompts differ in the input alone
+    frame = template_registry.render(
+        data['category'],
+        username=user.username,
+        role=user.role,
+        style=data['response_style'],
+        input_text='',
+    )
+
+    # Only inputs answered the same way may share responses
+    partition = json.dumps(
+        {
+            'user': user.id if settings.SEMANTIC_CACHE_PER_USER else None,
+            'role': user.role,
+            'template': content_hash(frame),
+            'category': data['category'],
+            'style': data['response_style'],
+            'model': model_name,
+            'config': generation_config,
+        },
+        sort_keys=True,
+    )
+    text = '\n'.join(filter(None, [data['input_text'], data.get('description', '')]))
+    return SemanticQuery(partition, text)
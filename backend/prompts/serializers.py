@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Prompt
+from .models import ExecutionJob, Prompt
+from .search import search_terms
 
 
 class PromptSerializer(serializers.ModelSerializer):
@@ -15,9 +16,50 @@ class PromptSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'generated_prompt', 'ai_response', 'created_at', 'updated_at']
 
 
+class PromptSummarySerializer(serializers.ModelSerializer):
+    """Compact serializer for prompt lists, expects a PromptQuerySet.summaries() queryset"""
+    
+    has_response = serializers.BooleanField(read_only=True)
+    
+    class Meta:
+        model = Prompt
+        fields = [
+            'id', 'title', 'input_text', 'category', 'response_style',
+            'description', 'response_preview', 'has_response', 'user',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class PromptSearchResultSerializer(PromptSummarySerializer):
+    """Summary of a prompt matched by a search, with its rank and a highlighted snippet"""
+    
+    rank = serializers.FloatField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+    
+    class Meta(PromptSummarySerializer.Meta):
+        fields = PromptSummarySerializer.Meta.fields + ['rank', 'snippet']
+        read_only_fields = fields
+
+
+class PromptSearchSerializer(serializers.Serializer):
+    """Serializer for prompt search query parameters"""
+    
+    q = serializers.CharField(max_length=200)
+    category = serializers.ChoiceField(choices=Prompt.CATEGORY_CHOICES, required=False)
+    response_style = serializers.ChoiceField(choices=Prompt.STYLE_CHOICES, required=False)
+    
+    def validate_q(self, value):
+        if not search_terms(value):
+            raise serializers.ValidationError('Enter at least one word to search for.')
+        return value
+
+
 class CreatePromptSerializer(serializers.ModelSerializer):
     """Serializer for creating prompts"""
     
+    ai_response = serializers.CharField(required=False, allow_blank=True)
+    
     class Meta:
         model = Prompt
         fields = ['title', 'input_text', 'category', 'response_style', 'description', 'ai_response']
@@ -26,11 +68,28 @@ class CreatePromptSerializer(serializers.ModelSerializer):
 class UpdatePromptSerializer(serializers.ModelSerializer):
     """Serializer for updating prompts including AI response"""
     
+    ai_response = serializers.CharField(required=False, allow_blank=True)
+    
     class Meta:
         model = Prompt
         fields = ['title', 'input_text', 'category', 'response_style', 'description', 'ai_response']
 
 
+class PromptImportSerializer(serializers.ModelSerializer):
+    """Serializer for one line of an NDJSON prompt import, see prompts.transfer"""
+    
+    generated_prompt = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False, default='')
+    ai_response = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False, default='')
+    created_at = serializers.DateTimeField(required=False)
+    
+    class Meta:
+        model = Prompt
+        fields = [
+            'title', 'input_text', 'category', 'response_style', 'description',
+            'generated_prompt', 'ai_response', 'created_at'
+        ]
+
+
 class ExecutePromptSerializer(serializers.Serializer):
     """Serializer for executing prompts"""
     
@@ -40,7 +99,40 @@ class ExecutePromptSerializer(serializers.Serializer):
     response_style = serializers.ChoiceField(choices=Prompt.STYLE_CHOICES)
     description = serializers.CharField(required=False, allow_blank=True)
     
-    def validate_prompt_id(self, value):
-        if value and not Prompt.objects.filter(id=value, user=self.context['request'].user).exists():
-            raise serializers.ValidationError("Prompt not found or you don't have permission to access it.")
-        return value
+    def validate(self, attrs):
+        # Load the prompt once and pass the instance on, so saving the execution
+        # does not have to look it up again
+        prompt_id = attrs.get('prompt_id')
+        if prompt_id:
+            prompt = Prompt.objects.filter(id=prompt_id, user=self.context['request'].user).first()
+            if prompt is None:
+                raise serializers.ValidationError({
+                    'prompt_id': "Prompt not found or you don't have permission to access it."
+                })
+            attrs['prompt'] = prompt
+        return attrs
+
+
+class StreamExecutePromptSerializer(ExecutePromptSerializer):
+    """Serializer for executing prompts with a streamed response"""
+    
+    save = serializers.BooleanField(required=False, default=False)
+
+
+class SubmitExecutionJobSerializer(ExecutePromptSerializer):
+    """Serializer for queueing a prompt execution"""
+    
+    save = serializers.BooleanField(required=False, default=False)
+
+
+class ExecutionJobSerializer(serializers.ModelSerializer):
+    """Serializer for ExecutionJob model"""
+    
+    class Meta:
+        model = ExecutionJob
+        fields = [
+            'id', 'status', 'prompt', 'save_result', 'generated_prompt',
+            'ai_response', 'cached', 'error', 'attempts',
+            'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
@@ -1,153 +1,429 @@
-import google.generativeai as genai
+from asgiref.sync import sync_to_async
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
-from .models import Prompt
+from django.core.cache import caches
+from django.db.models import Count, Max, Q
+from prompt_builder.metrics import timed
+from .cache import (
+    aget_cached_response,
+    aset_cached_response,
+    get_cached_response,
+    make_response_cache_key,
+    set_cached_response,
+)
+from .models import Prompt, content_hash
+from .prompt_templates import template_registry
+from .providers import ProviderThrottled, get_provider
+from .ratelimit import (
+    RateLimitExceeded,
+    aacquire,
+    acquire,
+    acquire_nowait,
+    record_success,
+    record_throttled,
+)
+from .resilience import CircuitOpenError, acall_with_resilience, call_with_resilience
+from .semantic_cache import build_semantic_query, get_semantic_cache
+from .serializers import PromptSerializer
 import logging
 
-# Configure Gemini
-if hasattr(settings, 'GEMINI_API_KEY'):
-    genai.configure(api_key=settings.GEMINI_API_KEY)
-
 logger = logging.getLogger(__name__)
 
 
 def generate_prompt_template(user, category, input_text, style, description=None):
     """Generate a prompt template based on user profile and inputs"""
     
-    templates = {
-        'doubt': f"""
-As an AI assistant helping {user.username} (a {user.role}), please provide a {style} answer to the following question:
+    return template_registry.render(
+        category,
+        username=user.username,
+        role=user.role,
+        style=style,
+        input_text=input_text,
+        description=description
+    )
 
-Question: {input_text}
 
-{f"Additional context: {description}" if description else ""}
+def execute_gemini_request(prompt_text, user_id=None):
+    """Execute a request to the configured LLM provider (Gemini unless LLM_PROVIDER says otherwise)"""
+    
+    provider = get_provider()
+    provider.check_configured()
+    
+    # Wait for the global and per-user request budget
+    acquire(user_id)
+    
+    try:
+        def request(timeout):
+            try:
+                return provider.generate(prompt_text, timeout=timeout)
+            except ProviderThrottled:
+                record_throttled()
+                raise
+        
+        # A hedged attempt is a second provider call, so it needs its own token
+        with timed('llm'):
+            ai_response = call_with_resilience(
+                request,
+                may_hedge=lambda: acquire_nowait(user_id),
+                acquire_token=lambda max_wait: acquire(user_id, max_wait=max_wait)
+            )
+        record_success()
+        
+        return ai_response
+    
+    except (CircuitOpenError, RateLimitExceeded):
+        # A retry can run out of request budget
+        raise
+    
+    except ProviderThrottled as e:
+        logger.error(f"{provider.display_name} API quota exceeded: {str(e)}")
+        raise RateLimitExceeded(f"{provider.display_name} quota exceeded, please retry shortly") from e
+    
+    except Exception as e:
+        logger.error(f"{provider.display_name} API error: {str(e)}")
+        raise Exception(f"{provider.display_name} API error: {str(e)}")
+
 
-Please ensure your response is {style} and tailored to someone with a {user.role} background.
-        """.strip(),
+def stream_gemini_request(prompt_text, user_id=None):
+    """Execute a streaming request to the configured LLM provider, yielding text chunks as they arrive"""
+    
+    provider = get_provider()
+    provider.check_configured()
+    
+    acquire(user_id)
+    
+    try:
+        def request(timeout):
+            try:
+                return provider.stream(prompt_text, timeout=timeout)
+            except ProviderThrottled:
+                record_throttled()
+                raise
+        
+        # Failures before the first chunk are retried; hedging would send the same stream twice
+        with timed('llm'):
+            chunks = call_with_resilience(
+                request,
+                hedge=False,
+                acquire_token=lambda max_wait: acquire(user_id, max_wait=max_wait)
+            )
+        
+        for chunk in chunks:
+            yield chunk
         
-        'image_generation': f"""
-Create a {style} image generation prompt based on the following request from {user.username} (a {user.role}):
+        record_success()
+    
+    except (CircuitOpenError, RateLimitExceeded):
+        # A retry can run out of request budget
+        raise
+    
+    except ProviderThrottled as e:
+        logger.error(f"{provider.display_name} API quota exceeded: {str(e)}")
+        raise RateLimitExceeded(f"{provider.display_name} quota exceeded, please retry shortly") from e
+    
+    except Exception as e:
+        logger.error(f"{provider.display_name} API error: {str(e)}")
+        raise Exception(f"{provider.display_name} API error: {str(e)}")
 
-Request: {input_text}
 
-{f"Additional requirements: {description}" if description else ""}
+def get_response_cache_key(prompt_text):
+    """Build the response cache key for a prompt sent with the configured provider and model"""
+    provider = get_provider()
+    return make_response_cache_key(
+        provider.model_name,
+        provider.generation_config,
+        content_hash(prompt_text)
+    )
 
-Generate a detailed prompt that includes:
-- Visual style and composition
-- Lighting and atmosphere
-- Color palette suggestions
-- Technical specifications
-- Art style references
 
-Make it suitable for AI image generation tools and {style} in nature.
-        """.strip(),
-        
-        'learning_roadmap': f"""
-Create a {style} learning roadmap for {user.username} (a {user.role}) on the following topic:
+def get_semantic_query(user, data):
+    """Describe an execution for the semantic cache, None when it is switched off"""
+    provider = get_provider()
+    return build_semantic_query(user, data, provider.model_name, provider.generation_config)
 
-Topic: {input_text}
 
-{f"Learning goals: {description}" if description else ""}
+def get_gemini_response(prompt_text, user_id=None, semantic_query=None):
+    """Return (ai_response, cached), serving repeated prompts and near-duplicates from the caches"""
+    
+    cache_key = get_response_cache_key(prompt_text)
+    
+    cached_response = get_cached_response(cache_key)
+    if cached_response is not None:
+        return cached_response, True
+    
+    if semantic_query is not None:
+        cached_response = get_semantic_cache().lookup(semantic_query)
+        if cached_response is not None:
+            return cached_response, True
+    
+    ai_response = execute_gemini_request(prompt_text, user_id=user_id)
+    set_cached_response(cache_key, ai_response)
+    if semantic_query is not None:
+        get_semantic_cache().add(semantic_query, cache_key)
+    
+    return ai_response, False
 
-Please provide:
-- Learning objectives
-- Step-by-step progression
-- Recommended resources
-- Time estimates
-- Milestone assessments
-- Practical projects
 
-Tailor the roadmap to a {user.role} background and make it {style}.
-        """.strip(),
-        
-        'video_generation': f"""
-Develop a {style} video concept and script for {user.username} (a {user.role}) based on:
+def execute_prompt_only(user, data):
+    """Execute a prompt with Gemini without saving to database"""
+    
+    # Generate the prompt template
+    generated_prompt = generate_prompt_template(
+        user=user,
+        category=data['category'],
+        input_text=data['input_text'],
+        style=data['response_style'],
+        description=data.get('description', '')
+    )
+    
+    # Execute the prompt with Gemini
+    ai_response, cached = get_gemini_response(
+        generated_prompt, user_id=user.id, semantic_query=get_semantic_query(user, data)
+    )
+    
+    return {
+        'generated_prompt': generated_prompt,
+        'ai_response': ai_response,
+        'cached': cached
+    }
 
-Video idea: {input_text}
 
-{f"Additional requirements: {description}" if description else ""}
+def execute_prompt_batch(user, items):
+    """Execute several prompts concurrently, returning results in input order"""
+    
+    if not items:
+        return []
+    
+    # Render in the request thread so the pool threads only wait on Gemini
+    generated_prompts = [
+        generate_prompt_template(
+            user=user,
+            category=data['category'],
+            input_text=data['input_text'],
+            style=data['response_style'],
+            description=data.get('description', '')
+        )
+        for data in items
+    ]
+    
+    max_workers = max(1, min(settings.GEMINI_BATCH_CONCURRENCY, len(items)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Each call runs in a copy of the request context so its timings are recorded
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                get_gemini_response,
+                prompt_text,
+                user_id=user.id,
+                semantic_query=get_semantic_query(user, data)
+            )
+            for prompt_text, data in zip(generated_prompts, items)
+        ]
+    
+    results = []
+    for generated_prompt, future in zip(generated_prompts, futures):
+        try:
+            ai_response, cached = future.result()
+            results.append({
+                'generated_prompt': generated_prompt,
+                'ai_response': ai_response,
+                'cached': cached
+            })
+        except (RateLimitExceeded, CircuitOpenError, ValueError) as e:
+            results.append({'error': str(e)})
+        except Exception as e:
+            results.append({'error': f'Failed to execute prompt: {str(e)}'})
+    
+    return results
 
-Please include:
-- Video concept overview
-- Target audience
-- Script outline
-- Visual suggestions
-- Pacing and structure
-- Call-to-action
 
-Make it engaging and {style}, suitable for a {user.role}'s perspective.
-        """.strip(),
-        
-        'deep_research': f"""
-Conduct a {style} research analysis for {user.username} (a {user.role}) on:
+def create_and_execute_prompt(user, data):
+    """Create a prompt and execute it with Gemini"""
+    
+    # Generate the prompt template
+    generated_prompt = generate_prompt_template(
+        user=user,
+        category=data['category'],
+        input_text=data['input_text'],
+        style=data['response_style'],
+        description=data.get('description', '')
+    )
+    
+    # Execute the prompt with Gemini
+    ai_response, cached = get_gemini_response(
+        generated_prompt, user_id=user.id, semantic_query=get_semantic_query(user, data)
+    )
+    
+    prompt = save_prompt_execution(user, data, generated_prompt, ai_response)
+    
+    return prompt, ai_response, cached
 
-Research topic: {input_text}
 
-{f"Research focus: {description}" if description else ""}
+# Columns an execution changes on an existing prompt
+EXECUTION_UPDATE_FIELDS = [
+    'input_text', 'category', 'response_style', 'description',
+    'generated_prompt', 'ai_response', 'updated_at',
+]
 
-Please provide:
-- Research methodology
-- Key findings and insights
-- Data analysis
-- Supporting evidence
-- Conclusions and implications
-- Further research suggestions
 
-Present the research in a {style} manner appropriate for a {user.role}.
-        """.strip(),
-        
-        'idea_exploration': f"""
-Explore and expand on the following idea for {user.username} (a {user.role}):
+def get_execution_target(user, data):
+    """Return the prompt an execution updates, or None when it creates a new one"""
+    
+    # Validation already loaded it; queued jobs only carry the id
+    prompt = data.get('prompt')
+    if prompt is None and data.get('prompt_id'):
+        prompt = Prompt.objects.get(id=data['prompt_id'], user=user)
+    return prompt
 
-Initial idea: {input_text}
 
-{f"Exploration direction: {description}" if description else ""}
+def apply_prompt_execution(prompt, data, generated_prompt, ai_response):
+    """Copy an execution's inputs and results onto an existing prompt"""
+    prompt.input_text = data['input_text']
+    prompt.category = data['category']
+    prompt.response_style = data['response_style']
+    prompt.description = data.get('description', '')
+    prompt.generated_prompt = generated_prompt
+    prompt.ai_response = ai_response
 
-Please provide:
-- Concept expansion
-- Creative variations
-- Implementation possibilities
-- Potential challenges
-- Market opportunities
-- Next steps
 
-Make the exploration {style} and relevant to a {user.role}'s perspective.
-        """.strip(),
-    }
+def build_prompt_execution(user, data, generated_prompt, ai_response):
+    """Build a new, unsaved prompt for an execution"""
+    title = data.get('title', f"{data['category'].replace('_', ' ').title()} - {data['input_text'][:50]}")
+    return Prompt(
+        user=user,
+        title=title,
+        input_text=data['input_text'],
+        category=data['category'],
+        response_style=data['response_style'],
+        description=data.get('description', ''),
+        generated_prompt=generated_prompt,
+        ai_response=ai_response
+    )
+
+
+def save_prompt_execution(user, data, generated_prompt, ai_response):
+    """Store an executed prompt, updating the existing one when prompt_id is given"""
+    
+    prompt = get_execution_target(user, data)
+    if prompt is not None:
+        apply_prompt_execution(prompt, data, generated_prompt, ai_response)
+        # Write only what an execution changes instead of every column
+        prompt.save(update_fields=EXECUTION_UPDATE_FIELDS)
+    else:
+        prompt = build_prompt_execution(user, data, generated_prompt, ai_response)
+        prompt.save()
+    
+    return prompt
+
+
+def stream_prompt_execution(user, data, save=False):
+    """Execute a prompt with Gemini, yielding (event, payload) pairs as the response streams in"""
+    
+    # Generate the prompt template
+    generated_prompt = generate_prompt_template(
+        user=user,
+        category=data['category'],
+        input_text=data['input_text'],
+        style=data['response_style'],
+        description=data.get('description', '')
+    )
+    
+    yield 'prompt', {'generated_prompt': generated_prompt}
+    
+    # Repeated prompts and near-duplicates are replayed from the caches as a single chunk
+    cache_key = get_response_cache_key(generated_prompt)
+    semantic_query = get_semantic_query(user, data)
+    cached_response = get_cached_response(cache_key)
+    if cached_response is None and semantic_query is not None:
+        cached_response = get_semantic_cache().lookup(semantic_query)
+    cached = cached_response is not None
+    chunks = [cached_response] if cached else stream_gemini_request(generated_prompt, user_id=user.id)
+    
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield 'chunk', {'text': chunk}
     
-    return templates.get(category, templates['doubt'])
+    ai_response = ''.join(parts).strip()
+    if not cached:
+        set_cached_response(cache_key, ai_response)
+        if semantic_query is not None:
+            get_semantic_cache().add(semantic_query, cache_key)
+    
+    prompt_id = None
+    if save:
+        prompt = save_prompt_execution(user, data, generated_prompt, ai_response)
+        prompt_id = prompt.id
+    
+    yield 'done', {'cached': cached, 'prompt_id': prompt_id}
 
 
-def execute_gemini_request(prompt_text):
-    """Execute a request to Gemini API"""
+async def aexecute_gemini_request(prompt_text, user_id=None):
+    """Execute a request to the configured LLM provider without blocking the event loop"""
+    
+    provider = get_provider()
+    provider.check_configured()
     
-    if not hasattr(settings, 'GEMINI_API_KEY') or not settings.GEMINI_API_KEY:
-        raise ValueError("Gemini API key not configured")
+    await aacquire(user_id)
     
     try:
-        # Initialize the Gemini model
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        async def request(timeout):
+            try:
+                return await provider.agenerate(prompt_text, timeout=timeout)
+            except ProviderThrottled:
+                await sync_to_async(record_throttled)()
+                raise
         
-        # Generate content
-        response = model.generate_content(
-            prompt_text,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=2000,
-                temperature=0.7,
+        with timed('llm'):
+            ai_response = await acall_with_resilience(
+                request,
+                acquire_token=lambda max_wait: aacquire(user_id, max_wait=max_wait)
             )
-        )
+        await sync_to_async(record_success)()
         
-        return response.text.strip()
+        return ai_response
+    
+    except (CircuitOpenError, RateLimitExceeded):
+        # A retry can run out of request budget
+        raise
+    
+    except ProviderThrottled as e:
+        logger.error(f"{provider.display_name} API quota exceeded: {str(e)}")
+        raise RateLimitExceeded(f"{provider.display_name} quota exceeded, please retry shortly") from e
     
     except Exception as e:
-        logger.error(f"Gemini API error: {str(e)}")
-        raise Exception(f"Gemini API error: {str(e)}")
+        logger.error(f"{provider.display_name} API error: {str(e)}")
+        raise Exception(f"{provider.display_name} API error: {str(e)}")
 
 
-def execute_prompt_only(user, data):
-    """Execute a prompt with Gemini without saving to database"""
+async def aget_gemini_response(prompt_text, user_id=None, semantic_query=None):
+    """Async version of get_gemini_response"""
     
-    # Generate the prompt template
-    generated_prompt = generate_prompt_template(
+    cache_key = get_response_cache_key(prompt_text)
+    
+    cached_response = await aget_cached_response(cache_key)
+    if cached_response is not None:
+        return cached_response, True
+    
+    if semantic_query is not None:
+        cached_response = await get_semantic_cache().alookup(semantic_query)
+        if cached_response is not None:
+            return cached_response, True
+    
+    ai_response = await aexecute_gemini_request(prompt_text, user_id=user_id)
+    await aset_cached_response(cache_key, ai_response)
+    if semantic_query is not None:
+        get_semantic_cache().add(semantic_query, cache_key)
+    
+    return ai_response, False
+
+
+async def aexecute_prompt_only(user, data):
+    """Async version of execute_prompt_only"""
+    
+    # Rendering may refresh database templates, which needs a sync context
+    generated_prompt = await sync_to_async(generate_prompt_template)(
         user=user,
         category=data['category'],
         input_text=data['input_text'],
@@ -155,20 +431,21 @@ def execute_prompt_only(user, data):
         description=data.get('description', '')
     )
     
-    # Execute the prompt with Gemini
-    ai_response = execute_gemini_request(generated_prompt)
+    ai_response, cached = await aget_gemini_response(
+        generated_prompt, user_id=user.id, semantic_query=get_semantic_query(user, data)
+    )
     
     return {
         'generated_prompt': generated_prompt,
-        'ai_response': ai_response
+        'ai_response': ai_response,
+        'cached': cached
     }
 
 
-def create_and_execute_prompt(user, data):
-    """Create a prompt and execute it with Gemini"""
+async def acreate_and_execute_prompt(user, data):
+    """Async version of create_and_execute_prompt"""
     
-    # Generate the prompt template
-    generated_prompt = generate_prompt_template(
+    generated_prompt = await sync_to_async(generate_prompt_template)(
         user=user,
         category=data['category'],
         input_text=data['input_text'],
@@ -176,31 +453,109 @@ def create_and_execute_prompt(user, data):
         description=data.get('description', '')
     )
     
-    # Execute the prompt with Gemini
-    ai_response = execute_gemini_request(generated_prompt)
+    ai_response, cached = await aget_gemini_response(
+        generated_prompt, user_id=user.id, semantic_query=get_semantic_query(user, data)
+    )
     
-    # Create or update the prompt
-    if 'prompt_id' in data and data['prompt_id']:
-        prompt = Prompt.objects.get(id=data['prompt_id'], user=user)
-        prompt.input_text = data['input_text']
-        prompt.category = data['category']
-        prompt.response_style = data['response_style']
-        prompt.description = data.get('description', '')
-        prompt.generated_prompt = generated_prompt
-        prompt.ai_response = ai_response
-        prompt.save()
+    prompt = await asave_prompt_execution(user, data, generated_prompt, ai_response)
+    
+    return prompt, ai_response, cached
+
+
+async def asave_prompt_execution(user, data, generated_prompt, ai_response):
+    """Async version of save_prompt_execution"""
+    
+    prompt = data.get('prompt')
+    if prompt is None and data.get('prompt_id'):
+        prompt = await Prompt.objects.aget(id=data['prompt_id'], user=user)
+    
+    if prompt is not None:
+        apply_prompt_execution(prompt, data, generated_prompt, ai_response)
+        await prompt.asave(update_fields=EXECUTION_UPDATE_FIELDS)
     else:
-        # Create a new prompt
-        title = data.get('title', f"{data['category'].replace('_', ' ').title()} - {data['input_text'][:50]}")
-        prompt = Prompt.objects.create(
-            user=user,
-            title=title,
-            input_text=data['input_text'],
-            category=data['category'],
-            response_style=data['response_style'],
-            description=data.get('description', ''),
-            generated_prompt=generated_prompt,
-            ai_response=ai_response
+        prompt = build_prompt_execution(user, data, generated_prompt, ai_response)
+        await prompt.asave()
+    
+    return prompt
+
+
+def get_dashboard_stats_cache():
+    """Return the cache holding dashboard stats snapshots"""
+    return caches[settings.DASHBOARD_STATS_CACHE]
+
+
+def dashboard_stats_cache_key(user_id):
+    """Cache key for a user's dashboard stats snapshot"""
+    return f"dashboard-stats:{user_id}"
+
+
+def dashboard_stats_version_key(user_id):
+    """Cache key for the version a snapshot must carry to be served"""
+    return f"dashboard-stats-version:{user_id}"
+
+
+def compute_dashboard_stats(user):
+    """Compute dashboard statistics with a single aggregate query plus the recent activity query"""
+    
+    # Clear the default ordering so it does not leak into the GROUP BY
+    category_rows = (
+        Prompt.objects
+        .filter(user=user)
+        .order_by()
+        .values('category')
+        .annotate(
+            total=Count('id'),
+            executions=Count('id', filter=Q(ai_response_blob__isnull=False)),
+            latest_created_at=Max('created_at'),
+            latest_id=Max('id'),
         )
+    )
+    
+    category_counts = {}
+    total_executions = 0
+    latest = {}
+    for row in category_rows:
+        category_counts[row['category']] = row['total']
+        total_executions += row['executions']
+        latest[row['category']] = (row['latest_created_at'], row['latest_id'])
+    
+    # Ties go to the category used most recently, as when counting prompts newest first
+    favorite_category = ''
+    if category_counts:
+        favorite_category = max(category_counts, key=lambda category: (category_counts[category], latest[category]))
+    
+    recent_prompts = Prompt.objects.filter(user=user).with_texts().order_by('-created_at', '-id')[:5]
+    
+    return {
+        'totalPrompts': sum(category_counts.values()),
+        'totalExecutions': total_executions,
+        'favoriteCategory': favorite_category,
+        'recentActivity': PromptSerializer(recent_prompts, many=True).data
+    }
+
+
+def get_dashboard_stats(user):
+    """Return the user's dashboard statistics, served from a cached snapshot when possible"""
+    
+    # The version is read before computing, so a snapshot that raced with a
+    # committed change carries the old version and is never served
+    cache = get_dashboard_stats_cache()
+    cache_key, version_key = dashboard_stats_cache_key(user.id), dashboard_stats_version_key(user.id)
+    entries = cache.get_many([cache_key, version_key])
+    version = entries.get(version_key, 0)
+    entry = entries.get(cache_key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
     
-    return prompt, ai_response
+    stats = compute_dashboard_stats(user)
+    cache.set(cache_key, (version, stats), settings.DASHBOARD_STATS_CACHE_TTL)
+    return stats
+
+
+def invalidate_dashboard_stats(user_id):
+    """Stop every worker from serving a user's dashboard stats snapshot"""
+    cache = get_dashboard_stats_cache()
+    version_key = dashboard_stats_version_key(user_id)
+    cache.add(version_key, 0, timeout=None)
+    cache.incr(version_key)
+    cache.delete(dashboard_stats_cache_key(user_id))
@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Prompt, PromptTemplate, TextBlob
+from .prompt_templates import template_registry
+from .search import INDEXED_FIELDS, index_prompts, remove_prompts
+from .services import invalidate_dashboard_stats
+
+
+@receiver(post_save, sender=Prompt)
+@receiver(post_delete, sender=Prompt)
+def invalidate_dashboard_stats_on_change(sender, instance, **kwargs):
+    """Drop the owner's dashboard stats snapshot once a change to one of their prompts is committed"""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_dashboard_stats(user_id))
+
+
+@receiver(post_delete, sender=Prompt)
+def release_prompt_texts(sender, instance, **kwargs):
+    """Drop the deleted prompt's references to its text blobs, deleting blobs left unused"""
+    TextBlob.objects.release([instance.generated_prompt_blob_id, instance.ai_response_blob_id])
+
+
+@receiver(post_save, sender=Prompt)
+def index_prompt_for_search(sender, instance, update_fields=None, **kwargs):
+    """Refresh the prompt in the full-text search index when searchable text may have changed"""
+    if update_fields is None or INDEXED_FIELDS & update_fields:
+        index_prompts([instance])
+
+
+@receiver(post_delete, sender=Prompt)
+def remove_prompt_from_search(sender, instance, **kwargs):
+    """Drop a deleted prompt from the full-text search index"""
+    remove_prompts([instance.id])
+
+
+@receiver(post_save, sender=PromptTemplate)
+@receiver(post_delete, sender=PromptTemplate)
+def reload_prompt_templates(sender, instance, **kwargs):
+    """Pick up template edits in this process straight away, others refresh on their reload interval"""
+    template_registry.invalidate_database()
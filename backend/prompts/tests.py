@@ -0,0 +1,383 @@
+import asyncio
+import io
+import threading
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection, models
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .models import Prompt, TextBlob, content_hash
+from .providers import ProviderThrottled, ProviderUnavailable
+from .ratelimit import get_limiter_cache, try_acquire
+from .resilience import CircuitBreaker, CircuitOpenError, acall_with_resilience, call_with_resilience
+from .search import PromptSearch
+from .services import compute_dashboard_stats, get_dashboard_stats, get_dashboard_stats_cache, invalidate_dashboard_stats
+from .semantic_cache import build_semantic_query, get_semantic_cache, reset_semantic_cache
+from .transfer import export_rows, import_prompts, iter_gzip, iter_ndjson, read_ndjson
+
+
+@override_settings(
+    GEMINI_HEDGING_ENABLED=False,
+    GEMINI_MAX_RETRIES=2,
+    GEMINI_RETRY_BASE_DELAY=0,
+    GEMINI_RETRY_MAX_DELAY=0,
+)
+class CircuitBreakerTests(SimpleTestCase):
+    """Circuit breaker and retry behaviour of call_with_resilience"""
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        patcher = mock.patch('prompts.resilience.circuit_breaker', self.breaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def open_breaker(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_probe_with_non_retryable_error_closes_breaker(self):
+        self.open_breaker()
+
+        def request(timeout):
+            raise ValueError('Response blocked by safety filters')
+
+        with self.assertRaises(ValueError):
+            call_with_resilience(request)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(call_with_resilience(lambda timeout: 'ok'), 'ok')
+
+    def test_cancelled_probe_releases_half_open_slot(self):
+        self.open_breaker()
+
+        async def request(timeout):
+            raise asyncio.CancelledError()
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(acall_with_resilience(request))
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        async def succeed(timeout):
+            return 'ok'
+
+        self.assertEqual(asyncio.run(acall_with_resilience(succeed)), 'ok')
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_breaker_rejects_concurrent_calls(self):
+        self.open_breaker()
+        self.breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            call_with_resilience(lambda timeout: 'ok')
+
+    def test_throttling_does_not_open_breaker(self):
+        def request(timeout):
+            raise ProviderThrottled('429 quota exceeded')
+
+        with self.assertRaises(ProviderThrottled):
+            call_with_resilience(request)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_retries_take_a_token(self):
+        self.breaker.failure_threshold = 10
+        attempts = []
+
+        def request(timeout):
+            attempts.append(timeout)
+            if len(attempts) < 3:
+                raise ProviderUnavailable('503 overloaded')
+            return 'ok'
+
+        acquire_token = mock.Mock()
+        self.assertEqual(call_with_resilience(request, acquire_token=acquire_token), 'ok')
+        self.assertEqual(acquire_token.call_count, 2)
+
+
+@override_settings(
+    LLM_RATE_LIMIT_ENABLED=True,
+    LLM_RATE_LIMIT_USER_BURST=3,
+    LLM_RATE_LIMIT_USER_PER_MINUTE=1,
+    LLM_RATE_LIMIT_GLOBAL_BURST=5,
+    LLM_RATE_LIMIT_GLOBAL_PER_MINUTE=5,
+)
+class RateLimitTests(SimpleTestCase):
+    """Request windows shared through the limiter cache"""
+
+    def setUp(self):
+        get_limiter_cache().clear()
+        self.addCleanup(get_limiter_cache().clear)
+        # Start of a user (180s) and a global (60s) window
+        self.now = 1800.0
+        patcher = mock.patch('prompts.ratelimit.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_user_window(self):
+        self.assertEqual([try_acquire(1) for _ in range(3)], [0, 0, 0])
+        self.assertEqual(try_acquire(1), 180.0)
+        self.assertEqual(try_acquire(2), 0)
+
+    def test_concurrent_requests_never_overspend(self):
+        granted = []
+
+        def worker():
+            for _ in range(5):
+                if not try_acquire():
+                    granted.append(1)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(granted), 5)
+
+    def test_refused_global_request_returns_user_budget(self):
+        for user_id in range(5):
+            self.assertEqual(try_acquire(user_id), 0)
+        self.assertEqual(try_acquire(9), 60.0)
+
+        # Next global window, user 9 still has its whole burst
+        self.now += 60
+        self.assertEqual([try_acquire(9) for _ in range(4)], [0, 0, 0, 120.0])
+
+
+class PromptSearchTests(TestCase):
+    """Full-text search scoping and result loading"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('searcher', 'searcher@example.com', 'password')
+        self.prompt = Prompt.objects.create(
+            user=self.user, title='Recursion basics', input_text='Explain recursion',
+            category='doubt', response_style='concise', ai_response='A function that calls itself',
+        )
+
+    def test_owner_token_is_not_searchable(self):
+        self.assertEqual(PromptSearch(self.user, f"u{self.user.id}").count(), 0)
+        self.assertEqual(PromptSearch(self.user, 'recursion').count(), 1)
+
+    def test_prompt_deleted_after_index_query_is_skipped(self):
+        search = PromptSearch(self.user, 'recursion')
+        rows = [(self.prompt.id, 1.0, 'recursion'), (self.prompt.id + 1000, 0.5, 'gone')]
+        with mock.patch.object(type(search.backend), 'search', return_value=rows):
+            results = search[0:10]
+        self.assertEqual([prompt.id for prompt in results], [self.prompt.id])
+
+
+class TextBlobTests(TestCase):
+    """Reference counting of the shared prompt texts"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('blobs', 'blobs@example.com', 'password')
+        self.first = self.create_prompt('Shared answer')
+        self.second = self.create_prompt('Shared answer')
+
+    def create_prompt(self, ai_response):
+        return Prompt.objects.create(
+            user=self.user, title='Blob', input_text='Question', category='doubt', response_style='concise',
+            ai_response=ai_response,
+        )
+
+    def ref_count(self, text):
+        blob = TextBlob.objects.filter(hash=content_hash(text)).first()
+        return blob.ref_count if blob else 0
+
+    def test_equal_texts_share_one_blob(self):
+        self.assertEqual(self.first.ai_response_blob_id, self.second.ai_response_blob_id)
+        self.assertEqual(TextBlob.objects.filter(hash=content_hash('Shared answer')).count(), 1)
+        self.assertEqual(self.ref_count('Shared answer'), 2)
+
+    def test_deleting_one_prompt_keeps_the_other_text(self):
+        self.first.delete()
+        self.assertEqual(self.ref_count('Shared answer'), 1)
+        self.assertEqual(Prompt.objects.get(pk=self.second.pk).ai_response, 'Shared answer')
+
+    def test_updating_one_prompt_keeps_the_other_text(self):
+        self.first.ai_response = 'Own answer'
+        self.first.save()
+        self.assertEqual(self.ref_count('Shared answer'), 1)
+        self.assertEqual(self.ref_count('Own answer'), 1)
+        self.assertEqual(Prompt.objects.get(pk=self.first.pk).ai_response, 'Own answer')
+        self.assertEqual(Prompt.objects.get(pk=self.second.pk).ai_response, 'Shared answer')
+
+    def test_unreferenced_blob_is_deleted(self):
+        self.first.delete()
+        self.second.ai_response = ''
+        self.second.save()
+        self.assertFalse(TextBlob.objects.filter(hash=content_hash('Shared answer')).exists())
+        self.assertIsNone(Prompt.objects.get(pk=self.second.pk).ai_response_blob_id)
+
+    def test_failed_save_restores_the_blob_keys(self):
+        key = self.first.ai_response_blob_id
+        self.first.ai_response = 'Lost answer'
+        with mock.patch.object(models.Model, 'save', side_effect=DatabaseError('write failed')):
+            with self.assertRaises(DatabaseError):
+                self.first.save()
+        self.assertEqual(self.first.ai_response_blob_id, key)
+        self.assertEqual(self.ref_count('Shared answer'), 2)
+        self.assertEqual(self.ref_count('Lost answer'), 0)
+
+
+class PromptTransferTests(TestCase):
+    """Exporting prompt history and importing it again"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.source = User.objects.create_user('exporter', 'exporter@example.com', 'password')
+        self.target = User.objects.create_user('importer', 'importer@example.com', 'password')
+        self.started = timezone.now() - timedelta(days=30)
+        for i, title in enumerate(['Recursion basics', 'Recursion depth', 'Sorting']):
+            prompt = Prompt.objects.create(
+                user=self.source, title=title, input_text=f'Explain {title.lower()}', category='doubt',
+                response_style='concise', generated_prompt=f'Prompt {i}', ai_response='Shared answer',
+            )
+            Prompt.objects.filter(pk=prompt.pk).update(created_at=self.started + timedelta(days=i))
+
+    def round_trip(self):
+        exported = b''.join(iter_gzip(iter_ndjson(export_rows(Prompt.objects.filter(user=self.source)))))
+        with self.captureOnCommitCallbacks(execute=True):
+            return import_prompts(read_ndjson(io.BytesIO(exported)), user=self.target, batch_size=2)
+
+    def test_round_trip(self):
+        self.assertEqual(self.round_trip(), 3)
+
+        def history(user):
+            return list(
+                Prompt.objects.filter(user=user).with_texts().order_by('created_at').values_list(
+                    'title', 'created_at', 'generated_prompt_blob__content', 'ai_response_blob__content',
+                )
+            )
+        self.assertEqual(history(self.target), history(self.source))
+        self.assertEqual(history(self.target)[0][1], self.started)
+
+        # Imported prompts reference the existing blobs rather than copying them
+        self.assertEqual(TextBlob.objects.get(hash=content_hash('Shared answer')).ref_count, 6)
+        self.assertEqual(TextBlob.objects.get(hash=content_hash('Prompt 0')).ref_count, 2)
+
+        self.assertEqual(PromptSearch(self.target, 'recursion').count(), 2)
+        self.assertEqual(PromptSearch(self.target, 'sorting').count(), 1)
+
+
+@override_settings(SEMANTIC_CACHE_ENABLED=True, SEMANTIC_CACHE_PER_USER=False, GEMINI_CACHE_ENABLED=True)
+class SemanticCacheTests(TestCase):
+    """Near-duplicate lookups stay within prompts rendered the same way"""
+
+    def setUp(self):
+        reset_semantic_cache()
+        self.addCleanup(reset_semantic_cache)
+        self.data = {'category': 'doubt', 'response_style': 'concise', 'input_text': 'Explain recursion in Python'}
+
+    def query(self, user, input_text):
+        return build_semantic_query(user, dict(self.data, input_text=input_text), 'fake', {})
+
+    def test_users_never_share_entries(self):
+        alice = mock.Mock(id=1, username='alice', role='student')
+        bob = mock.Mock(id=2, username='bob', role='student')
+        cache = get_semantic_cache()
+        cache.add(self.query(alice, 'Explain recursion in Python'), 'alice-response')
+
+        self.assertEqual(cache.find(self.query(alice, 'Explain recursion in Python please')), 'alice-response')
+        self.assertIsNone(cache.find(self.query(bob, 'Explain recursion in Python')))
+
+
+class DashboardStatsTests(TestCase):
+    """Dashboard stats snapshots and the favourite category"""
+
+    def setUp(self):
+        get_dashboard_stats_cache().clear()
+        self.addCleanup(get_dashboard_stats_cache().clear)
+        self.user = get_user_model().objects.create_user('dash', 'dash@example.com', 'password')
+
+    def create_prompt(self, category):
+        return Prompt.objects.create(
+            user=self.user, title=category, input_text='Question', category=category, response_style='concise',
+        )
+
+    def test_favorite_category_tie_goes_to_the_most_recent(self):
+        for category in ['roadmap', 'doubt', 'doubt', 'roadmap']:
+            self.create_prompt(category)
+        self.assertEqual(get_dashboard_stats(self.user)['favoriteCategory'], 'roadmap')
+
+    def test_committed_change_refreshes_the_snapshot(self):
+        self.create_prompt('doubt')
+        self.assertEqual(get_dashboard_stats(self.user)['totalPrompts'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_prompt('doubt')
+        self.assertEqual(get_dashboard_stats(self.user)['totalPrompts'], 2)
+
+    def test_snapshot_computed_during_a_change_is_not_served(self):
+        def compute_while_a_change_commits(user):
+            stats = compute_dashboard_stats(user)
+            # A prompt is saved and committed after the stats above were read
+            self.create_prompt('doubt')
+            invalidate_dashboard_stats(user.id)
+            return stats
+
+        with mock.patch('prompts.services.compute_dashboard_stats', side_effect=compute_while_a_change_commits):
+            self.assertEqual(get_dashboard_stats(self.user)['totalPrompts'], 0)
+        self.assertEqual(get_dashboard_stats(self.user)['totalPrompts'], 1)
+
+
+class PromptListPaginationTests(TestCase):
+    """Prompts sharing a created_at are listed exactly once across pages"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('pager', 'pager@example.com', 'password')
+        created_at = timezone.now()
+        self.prompts = Prompt.objects.bulk_create([
+            Prompt(
+                user=self.user, title=f'Prompt {i}', input_text='Same second',
+                category='doubt', response_style='concise', created_at=created_at,
+            )
+            for i in range(25)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def collect_ids(self, params, url='/api/prompts/', link='next'):
+        pages = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            pages.append([prompt['id'] for prompt in response.json()['results']])
+            last_url, url, params = url, response.json()[link], None
+        return pages, last_url
+
+    def test_page_numbers(self):
+        pages, _ = self.collect_ids({'view': 'summary'})
+        self.assertEqual(sum(pages, []), sorted((p.id for p in self.prompts), reverse=True))
+
+    def test_cursor(self):
+        with CaptureQueriesContext(connection) as queries:
+            pages, last_url = self.collect_ids({'pagination': 'cursor'})
+        self.assertEqual(sum(pages, []), sorted((p.id for p in self.prompts), reverse=True))
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
+
+        # Walking back from the last page returns the same pages
+        previous_pages, _ = self.collect_ids(None, url=last_url, link='previous')
+        self.assertEqual(previous_pages, pages[::-1])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/prompts/', {'cursor': 'bm9wZQ=='}).status_code, 404)
+
+
+class MetricsEndpointTests(SimpleTestCase):
+    """Access control of /metrics/"""
+
+    @override_settings(REQUEST_METRICS_TOKEN='', REQUEST_METRICS_ALLOWED_IPS=[])
+    def test_hidden_without_token_or_allowed_ips(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 404)
+
+    @override_settings(REQUEST_METRICS_TOKEN='secret', REQUEST_METRICS_ALLOWED_IPS=[])
+    def test_requires_token(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        response = self.client.get('/metrics/', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_request_render_seconds_total', response.content)
+
+    @override_settings(REQUEST_METRICS_TOKEN='', REQUEST_METRICS_ALLOWED_IPS=['10.0.0.5'])
+    def test_allowed_ips(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='10.0.0.5').status_code, 200)
@@ -0,0 +1,245 @@
+"""
+Bulk export and import of prompt history as NDJSON
+
+Exports are one JSON object per line with the fields in EXPORT_FIELDS,
+oldest prompt first, optionally gzip compressed. Rows are read with a
+values_list iterator and encoded as they are sent, so memory use does not
+grow with the number of prompts.
+
+Imports read the same format, plain or gzipped, line by line. Each batch
+references its texts in the blob table in a few queries, is written with
+bulk_create and then added to the search index, all in one transaction, so
+a bad line rejects the whole file. created_at is kept when present,
+updated_at records the import.
+"""
+import json
+import zlib
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework import serializers
+from .models import RESPONSE_PREVIEW_LENGTH, Prompt, TextBlob
+from .search import index_prompts
+from .serializers import PromptImportSerializer
+from .services import invalidate_dashboard_stats
+
+EXPORT_FIELDS = (
+    'title', 'input_text', 'category', 'response_style', 'description',
+    'generated_prompt', 'ai_response', 'created_at', 'updated_at',
+)
+
+# Model columns behind EXPORT_FIELDS, the texts are read through their blobs
+EXPORT_COLUMNS = (
+    'title', 'input_text', 'category', 'response_style', 'description',
+    'generated_prompt_blob__content', 'ai_response_blob__content', 'created_at', 'updated_at',
+)
+
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 1000
+
+# Bytes of encoded lines collected before a chunk is sent
+WRITE_BUFFER_SIZE = 64 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+
+# Longest line accepted by imports, guards against unterminated input
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class PromptImportError(Exception):
+    """Raised for an import line that cannot be read or validated"""
+
+    def __init__(self, line, detail):
+        # Validation errors keep their per-field detail, the message stays readable
+        super().__init__(f"Line {line}: {detail if isinstance(detail, str) else 'invalid prompt'}")
+        self.line = line
+        self.detail = detail
+
+
+def export_rows(queryset, include_user=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield one dict per prompt in EXPORT_FIELDS order, oldest first"""
+    columns = EXPORT_COLUMNS + (('user__username',) if include_user else ())
+    rows = queryset.order_by('id').values_list(*columns).iterator(chunk_size=chunk_size)
+    for row in rows:
+        data = dict(zip(EXPORT_FIELDS, row))
+        data['generated_prompt'] = data['generated_prompt'] or ''
+        data['ai_response'] = data['ai_response'] or ''
+        data['created_at'] = data['created_at'].isoformat()
+        data['updated_at'] = data['updated_at'].isoformat()
+        if include_user:
+            data['user'] = row[-1]
+        yield data
+
+
+def iter_ndjson(rows):
+    """Encode rows as NDJSON, yielding chunks of about WRITE_BUFFER_SIZE bytes"""
+    buffer = []
+    size = 0
+    for row in rows:
+        line = json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= WRITE_BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_gzip(chunks, level=6):
+    """Compress a stream of byte chunks into a single gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_chunks(fileobj, chunk_size=READ_CHUNK_SIZE):
+    """Read a file as byte chunks, gunzipping it when it starts with the gzip magic"""
+    decompressor = None
+    first = True
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        if first:
+            first = False
+            if chunk.startswith(GZIP_MAGIC):
+                decompressor = zlib.decompressobj(31)
+        if decompressor is None:
+            yield chunk
+            continue
+        while chunk:
+            yield decompressor.decompress(chunk)
+            chunk = b''
+            if decompressor.eof:
+                # Concatenated gzip members, as written by appending gzip files
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(31)
+    if decompressor is not None:
+        yield decompressor.flush()
+
+
+def read_ndjson(fileobj):
+    """Yield (line number, object) for each non-empty line of an NDJSON file"""
+    line_number = 0
+    # Pieces of the line still waiting for its newline
+    partial = []
+    partial_size = 0
+    for chunk in iter_chunks(fileobj):
+        lines = chunk.split(b'\n')
+        if len(lines) > 1:
+            lines[0] = b''.join(partial) + lines[0]
+            for line in lines[:-1]:
+                line_number += 1
+                if line.strip():
+                    yield line_number, parse_line(line_number, line)
+            partial = []
+            partial_size = 0
+        partial.append(lines[-1])
+        partial_size += len(lines[-1])
+        if partial_size > MAX_LINE_BYTES:
+            raise PromptImportError(line_number + 1, 'line is too long')
+    line = b''.join(partial)
+    if line.strip():
+        yield line_number + 1, parse_line(line_number + 1, line)
+
+
+def parse_line(line_number, line):
+    """Decode one NDJSON line into a dict"""
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        raise PromptImportError(line_number, f'invalid JSON ({e})')
+    if not isinstance(data, dict):
+        raise PromptImportError(line_number, 'expected a JSON object')
+    return data
+
+
+def create_prompts(entries):
+    """Bulk create prompts from (user_id, validated data) pairs, with their blobs and search index rows"""
+
+    texts = []
+    for _, data in entries:
+        texts.extend([data['generated_prompt'], data['ai_response']])
+    keys = TextBlob.objects.acquire_many(texts)
+
+    prompts = []
+    for i, (user_id, data) in enumerate(entries):
+        generated_key, response_key = keys[2 * i], keys[2 * i + 1]
+        prompt = Prompt(
+            user_id=user_id,
+            title=data['title'],
+            input_text=data['input_text'],
+            category=data['category'],
+            response_style=data['response_style'],
+            description=data.get('description', ''),
+            # Cached blobs, so the search index reads the texts without queries
+            generated_prompt_blob=TextBlob(hash=generated_key, content=data['generated_prompt']) if generated_key else None,
+            ai_response_blob=TextBlob(hash=response_key, content=data['ai_response']) if response_key else None,
+            response_preview=data['ai_response'][:RESPONSE_PREVIEW_LENGTH],
+        )
+        if data.get('created_at'):
+            prompt.created_at = data['created_at']
+        prompts.append(prompt)
+    Prompt.objects.bulk_create(prompts)
+
+    # bulk_create skips the signals that keep the search index current
+    index_prompts(prompts)
+    return prompts
+
+
+def import_prompts(lines, user=None, batch_size=IMPORT_BATCH_SIZE, max_prompts=None):
+    """
+    Import (line number, object) pairs from read_ndjson and return the number of prompts created.
+
+    Every prompt goes to user when given; otherwise each line names its
+    owner's username in a "user" field, as written by exports of all users.
+    Raises PromptImportError for the first bad line, leaving nothing imported.
+    """
+    serializer = PromptImportSerializer()
+    user_ids = {}
+    batch = []
+    imported = 0
+
+    with transaction.atomic():
+        for line_number, data in lines:
+            if max_prompts is not None and imported + len(batch) >= max_prompts:
+                raise PromptImportError(line_number, f'imports are limited to {max_prompts} prompts')
+
+            if user is not None:
+                user_id = user.id
+            else:
+                user_id = lookup_user_id(user_ids, line_number, data.get('user'))
+
+            try:
+                validated = serializer.run_validation(data)
+            except serializers.ValidationError as e:
+                raise PromptImportError(line_number, e.detail)
+            batch.append((user_id, validated))
+
+            if len(batch) >= batch_size:
+                imported += len(create_prompts(batch))
+                batch = []
+
+        if batch:
+            imported += len(create_prompts(batch))
+
+    for user_id in ([user.id] if user is not None else user_ids.values()):
+        invalidate_dashboard_stats(user_id)
+    return imported
+
+
+def lookup_user_id(user_ids, line_number, username):
+    """Resolve the owner named by an import line, remembering earlier lookups"""
+    if not username:
+        raise PromptImportError(line_number, 'missing "user"')
+    if username not in user_ids:
+        user_id = get_user_model().objects.filter(username=username).values_list('id', flat=True).first()
+        if user_id is None:
+            raise PromptImportError(line_number, f'unknown user "{username}"')
+        user_ids[username] = user_id
+    return user_ids[username]
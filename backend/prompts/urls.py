@@ -1,14 +1,33 @@
 from django.urls import path
+from .async_views import execute_and_save_prompt_async_view, execute_prompt_async_view
 from .views import (
     PromptListCreateView,
     PromptDetailView,
+    PromptSearchView,
     execute_prompt_view,
-    dashboard_stats_view
+    execute_and_save_prompt_view,
+    execute_prompt_stream_view,
+    execute_batch_view,
+    dashboard_stats_view,
+    export_prompts_view,
+    import_prompts_view,
+    submit_execution_job_view,
+    ExecutionJobDetailView
 )
 
 urlpatterns = [
     path('', PromptListCreateView.as_view(), name='prompt-list-create'),
     path('<int:pk>/', PromptDetailView.as_view(), name='prompt-detail'),
+    path('search/', PromptSearchView.as_view(), name='prompt-search'),
+    path('export/', export_prompts_view, name='prompt-export'),
+    path('import/', import_prompts_view, name='prompt-import'),
     path('execute/', execute_prompt_view, name='execute-prompt'),
+    path('execute/save/', execute_and_save_prompt_view, name='execute-save-prompt'),
+    path('execute/async/', execute_prompt_async_view, name='execute-prompt-async'),
+    path('execute/save/async/', execute_and_save_prompt_async_view, name='execute-save-prompt-async'),
+    path('execute/stream/', execute_prompt_stream_view, name='execute-prompt-stream'),
+    path('execute-batch/', execute_batch_view, name='execute-prompt-batch'),
+    path('jobs/', submit_execution_job_view, name='execution-job-submit'),
+    path('jobs/<int:pk>/', ExecutionJobDetailView.as_view(), name='execution-job-detail'),
     path('dashboard-stats/', dashboard_stats_view, name='dashboard-stats'),
 ]
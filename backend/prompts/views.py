@@ -1,16 +1,55 @@
+import math
 from rest_framework import generics, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Prompt
+from .jobs import enqueue_execution_job
+from .models import ExecutionJob, Prompt
+from .pagination import PromptListPagination, PromptSearchPagination
+from .ratelimit import RateLimitExceeded
+from .renderers import NDJSONRenderer, ServerSentEventRenderer, format_sse
+from .resilience import CircuitOpenError
+from .search import PromptSearch, SearchUnavailable
 from .serializers import (
     PromptSerializer,
+    PromptSummarySerializer,
+    PromptSearchSerializer,
+    PromptSearchResultSerializer,
     CreatePromptSerializer,
     UpdatePromptSerializer,
-    ExecutePromptSerializer
+    ExecutePromptSerializer,
+    StreamExecutePromptSerializer,
+    SubmitExecutionJobSerializer,
+    ExecutionJobSerializer
 )
-from .services import create_and_execute_prompt, generate_prompt_template, execute_prompt_only
+from .services import (
+    create_and_execute_prompt,
+    generate_prompt_template,
+    execute_prompt_only,
+    execute_prompt_batch,
+    get_dashboard_stats,
+    stream_prompt_execution
+)
+from .transfer import PromptImportError, export_rows, import_prompts, iter_gzip, iter_ndjson, read_ndjson
+
+
+def rate_limited_response(exc, status_code=status.HTTP_429_TOO_MANY_REQUESTS):
+    """429 response with Retry-After for requests that ran out of LLM budget"""
+    response = Response({
+        'error': str(exc)
+    }, status=status_code)
+    if exc.retry_after:
+        response['Retry-After'] = str(math.ceil(exc.retry_after))
+    return response
+
+
+def provider_unavailable_response(exc):
+    """503 response while the circuit breaker keeps calls away from the provider"""
+    return rate_limited_response(exc, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
 
 
 class PromptListCreateView(generics.ListCreateAPIView):
@@ -18,13 +57,24 @@ class PromptListCreateView(generics.ListCreateAPIView):
     
     serializer_class = PromptSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PromptListPagination
+    
+    def use_summary(self):
+        # ?view=summary drops generated_prompt and ai_response from the list,
+        # the full text is still available from PromptDetailView
+        return self.request.method == 'GET' and self.request.query_params.get('view') == 'summary'
     
     def get_queryset(self):
-        return Prompt.objects.filter(user=self.request.user)
+        queryset = Prompt.objects.filter(user=self.request.user)
+        if self.use_summary():
+            return queryset.summaries()
+        return queryset.with_texts()
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return CreatePromptSerializer
+        if self.use_summary():
+            return PromptSummarySerializer
         return PromptSerializer
     
     def perform_create(self, serializer):
@@ -50,7 +100,7 @@ class PromptDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Prompt.objects.filter(user=self.request.user)
+        return Prompt.objects.filter(user=self.request.user).with_texts()
     
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
@@ -58,6 +108,27 @@ class PromptDetailView(generics.RetrieveUpdateDestroyAPIView):
         return PromptSerializer
 
 
+class PromptSearchView(generics.ListAPIView):
+    """Full-text search over the user's prompts, best matches first"""
+    
+    serializer_class = PromptSearchResultSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = PromptSearchPagination
+    
+    def get_queryset(self):
+        params = PromptSearchSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return PromptSearch(self.request.user, **params.validated_data)
+    
+    def list(self, request, *args, **kwargs):
+        try:
+            return super().list(request, *args, **kwargs)
+        except SearchUnavailable as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def execute_prompt_view(request):
@@ -73,9 +144,55 @@ def execute_prompt_view(request):
             
             return Response({
                 'generated_prompt': result['generated_prompt'],
-                'response': result['ai_response']
+                'response': result['ai_response'],
+                'cached': result['cached']
             }, status=status.HTTP_200_OK)
             
+        except RateLimitExceeded as e:
+            return rate_limited_response(e)
+            
+        except CircuitOpenError as e:
+            return provider_unavailable_response(e)
+            
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+            
+        except Exception as e:
+            return Response({
+                'error': f'Failed to execute prompt: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def execute_and_save_prompt_view(request):
+    """Execute a prompt with Gemini and store the result, updating the prompt when prompt_id is given"""
+    
+    serializer = ExecutePromptSerializer(data=request.data, context={'request': request})
+    if serializer.is_valid():
+        created = 'prompt' not in serializer.validated_data
+        try:
+            prompt, ai_response, cached = create_and_execute_prompt(
+                user=request.user,
+                data=serializer.validated_data
+            )
+            
+            return Response({
+                'prompt': PromptSerializer(prompt).data,
+                'response': ai_response,
+                'cached': cached
+            }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+            
+        except RateLimitExceeded as e:
+            return rate_limited_response(e)
+            
+        except CircuitOpenError as e:
+            return provider_unavailable_response(e)
+            
         except ValueError as e:
             return Response({
                 'error': str(e)
@@ -89,34 +206,163 @@ def execute_prompt_view(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def execute_batch_view(request):
+    """Execute a list of prompts concurrently with Gemini (without saving)"""
+    
+    items = request.data
+    if not isinstance(items, list) or not items:
+        return Response({
+            'error': 'Expected a non-empty list of prompts'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if len(items) > settings.GEMINI_BATCH_MAX_ITEMS:
+        return Response({
+            'error': f'A batch can contain at most {settings.GEMINI_BATCH_MAX_ITEMS} prompts'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Validate every item on its own so one bad payload does not fail the batch
+    results = [None] * len(items)
+    valid_indexes = []
+    valid_items = []
+    for index, item in enumerate(items):
+        serializer = ExecutePromptSerializer(data=item, context={'request': request})
+        if serializer.is_valid():
+            valid_indexes.append(index)
+            valid_items.append(serializer.validated_data)
+        else:
+            results[index] = {'error': serializer.errors}
+    
+    for index, result in zip(valid_indexes, execute_prompt_batch(request.user, valid_items)):
+        if 'error' in result:
+            results[index] = result
+        else:
+            results[index] = {
+                'generated_prompt': result['generated_prompt'],
+                'response': result['ai_response'],
+                'cached': result['cached']
+            }
+    
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, ServerSentEventRenderer])
+def execute_prompt_stream_view(request):
+    """Execute a prompt with Gemini and stream the response as Server-Sent Events"""
+    
+    serializer = StreamExecutePromptSerializer(data=request.data, context={'request': request})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = dict(serializer.validated_data)
+    save = data.pop('save')
+    
+    def event_stream():
+        try:
+            for event, payload in stream_prompt_execution(request.user, data, save=save):
+                yield format_sse(event, payload)
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            yield format_sse('error', {'error': str(e), 'retry_after': e.retry_after})
+        except ValueError as e:
+            yield format_sse('error', {'error': str(e)})
+        except Exception as e:
+            yield format_sse('error', {'error': f'Failed to execute prompt: {str(e)}'})
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, NDJSONRenderer])
+def export_prompts_view(request):
+    """Stream all of the user's prompts as NDJSON, gzipped with ?compression=gzip"""
+    
+    compression = request.query_params.get('compression', '')
+    if compression not in ('', 'gzip'):
+        return Response({
+            'error': 'compression must be gzip or omitted'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    chunks = iter_ndjson(export_rows(Prompt.objects.filter(user=request.user)))
+    filename = 'prompts.ndjson'
+    content_type = 'application/x-ndjson'
+    if compression == 'gzip':
+        chunks = iter_gzip(chunks)
+        filename += '.gz'
+        content_type = 'application/gzip'
+    
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_prompts_view(request):
+    """Import prompts from an NDJSON request body, plain or gzipped, in the export format"""
+    
+    # The body is read line by line instead of being parsed into request.data
+    if request.stream is None:
+        return Response({
+            'error': 'Request body is empty'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        imported = import_prompts(
+            read_ndjson(request.stream),
+            user=request.user,
+            max_prompts=settings.PROMPT_IMPORT_MAX_PROMPTS
+        )
+    except PromptImportError as e:
+        return Response({
+            'error': str(e),
+            'line': e.line,
+            'details': e.detail
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({'imported': imported}, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def submit_execution_job_view(request):
+    """Queue a prompt execution for the background workers"""
+    
+    serializer = SubmitExecutionJobSerializer(data=request.data, context={'request': request})
+    if serializer.is_valid():
+        data = dict(serializer.validated_data)
+        save = data.pop('save')
+        job = enqueue_execution_job(request.user, data, save=save)
+        return Response(ExecutionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ExecutionJobDetailView(generics.RetrieveAPIView):
+    """Poll the status of a queued prompt execution"""
+    
+    serializer_class = ExecutionJobSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return ExecutionJob.objects.filter(user=self.request.user)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def dashboard_stats_view(request):
     """Get dashboard statistics for the user"""
     
     try:
-        user_prompts = Prompt.objects.filter(user=request.user)
-        
-        # Calculate statistics
-        total_prompts = user_prompts.count()
-        total_executions = user_prompts.exclude(ai_response='').exclude(ai_response__isnull=True).count()
-        
-        # Find favorite category
-        category_counts = {}
-        for prompt in user_prompts:
-            category_counts[prompt.category] = category_counts.get(prompt.category, 0) + 1
-        
-        favorite_category = max(category_counts.items(), key=lambda x: x[1])[0] if category_counts else ''
-        
-        # Recent activity
-        recent_prompts = user_prompts.order_by('-created_at')[:5]
-        
-        return Response({
-            'totalPrompts': total_prompts,  # Changed to camelCase
-            'totalExecutions': total_executions,  # Changed to camelCase
-            'favoriteCategory': favorite_category,  # Changed to camelCase
-            'recentActivity': PromptSerializer(recent_prompts, many=True).data  # Changed to camelCase
-        })
+        return Response(get_dashboard_stats(request.user))
         
     except Exception as e:
         return Response({